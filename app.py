@@ -10,6 +10,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from src.conversation import VoiceAgent
 from src.database.repository import initialize_database
 from src.voice.tts import text_to_speech
+from src.monitoring import turn, recent_turns, monitoring_enabled
 from src.config import COMPANY_NAME, APP_NAME
 
 # Crear carpeta temporal para audio si no existe
@@ -75,13 +76,10 @@ def process_text_input():
         st.session_state.text_input = ""
         st.session_state.waiting_for_input = False
         
-        # Procesar entrada y obtener respuesta
-        response = st.session_state.agent.process_text_input(user_input)
-        
-        # Convertir respuesta a voz
-        audio_file = st.session_state.agent.respond_with_voice(response)
-        if audio_file:
-            st.session_state.current_audio = audio_file
+        # La síntesis de voz cuenta en el mismo turno que la respuesta
+        with turn(input="text"):
+            # Procesar entrada y responder con voz frase a frase mientras se genera
+            st.session_state.agent.process_text_input(user_input, stream_voice=True)
         
         st.session_state.waiting_for_input = True
         st.session_state.last_update = time.time()
@@ -90,16 +88,17 @@ def process_text_input():
 def process_voice_input():
     st.session_state.waiting_for_input = False
     
-    # Mostrar mensaje de espera
-    with st.spinner("Escuchando..."):
-        # Procesar entrada de voz y obtener respuesta
-        transcribed_text, response = st.session_state.agent.process_voice_input()
-    
-    if transcribed_text:
-        # Convertir respuesta a voz
-        audio_file = st.session_state.agent.respond_with_voice(response)
-        if audio_file:
-            st.session_state.current_audio = audio_file
+    with turn(input="voice"):
+        # Mostrar mensaje de espera
+        with st.spinner("Escuchando..."):
+            # Procesar entrada de voz y responder con voz frase a frase mientras se genera
+            transcribed_text, response = st.session_state.agent.process_voice_input(stream_voice=True)
+        
+        if not transcribed_text:
+            # El aviso de que no se entendió el audio no pasa por el streaming
+            audio_file = st.session_state.agent.respond_with_voice(response)
+            if audio_file:
+                st.session_state.current_audio = audio_file
     
     st.session_state.waiting_for_input = True
     st.session_state.last_update = time.time()
@@ -169,6 +168,24 @@ if st.session_state.conversation_started:
         else:
             st.write("Aún no se ha recopilado información.")
 
+# Tiempos, tokens y coste de los últimos turnos
+if monitoring_enabled():
+    with st.expander("Métricas de los últimos turnos"):
+        turns = recent_turns(20)
+        if turns:
+            st.dataframe([
+                {
+                    "turno": record["turn_id"],
+                    "duración (s)": round(record["duration"], 2),
+                    **{stage: round(seconds, 2) for stage, seconds in record["stages"].items()},
+                    "tokens": record["prompt_tokens"] + record["completion_tokens"],
+                    "coste (USD)": round(record["cost"], 5),
+                }
+                for record in reversed(turns)
+            ])
+        else:
+            st.write("Aún no hay turnos registrados.")
+
 # Pie de página
 st.markdown("---")
 st.caption(f"© 2025 {COMPANY_NAME} - AI Agent de Voz para Nutrición de Leads")
\ No newline at end of file
@@ -0,0 +1,143 @@
+"""
+Benchmark de extremo a extremo del agente sin red, reproduciendo un cassette
+
+Graba varias conversaciones de VoiceAgent (intención, extracción y respuesta
+de cada turno) contra el servidor local compatible con OpenAI, o contra la API
+real con --live, y después las reproduce con el servidor apagado: con la
+latencia grabada, con una latencia fija y sin esperas (solo el coste propio
+del agente). Con --replay se reproduce un cassette ya grabado.
+
+Uso:
+    python benchmarks/bench_agent_replay.py --sessions 3 --latency 0.4 --token-delay 0.03
+    python benchmarks/bench_agent_replay.py --live --cassette data/agent.cassette.json
+    python benchmarks/bench_agent_replay.py --replay data/agent.cassette.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+from src.config import OPENAI_API_KEY
+from src.conversation.agent import VoiceAgent
+from src.conversation.entities import pre_extract
+from src.conversation.intent_classifier import classify_intent
+from src.database.models import Lead
+from src.database.repository import initialize_database, create_lead
+from src.llm import clients
+from src.llm.cassette import use_cassette
+from src.llm.fake_server import FakeOpenAIServer
+from src.llm.transport import get_transport_stats
+
+STAGES = ("intent", "extraction", "response", "total")
+
+SCRIPT = [
+    "Hola, buenas tardes",
+    "Me llamo Laura Gómez y trabajo en Logística Norte",
+    "Queremos automatizar el seguimiento de pedidos y la atención al cliente",
+    "¿Cuánto costaría una solución así?",
+    "Nuestro presupuesto ronda los 20.000 euros",
+    "Necesitaríamos tenerlo funcionando en tres meses",
+    "Mi email es laura.gomez@logisticanorte.es",
+    "Perfecto, gracias. Espero vuestra propuesta",
+]
+
+
+def _quoted(content):
+    """Texto del usuario entre comillas dentro de un prompt"""
+    match = re.search(r'"([^"]*)"', content)
+    return match.group(1) if match else content
+
+
+def responder(kind, payload):
+    """Respuestas del servidor local coherentes con cada mensaje del guion"""
+    messages = payload.get("messages", [])
+    user = messages[-1]["content"] if messages else ""
+    if kind == "intent":
+        return classify_intent(_quoted(user))[0]
+    if kind == "extraction":
+        return json.dumps(pre_extract(_quoted(user))[0], ensure_ascii=False)
+    return None
+
+
+def run_sessions(lead_id, sessions):
+    """Ejecutar el guion en varias sesiones y devolver las duraciones de cada turno"""
+    samples = {stage: [] for stage in STAGES}
+    for _ in range(sessions):
+        agent = VoiceAgent(concurrent=True)
+        agent.start_session(lead_id)
+        for text in SCRIPT:
+            agent.process_text_input(text)
+            for stage in STAGES:
+                samples[stage].append(agent.last_turn_timings.get(stage, 0.0))
+        agent.end_session()
+    return samples
+
+
+def report(name, samples, transport):
+    """Imprimir una fila de resultados"""
+    totals = sorted(samples["total"])
+    p95 = totals[min(len(totals) - 1, int(0.95 * len(totals)))]
+    requests = get_transport_stats()["requests"]
+    print(f"{name:>22} " + " ".join(f"{statistics.mean(samples[stage]) * 1000:>11.1f}" for stage in STAGES)
+          + f" {p95 * 1000:>10.1f} {requests:>10} {requests - transport.hits:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=3, help="Conversaciones completas por modo")
+    parser.add_argument("--latency", type=float, default=0.4, help="Latencia del servidor local hasta el primer byte (s)")
+    parser.add_argument("--token-delay", type=float, default=0.03, help="Espera entre fragmentos del servidor local (s)")
+    parser.add_argument("--fixed-latency", type=float, default=0.1, help="Latencia fija por petición al reproducir (s)")
+    parser.add_argument("--cassette", default=None, help="Fichero del cassette (por defecto, uno temporal)")
+    parser.add_argument("--live", action="store_true", help="Grabar contra la API real (requiere OPENAI_API_KEY)")
+    parser.add_argument("--replay", default=None, help="Reproducir un cassette existente sin grabar")
+    args = parser.parse_args()
+
+    if args.live and not OPENAI_API_KEY:
+        print("Se necesita OPENAI_API_KEY para grabar contra la API real")
+        return
+
+    initialize_database()
+    lead_id = create_lead(Lead(name="Benchmark", email="benchmark@example.com"))
+    path = args.replay or args.cassette or os.path.join(tempfile.mkdtemp(), "agent.cassette.json")
+    if not args.live:
+        clients.OPENAI_API_KEY = clients.OPENAI_API_KEY or "sk-replay"  # El servidor local y la reproducción no comprueban la clave
+
+    print(f"{'modo':>22} " + " ".join(f"{stage + ' (ms)':>11}" for stage in STAGES)
+          + f" {'p95 (ms)':>10} {'peticiones':>10} {'a la red':>10}")
+
+    if not args.replay:
+        if args.live:
+            with use_cassette(path, "record") as transport:
+                report("grabación (API)", run_sessions(lead_id, 1), transport)
+        else:
+            with FakeOpenAIServer(latency=args.latency, token_delay=args.token_delay, jitter=0.2,
+                                  responder=responder) as server:
+                with use_cassette(path, "record", transport=server.transport()) as transport:
+                    report("grabación (local)", run_sessions(lead_id, 1), transport)
+        print(f"cassette: {path}")
+
+    # A partir de aquí no hay servidor: cualquier petición no grabada fallaría
+    for name, options in (
+        ("latencia grabada", {}),
+        (f"latencia fija {args.fixed_latency * 1000:.0f} ms", {"latency": args.fixed_latency}),
+        ("sin esperas", {"latency_scale": 0.0}),
+    ):
+        start = time.perf_counter()
+        with use_cassette(path, "replay", **options) as transport:
+            samples = run_sessions(lead_id, args.sessions)
+            report(name, samples, transport)
+        elapsed = time.perf_counter() - start
+        print(f"{'':>22} {len(samples['total'])} turnos en {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark del archivo comprimido: ahorro de espacio y latencia de lectura
+
+Uso:
+    python benchmarks/bench_archive.py --conversations 2000 --messages 40
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+from src.database import archive
+from src.database.cache import archive_cache
+from src.database.connection import configure_database
+from src.database.repository import initialize_database, get_db_connection, get_conversation_messages
+
+PHRASES = [
+    "Hola, soy AsistenteATOM. ¿En qué puedo ayudarte hoy con respecto a nuestros servicios de tecnología?",
+    "Estamos buscando un CRM para nuestro equipo comercial de unas veinte personas.",
+    "¿Qué presupuesto tenéis previsto para este proyecto?",
+    "Nuestro presupuesto ronda los 15.000 euros y querríamos empezar en tres meses.",
+    "Perfecto, ¿podrías indicarme tu email para enviarte más información?",
+    "Claro, es contacto@empresa-ejemplo.com. También nos interesa la automatización de procesos.",
+    "Gracias. Te enviaré una propuesta y podemos agendar una reunión con un especialista.",
+]
+
+
+def populate(conversations, messages_per_conversation):
+    """Crear conversaciones finalizadas hace 60 días con mensajes realistas"""
+    conn = get_db_connection()
+    ended_at = datetime.now() - timedelta(days=60)
+    conn.execute("INSERT INTO leads (name) VALUES ('Benchmark')")
+    for _ in range(conversations):
+        conversation_id = conn.execute(
+            "INSERT INTO conversations (lead_id, started_at, ended_at) VALUES (1, ?, ?)",
+            (ended_at - timedelta(minutes=10), ended_at)
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO messages (conversation_id, sender, content, timestamp) VALUES (?, ?, ?, ?)",
+            [
+                (conversation_id, "agent" if i % 2 == 0 else "lead",
+                 f"{random.choice(PHRASES)} ({i})", ended_at - timedelta(seconds=600 - i))
+                for i in range(messages_per_conversation)
+            ]
+        )
+    conn.commit()
+
+
+def database_size(path):
+    """Tamaño del fichero de base de datos tras compactarlo"""
+    conn = get_db_connection()
+    conn.execute("VACUUM")
+    # En modo WAL el fichero principal solo se reduce al volcar el WAL
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return os.path.getsize(path)
+
+
+def read_latency(conversation_ids, clear_cache=False):
+    """Latencia media de get_conversation_messages en milisegundos"""
+    start = time.perf_counter()
+    for conversation_id in conversation_ids:
+        if clear_cache:
+            archive_cache.clear()
+        get_conversation_messages(conversation_id)
+    return (time.perf_counter() - start) / len(conversation_ids) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=40, help="Mensajes por conversación")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "archive.db")
+        configure_database(path)
+        initialize_database()
+        populate(args.conversations, args.messages)
+
+        sample = random.sample(range(1, args.conversations + 1), min(200, args.conversations))
+        size_before = database_size(path)
+        live_latency = read_latency(sample)
+
+        start = time.perf_counter()
+        stats = archive.archive_conversations(older_than_days=30)
+        archive_time = time.perf_counter() - start
+
+        size_after = database_size(path)
+        cold_latency = read_latency(sample, clear_cache=True)
+        warm_latency = read_latency(sample)
+
+        print(f"conversaciones archivadas: {stats['conversations']} ({stats['messages']} mensajes) en {archive_time:.1f} s")
+        print(f"ratio de compresión:       {stats['raw_bytes'] / stats['compressed_bytes']:.1f}x")
+        print(f"tamaño de la base de datos: {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB "
+              f"({100 * (1 - size_after / size_before):.0f}% menos)")
+        print(f"lectura activa:            {live_latency:.3f} ms/conversación")
+        print(f"lectura archivada (fría):  {cold_latency:.3f} ms/conversación")
+        print(f"lectura archivada (caché): {warm_latency:.3f} ms/conversación")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Benchmark de la reextracción de datos de leads: una llamada por mensaje frente a lotes concurrentes
+
+Genera conversaciones sintéticas en una base de datos en memoria y vuelve a
+extraer los datos de sus leads contra el servidor local compatible con OpenAI,
+que responde tras la latencia indicada. Compara el camino anterior (una
+llamada a extract_entities por mensaje del lead y una escritura por
+conversación) con el trabajo por lotes con una y con varias llamadas
+simultáneas, y muestra conversaciones por minuto, llamadas y tokens.
+
+Uso:
+    python benchmarks/bench_backfill.py --conversations 400 --latency 0.3 --concurrency 4
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+from src.conversation.backfill import backfill_lead_details
+from src.conversation.entities import extract_lead_info, pre_extract
+from src.database.models import Lead, LeadDetails, Message
+from src.database.repository import (
+    initialize_database,
+    create_lead,
+    start_conversation,
+    add_messages,
+    update_lead_details,
+    get_conversation_messages
+)
+from src.llm import clients
+from src.llm.fake_server import FakeOpenAIServer
+from src.llm.transport import configure_http_transport
+
+LEAD_MESSAGES = [
+    "Hola, os escribo porque estamos valorando proveedores",
+    "Trabajo en {company} y llevamos la parte de operaciones",
+    "Necesitamos {need}",
+    "El presupuesto ronda los {budget} euros",
+    "Nos gustaría tenerlo en {months} meses",
+    "Mi email es {email}",
+    "¿Tenéis casos de éxito en nuestro sector?",
+    "Perfecto, quedo a la espera de la propuesta",
+]
+NEEDS = ["automatizar la facturación", "un CRM para el equipo comercial", "integrar el ERP con la tienda online",
+         "un chatbot para atención al cliente", "migrar la infraestructura a la nube"]
+
+
+def responder(kind, payload):
+    """Extracción del servidor local: reglas sobre los mensajes, por conversación o por mensaje"""
+    if kind != "extraction":
+        return None
+    prompt = payload["messages"][-1]["content"]
+    sections = re.findall(r"## Conversación (\d+)\n((?:- .*\n?)+)", prompt)
+    if sections:
+        results = {}
+        for conversation_id, lines in sections:
+            info = {}
+            for line in lines.splitlines():
+                info.update(pre_extract(line[2:])[0])
+            results[conversation_id] = info
+        return json.dumps(results, ensure_ascii=False)
+    match = re.search(r'"([^"]*)"', prompt)
+    return json.dumps(pre_extract(match.group(1) if match else prompt)[0], ensure_ascii=False)
+
+
+def populate(conversations, seed=7):
+    """Crear leads con una conversación cada uno"""
+    rng = random.Random(seed)
+    ids = []
+    for i in range(conversations):
+        lead_id = create_lead(Lead(name=f"Lead {i}", email=f"lead{i}@example.com"))
+        conversation_id = start_conversation(lead_id)
+        values = {"company": f"Empresa {i}", "need": rng.choice(NEEDS), "budget": f"{rng.randint(5, 80)}.000",
+                  "months": rng.randint(1, 12), "email": f"contacto{i}@empresa{i}.es"}
+        messages = []
+        for text in LEAD_MESSAGES:
+            messages.append(Message(conversation_id=conversation_id, sender="lead", content=text.format(**values)))
+            messages.append(Message(conversation_id=conversation_id, sender="agent", content="Entendido, gracias."))
+        add_messages(messages)
+        ids.append((conversation_id, lead_id))
+    return ids
+
+
+def per_message(conversations):
+    """Camino anterior: una llamada por mensaje del lead y una escritura por conversación"""
+    for conversation_id, lead_id in conversations:
+        info = {}
+        for message in get_conversation_messages(conversation_id):
+            if message.sender == "lead":
+                info = extract_lead_info(message.content, info, policy="llm")
+        update_lead_details(LeadDetails(lead_id=lead_id, **{
+            field: info.get(field) for field in ("budget", "needs", "product_interest", "timeline")
+        }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--conversations", type=int, default=400)
+    parser.add_argument("--baseline", type=int, default=20, help="Conversaciones medidas con el camino anterior")
+    parser.add_argument("--latency", type=float, default=0.3, help="Latencia simulada de cada llamada (s)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Conversaciones por llamada")
+    parser.add_argument("--concurrency", type=int, default=4, help="Llamadas simultáneas")
+    args = parser.parse_args()
+
+    initialize_database()
+    conversations = populate(args.conversations)
+
+    server = FakeOpenAIServer(latency=args.latency, jitter=0.2, responder=responder)
+    server.start()
+    clients.OPENAI_API_KEY = "sk-bench"  # El servidor local no comprueba la clave
+    configure_http_transport(transport=server.transport())
+
+    print(f"{'modo':>26} {'conversaciones':>15} {'conv/min':>9} {'llamadas':>9} "
+          f"{'tokens entrada':>15} {'tokens salida':>14} {'tokens/conv':>12}")
+
+    def report(name, count, elapsed):
+        stats = server.stats()
+        tokens = stats["prompt_tokens"] + stats["completion_tokens"]
+        print(f"{name:>26} {count:>15} {count / elapsed * 60:>9.0f} {stats['requests']:>9} "
+              f"{stats['prompt_tokens']:>15} {stats['completion_tokens']:>14} {tokens / count:>12.0f}")
+
+    server.reset_stats()
+    start = time.perf_counter()
+    per_message(conversations[:args.baseline])
+    report("una llamada por mensaje", args.baseline, time.perf_counter() - start)
+
+    for name, concurrency in (("lotes, 1 llamada", 1), (f"lotes, {args.concurrency} simultáneas", args.concurrency)):
+        server.reset_stats()
+        stats = backfill_lead_details(batch_size=args.batch_size, concurrency=concurrency, resume=False, progress=False)
+        report(name, stats["conversations"], stats["elapsed"])
+
+    configure_http_transport()
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark de importación masiva de leads frente a create_lead uno a uno
+
+Uso:
+    python benchmarks/bench_bulk_import.py --leads 100000
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+from src.database.bulk import import_leads, export_leads
+from src.database.connection import configure_database
+from src.database.models import Lead, LeadDetails
+from src.database.repository import initialize_database, create_lead, update_lead_details
+
+
+def write_csv(path, count):
+    """Generar un fichero CSV de leads sintéticos con un 5% de emails repetidos"""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "company", "email", "phone", "budget", "product_interest"])
+        for i in range(count):
+            email_id = i - 1 if i % 20 == 0 and i else i
+            writer.writerow([f"Lead {i}", f"Empresa {i % 500}", f"lead{email_id}@example.com",
+                             f"+34600{i:06d}", f"{(i % 50) * 1000}", "CRM"])
+
+
+def bench_one_by_one(path, sample):
+    """Ruta anterior: create_lead y update_lead_details por registro"""
+    start = time.perf_counter()
+    with open(path, newline="", encoding="utf-8") as f:
+        for i, row in enumerate(csv.DictReader(f)):
+            if i >= sample:
+                break
+            lead_id = create_lead(Lead(name=row["name"], company=row["company"], email=row["email"], phone=row["phone"]))
+            update_lead_details(LeadDetails(lead_id=lead_id, budget=row["budget"], product_interest=row["product_interest"]))
+    return sample / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--leads", type=int, default=100_000)
+    parser.add_argument("--sample", type=int, default=5_000, help="Registros medidos en la ruta uno a uno")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "leads.csv")
+        write_csv(csv_path, args.leads)
+
+        configure_database(os.path.join(tmp, "one_by_one.db"))
+        initialize_database()
+        rate = bench_one_by_one(csv_path, min(args.sample, args.leads))
+        print(f"uno a uno:  {rate:10.0f} leads/s (estimado para {args.leads}: {args.leads / rate:.1f} s)")
+
+        configure_database(os.path.join(tmp, "bulk.db"))
+        initialize_database()
+        start = time.perf_counter()
+        stats = import_leads(csv_path, progress=False)
+        elapsed = time.perf_counter() - start
+        print(f"masivo:     {stats['read'] / elapsed:10.0f} leads/s ({elapsed:.1f} s, "
+              f"{stats['inserted']} insertados, {stats['duplicates']} duplicados)")
+
+        start = time.perf_counter()
+        exported = export_leads(os.path.join(tmp, "leads.jsonl"), progress=False)
+        print(f"exportación:{exported / (time.perf_counter() - start):10.0f} leads/s")
+
+
+if __name__ == "__main__":
+    main()
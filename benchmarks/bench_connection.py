@@ -0,0 +1,82 @@
+"""
+Benchmark de inserciones por segundo: conexión por llamada vs. conexión persistente
+
+Uso:
+    python benchmarks/bench_connection.py --messages 5000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.connection import ConnectionManager
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "schema.sql")
+
+INSERT_MESSAGE = """
+    INSERT INTO messages (conversation_id, sender, content, timestamp)
+    VALUES (?, ?, ?, ?)
+"""
+
+
+def create_schema(database_path):
+    """Crear el esquema en una base de datos nueva"""
+    conn = sqlite3.connect(database_path)
+    with open(SCHEMA_PATH) as f:
+        conn.executescript(f.read())
+    conn.execute("INSERT INTO leads (name) VALUES ('Benchmark')")
+    conn.execute("INSERT INTO conversations (lead_id) VALUES (1)")
+    conn.commit()
+    conn.close()
+
+
+def bench_per_call(database_path, count):
+    """Ruta anterior: abrir, insertar, confirmar y cerrar en cada llamada"""
+    start = time.perf_counter()
+    for i in range(count):
+        conn = sqlite3.connect(database_path, detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute(INSERT_MESSAGE, (1, "lead", f"Mensaje {i}", datetime.now()))
+            conn.commit()
+        finally:
+            conn.close()
+    return time.perf_counter() - start
+
+
+def bench_managed(database_path, count):
+    """Ruta nueva: conexión persistente del hilo con pragmas ajustados"""
+    manager = ConnectionManager(database_path)
+    start = time.perf_counter()
+    for i in range(count):
+        with manager.transaction() as conn:
+            conn.execute(INSERT_MESSAGE, (1, "lead", f"Mensaje {i}", datetime.now()))
+    elapsed = time.perf_counter() - start
+    manager.close_all()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000, help="Número de inserciones por ruta")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for name, bench in (("por llamada", bench_per_call), ("persistente", bench_managed)):
+            database_path = os.path.join(tmp, f"{bench.__name__}.db")
+            create_schema(database_path)
+            elapsed = bench(database_path, args.messages)
+            results[name] = args.messages / elapsed
+            print(f"{name:>12}: {results[name]:10.0f} inserciones/s ({elapsed:.2f} s)")
+
+    print(f"{'mejora':>12}: {results['persistente'] / results['por llamada']:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark de la extracción por reglas: llamadas al LLM evitadas y precisión
+
+Sobre un conjunto etiquetado de turnos mide qué proporción evita el LLM con la
+política 'auto' y la precisión por campo de las reglas. Con OPENAI_API_KEY
+compara además la precisión y la latencia de las políticas 'llm' y 'auto'.
+
+Uso:
+    python benchmarks/bench_entity_rules.py
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+from src.config import OPENAI_API_KEY
+from src.conversation.entities import pre_extract, extract_lead_info
+
+# (texto del lead, campos esperados)
+LABELED_TURNS = [
+    ("ok", {}),
+    ("Vale, gracias", {}),
+    ("Sí, claro", {}),
+    ("De acuerdo, perfecto", {}),
+    ("Mi email es laura.gomez@distnorte.es", {"email": "laura.gomez@distnorte.es"}),
+    ("ana@acme.com", {"email": "ana@acme.com"}),
+    ("Mi teléfono es +34 600 123 456", {"phone": "+34 600 123 456"}),
+    ("Llamadme al 912 345 678 por favor", {"phone": "912 345 678"}),
+    ("Tenemos unos 12.000 euros", {"budget": "12.000 euros"}),
+    ("El presupuesto ronda los 5k €", {"budget": "5k €"}),
+    ("Hasta 30000 dólares", {"budget": "30000 dólares"}),
+    ("Lo necesitamos antes de septiembre", {"timeline": "antes de septiembre"}),
+    ("Sí, el mes que viene", {"timeline": "el mes que viene"}),
+    ("Lo antes posible", {"timeline": "lo antes posible"}),
+    ("En tres meses", {"timeline": "en tres meses"}),
+    ("Correo: carlos@logistica-rapida.com y móvil 655443322",
+     {"email": "carlos@logistica-rapida.com", "phone": "655443322"}),
+    ("Presupuesto 3000€ y lo necesitamos en dos semanas", {"budget": "3000€", "timeline": "en dos semanas"}),
+    ("Me llamo Laura Gómez", {"name": "Laura Gómez"}),
+    ("Trabajo en Distribuciones Norte", {"company": "Distribuciones Norte"}),
+    ("Buscamos un CRM para el equipo comercial", {"product_interest": "CRM"}),
+    ("Perdemos pedidos porque todo va en hojas de cálculo", {"needs": "hojas de cálculo"}),
+    ("Soy Carlos, de Logística Rápida, y mi email es carlos@lr.es",
+     {"name": "Carlos", "company": "Logística Rápida", "email": "carlos@lr.es"}),
+    ("Nos interesa la automatización de procesos en tres meses",
+     {"product_interest": "automatización de procesos", "timeline": "en tres meses"}),
+    ("Queremos un chatbot y tenemos 8.000 euros", {"product_interest": "chatbot", "budget": "8.000 euros"}),
+    ("¿Cuánto cuesta?", {}),
+    ("Ahora mismo usamos Salesforce", {}),
+]
+
+
+def _normalize(value):
+    return str(value).lower().replace(" ", "")
+
+
+def score(predicted, expected):
+    """Contar campos esperados acertados y campos sobrantes"""
+    correct = sum(
+        1 for field, value in expected.items()
+        if field in predicted and (_normalize(value) in _normalize(predicted[field])
+                                   or _normalize(predicted[field]) in _normalize(value))
+    )
+    extra = sum(1 for field in predicted if field not in expected)
+    return correct, extra
+
+
+def evaluate(extract):
+    """Aplicar un extractor al conjunto etiquetado"""
+    total_fields = sum(len(expected) for _, expected in LABELED_TURNS)
+    correct = extra = 0
+    start = time.perf_counter()
+    for text, expected in LABELED_TURNS:
+        turn_correct, turn_extra = score(extract(text), expected)
+        correct += turn_correct
+        extra += turn_extra
+    elapsed = time.perf_counter() - start
+    return correct / total_fields, extra, elapsed / len(LABELED_TURNS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.parse_args()
+
+    skipped = sum(1 for text, _ in LABELED_TURNS if not pre_extract(text)[1])
+    print(f"turnos etiquetados: {len(LABELED_TURNS)}")
+    print(f"turnos sin llamada al LLM (auto): {skipped} ({skipped / len(LABELED_TURNS):.0%})")
+
+    rule_fields = ("email", "phone", "budget", "timeline")
+    rule_turns = [(t, {k: v for k, v in e.items() if k in rule_fields}) for t, e in LABELED_TURNS]
+    found = sum(score(pre_extract(t)[0], e)[0] for t, e in rule_turns)
+    expected = sum(len(e) for _, e in rule_turns)
+    false_positives = sum(score(pre_extract(t)[0], e)[1] for t, e in rule_turns)
+    print(f"precisión de las reglas en email/teléfono/presupuesto/plazo: {found / expected:.0%} "
+          f"({false_positives} campos sobrantes)")
+
+    if not OPENAI_API_KEY:
+        print("Sin OPENAI_API_KEY: se omite la comparación con el LLM")
+        return
+
+    print(f"{'política':>9} {'acierto por campo':>18} {'campos sobrantes':>17} {'latencia/turno (s)':>19}")
+    for policy in ("llm", "auto"):
+        accuracy, extra, latency = evaluate(lambda text: extract_lead_info(text, {}, policy=policy))
+        print(f"{policy:>9} {accuracy:>18.0%} {extra:>17} {latency:>19.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark del historial con presupuesto de tokens: tokens de prompt y latencia por turno
+
+Simula una conversación de 50 turnos y compara, turno a turno, el prompt con el
+historial completo (comportamiento anterior) frente al historial limitado con
+resumen acumulado. Sin OPENAI_API_KEY la latencia del LLM se estima a partir de
+los tokens de prompt y el resumen se sustituye por un recorte del texto; con
+OPENAI_API_KEY se mide la latencia real de generate_response y se usa el
+resumen generado por el LLM.
+
+Uso:
+    python benchmarks/bench_history_budget.py --turns 50 --max-tokens 1500
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+from src.config import OPENAI_API_KEY
+from src.llm.history import ConversationHistory, count_tokens
+from src.llm.prompt_templates import SYSTEM_PROMPT
+
+LEAD_TURNS = [
+    "Somos una distribuidora con veinte comerciales y ahora mismo gestionamos todos los pedidos en hojas de cálculo compartidas",
+    "El principal problema es que perdemos el seguimiento de los clientes cuando un comercial se va de vacaciones",
+    "Nos interesa sobre todo la integración con el ERP que usamos para la facturación y el almacén",
+    "Tenemos un presupuesto aproximado de quince mil euros para el primer año, incluyendo la formación",
+    "Nos gustaría tenerlo funcionando antes de la campaña de septiembre, que es cuando más pedidos recibimos",
+]
+AGENT_TURNS = [
+    "Entiendo perfectamente. Muchas empresas de distribución se encuentran en esa situación. ¿Cuántos pedidos gestionáis al mes aproximadamente y quién se encarga de consolidar la información?",
+    "Ese es uno de los problemas que mejor resuelve un CRM, porque toda la actividad del cliente queda registrada. ¿Qué información os resulta más difícil recuperar hoy en día?",
+    "Tenemos conectores para los ERP más habituales y también podemos desarrollar integraciones a medida. ¿Podrías decirme qué ERP utilizáis y qué datos necesitáis sincronizar?",
+    "Con ese presupuesto podemos plantear una implantación completa con formación para todo el equipo. ¿Hay alguna otra área, como marketing o atención al cliente, que queráis incluir?",
+]
+
+
+def old_history(messages):
+    """Formato anterior: todo el historial unido en cada turno"""
+    return "\n".join(f"{'Agente' if m['sender'] == 'agent' else 'Lead'}: {m['content']}" for m in messages)
+
+
+def truncating_summarizer(summary, transcript, max_words):
+    """Resumen simulado: conserva las primeras palabras del texto acumulado"""
+    time.sleep(0.05)
+    return " ".join(f"{summary} {transcript}".split()[:max_words])
+
+
+def estimated_latency(prompt_tokens, args):
+    """Latencia estimada del LLM a partir de los tokens de prompt"""
+    return args.base_latency + prompt_tokens * args.ms_per_token / 1000
+
+
+def run(args, budgeted):
+    """Simular la conversación y devolver tokens de prompt, latencias y coste de formateo por turno"""
+    summarizer = None if OPENAI_API_KEY else truncating_summarizer
+    history = ConversationHistory(max_tokens=args.max_tokens, summarizer=summarizer)
+    messages = []
+    rows = []
+    for turn in range(args.turns):
+        user_input = LEAD_TURNS[turn % len(LEAD_TURNS)]
+        messages.append({"sender": "lead", "content": user_input})
+        history.append("lead", user_input)
+
+        start = time.perf_counter()
+        formatted = history.format() if budgeted else old_history(messages)
+        format_time = time.perf_counter() - start
+        prompt_tokens = count_tokens(SYSTEM_PROMPT) + count_tokens(formatted) + count_tokens(user_input)
+
+        if OPENAI_API_KEY:
+            from src.llm.model import generate_response
+            start = time.perf_counter()
+            reply = generate_response(user_input, history if budgeted else messages, {})
+            latency = time.perf_counter() - start
+        else:
+            reply = AGENT_TURNS[turn % len(AGENT_TURNS)]
+            latency = estimated_latency(prompt_tokens, args)
+        messages.append({"sender": "agent", "content": reply})
+        history.append("agent", reply)
+        rows.append((prompt_tokens, latency, format_time))
+        # En una llamada real el resumen termina mientras el lead habla
+        history.wait()
+    return rows, history.summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--max-tokens", type=int, default=1500, help="Presupuesto de tokens del historial")
+    parser.add_argument("--base-latency", type=float, default=0.4, help="Latencia estimada sin prompt (s)")
+    parser.add_argument("--ms-per-token", type=float, default=0.15, help="Latencia estimada por token de prompt (ms)")
+    args = parser.parse_args()
+
+    before, _ = run(args, budgeted=False)
+    after, summaries = run(args, budgeted=True)
+    kind = "medida" if OPENAI_API_KEY else "estimada"
+
+    print(f"{'turno':>6} {'tokens antes':>13} {'tokens después':>15} {f'latencia {kind} antes (s)':>27} "
+          f"{f'latencia {kind} después (s)':>29}")
+    for turn in sorted({1, *range(10, args.turns + 1, 10), args.turns}):
+        (tokens_before, latency_before, _), (tokens_after, latency_after, _) = before[turn - 1], after[turn - 1]
+        print(f"{turn:>6} {tokens_before:>13} {tokens_after:>15} {latency_before:>27.2f} {latency_after:>29.2f}")
+
+    print(f"tokens de prompt totales: {sum(r[0] for r in before)} antes, {sum(r[0] for r in after)} después")
+    print(f"latencia media por turno: {statistics.mean(r[1] for r in before):.2f} s antes, "
+          f"{statistics.mean(r[1] for r in after):.2f} s después")
+    print(f"formateo del historial en el último turno: {before[-1][2] * 1e6:.0f} µs antes, "
+          f"{after[-1][2] * 1e6:.0f} µs después")
+    print(f"resúmenes generados en segundo plano: {summaries}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark del transporte HTTP compartido: conexiones nuevas por turno
+
+Levanta un servidor local con la forma de la API de chat de OpenAI y simula
+varias sesiones concurrentes en las que cada turno hace las tres llamadas
+habituales (intención, extracción y respuesta). Compara un cliente propio por
+módulo (comportamiento anterior) con el transporte compartido, contando las
+conexiones que recibe el servidor durante el calentamiento y después.
+
+El servidor es HTTP sin TLS: cada conexión nueva equivale a una negociación
+TLS evitada frente a la API real.
+
+Uso:
+    python benchmarks/bench_http_transport.py --sessions 4 --turns 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+from src.llm import clients
+from src.llm.fake_server import FakeOpenAIServer
+from src.llm.transport import configure_http_transport, get_transport_stats
+
+
+def separate_models(base_url):
+    """Un cliente con su propio pool de conexiones por módulo, como antes"""
+    from langchain_openai import ChatOpenAI
+    from openai import OpenAI
+    response = ChatOpenAI(openai_api_key="sk-bench", openai_api_base=base_url, temperature=0.7)
+    intent = ChatOpenAI(openai_api_key="sk-bench", openai_api_base=base_url, temperature=0.3)
+    extraction = OpenAI(api_key="sk-bench", base_url=base_url)
+    return response, intent, extraction
+
+
+def shared_models(base_url):
+    """Los tres clientes sobre el transporte compartido"""
+    configure_http_transport()
+    clients.OPENAI_API_KEY = "sk-bench"  # El servidor local no comprueba la clave
+    return (clients.get_chat_model(0.7, base_url=base_url), clients.get_chat_model(0.3, base_url=base_url),
+            clients.get_openai_client(base_url=base_url))
+
+
+def run_turn(models):
+    """Las tres llamadas de un turno en paralelo, como en el agente"""
+    response, intent, extraction = models
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [
+            executor.submit(intent.invoke, "¿Qué ofrecéis?"),
+            executor.submit(extraction.chat.completions.create, model="bench",
+                            messages=[{"role": "user", "content": "Soy Ana"}]),
+            executor.submit(response.invoke, "¿Qué ofrecéis?"),
+        ]
+        for future in futures:
+            future.result()
+    return time.perf_counter() - start
+
+
+def run(server, models, sessions, turns):
+    """Ejecutar las sesiones y devolver conexiones en el primer turno, después y latencias"""
+    server.reset_stats()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        warmup = list(executor.map(lambda _: run_turn(models), range(sessions)))
+        warm_connections = server.stats()["connections"]
+        latencies = list(executor.map(lambda _: run_turn(models), range(sessions * (turns - 1))))
+    return warm_connections, server.stats()["connections"] - warm_connections, warmup, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=4, help="Sesiones concurrentes")
+    parser.add_argument("--turns", type=int, default=10, help="Turnos por sesión")
+    parser.add_argument("--latency", type=float, default=0.02, help="Latencia simulada del servidor (s)")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(latency=args.latency)
+    base_url = server.start()
+
+    later_turns = args.sessions * (args.turns - 1)
+    print(f"{'modo':>12} {'conexiones 1er turno':>21} {'conexiones/turno después':>25} "
+          f"{'latencia 1er turno (ms)':>24} {'latencia después (ms)':>22}")
+    for name, factory in (("separados", separate_models), ("compartido", shared_models)):
+        warm, after, warmup, latencies = run(server, factory(base_url), args.sessions, args.turns)
+        print(f"{name:>12} {warm:>21} {after / later_turns:>25.2f} "
+              f"{statistics.mean(warmup) * 1000:>24.1f} {statistics.median(latencies) * 1000:>22.1f}")
+    print(f"métricas del transporte compartido: {get_transport_stats()}")
+
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
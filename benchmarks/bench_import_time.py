@@ -0,0 +1,73 @@
+"""
+Benchmark del tiempo de importación del paquete y del primer uso de los clientes
+
+Importa los módulos en un proceso nuevo con `python -X importtime` y muestra el
+tiempo acumulado de cada uno y los imports más costosos. Mide además cuánto
+cuesta crear el modelo de chat y el cliente de OpenAI en su primer uso, que ya
+no se paga al importar.
+
+Uso:
+    python benchmarks/bench_import_time.py --top 10
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+MODULES = ["src.config", "src.monitoring", "src.database", "src.llm", "src.voice", "src.conversation"]
+
+FIRST_USE = """
+import time
+start = time.perf_counter()
+from src.llm.model import llm
+from src.voice.asr import client
+imported = time.perf_counter()
+llm.get()
+client.get()
+print(imported - start, time.perf_counter() - imported)
+"""
+
+
+def import_times(statement):
+    """Ejecutar un import en un proceso nuevo y devolver el tiempo acumulado de cada módulo (s)"""
+    env = dict(os.environ, PYTHONPATH=ROOT, OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY") or "sk-bench")
+    with tempfile.TemporaryDirectory() as cwd:
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                                cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, module = line.split("|")
+            if cumulative.strip().isdigit():
+                times[module.strip()] = int(cumulative) / 1e6
+    return times, result.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top", type=int, default=10, help="Imports más costosos a mostrar")
+    args = parser.parse_args()
+
+    print(f"{'módulo':>18} {'importación (s)':>16}")
+    for module in MODULES:
+        times, _ = import_times(f"import {module}")
+        print(f"{module:>18} {times[module]:>16.3f}")
+
+    times, _ = import_times("import src.conversation")
+    print("imports más costosos de src.conversation (acumulado):")
+    external = {m: t for m, t in times.items() if not m.startswith("src")}
+    for module, elapsed in sorted(external.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{module:>40} {elapsed:>8.3f}")
+
+    _, output = import_times(FIRST_USE)
+    imported, first_use = (float(value) for value in output.split())
+    print(f"importar los módulos de los clientes: {imported:.3f} s; crearlos en el primer uso: {first_use:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark del clasificador local de intenciones: latencia, acierto y derivaciones al LLM
+
+Mide la latencia del clasificador local y su acierto sobre un conjunto
+etiquetado a mano (distinto de los ejemplos semilla), y la proporción de
+turnos que el modo híbrido derivaría al LLM según el umbral de confianza.
+Con OPENAI_API_KEY mide además la concordancia con las etiquetas del LLM y la
+latencia de cada modo.
+
+Uso:
+    python benchmarks/bench_intent_classifier.py --threshold 0.6
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+from src.config import OPENAI_API_KEY, INTENT_CONFIDENCE_THRESHOLD
+from src.conversation.intent_classifier import classify_intent
+
+# (texto del lead, intención esperada)
+LABELED_TURNS = [
+    ("Buenas tardes", "GREETING"),
+    ("Hola, ¿qué tal estás?", "GREETING"),
+    ("¿Qué soluciones tenéis para empresas de logística?", "INQUIRY"),
+    ("Me gustaría saber cómo funciona vuestro CRM", "INQUIRY"),
+    ("¿Ofrecéis también mantenimiento?", "INQUIRY"),
+    ("¿Cuánto cuesta la licencia por usuario?", "PRICING"),
+    ("¿Hay algún descuento si pagamos el año entero?", "PRICING"),
+    ("Tenemos un presupuesto de unos 8.000 euros", "PRICING"),
+    ("¿En qué plazo podríais tenerlo funcionando?", "TIMELINE"),
+    ("Lo necesitamos antes de septiembre", "TIMELINE"),
+    ("Es bastante urgente para nosotros", "TIMELINE"),
+    ("Necesitamos que se integre con nuestro ERP", "REQUIREMENTS"),
+    ("Somos un equipo de veinte comerciales y todo va en hojas de cálculo", "REQUIREMENTS"),
+    ("Queremos informes automáticos de ventas cada semana", "REQUIREMENTS"),
+    ("Mi correo es laura@distnorte.es", "CONTACT_INFO"),
+    ("Podéis llamarme al 600 123 456", "CONTACT_INFO"),
+    ("Me llamo Carlos y trabajo en Logística Rápida", "CONTACT_INFO"),
+    ("Ahora mismo usamos HubSpot", "COMPETITOR"),
+    ("Otra empresa nos ha ofrecido algo parecido más barato", "COMPETITOR"),
+    ("Me parece un precio demasiado alto", "OBJECTION"),
+    ("No tengo claro que mi equipo vaya a usarlo", "OBJECTION"),
+    ("Ahora no es buen momento para cambiar", "OBJECTION"),
+    ("Me interesa, ¿podemos hacer una demo?", "INTEREST"),
+    ("Enviadme una propuesta y lo vemos", "INTEREST"),
+    ("Suena bien, ¿cuáles son los siguientes pasos?", "INTEREST"),
+    ("Gracias, eso es todo por hoy", "CLOSING"),
+    ("Hasta luego, hablamos pronto", "CLOSING"),
+    ("¿Viste el partido de ayer?", "IRRELEVANT"),
+    ("Qué calor hace hoy", "IRRELEVANT"),
+    ("Cuéntame un chiste", "IRRELEVANT"),
+]
+
+
+def evaluate(detect):
+    """Aplicar un detector al conjunto etiquetado y devolver etiquetas y latencias"""
+    labels, latencies = [], []
+    for text, _ in LABELED_TURNS:
+        start = time.perf_counter()
+        labels.append(detect(text))
+        latencies.append(time.perf_counter() - start)
+    return labels, latencies
+
+
+def accuracy(labels, expected):
+    """Proporción de etiquetas que coinciden con las esperadas"""
+    return sum(1 for label, target in zip(labels, expected) if label == target) / len(expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threshold", type=float, default=INTENT_CONFIDENCE_THRESHOLD,
+                        help="Confianza mínima para no consultar al LLM")
+    parser.add_argument("--repeat", type=int, default=200, help="Repeticiones para medir la latencia local")
+    args = parser.parse_args()
+
+    expected = [intent for _, intent in LABELED_TURNS]
+    classify_intent("hola")  # Cargar o entrenar el modelo antes de medir
+
+    predictions, _ = evaluate(classify_intent)
+    latencies = []
+    for _ in range(args.repeat):
+        latencies.extend(evaluate(classify_intent)[1])
+    local_labels = [intent for intent, _ in predictions]
+    deferred = [confidence < args.threshold for _, confidence in predictions]
+    confident = [(label, target) for label, target, defer in zip(local_labels, expected, deferred) if not defer]
+
+    print(f"turnos etiquetados: {len(LABELED_TURNS)}")
+    print(f"latencia local: mediana {statistics.median(latencies) * 1e6:.0f} µs, "
+          f"p95 {statistics.quantiles(latencies, n=20)[18] * 1e6:.0f} µs")
+    print(f"acierto local: {accuracy(local_labels, expected):.0%}")
+    print(f"derivados al LLM con umbral {args.threshold}: {sum(deferred)} ({sum(deferred) / len(deferred):.0%})")
+    if confident:
+        print(f"acierto local sin derivar: {accuracy(*zip(*confident)):.0%}")
+
+    if not OPENAI_API_KEY:
+        print("Sin OPENAI_API_KEY: se omite la comparación con el LLM")
+        return
+
+    from src.conversation.intent import detect_intent
+
+    print(f"{'modo':>7} {'acierto':>8} {'concordancia con LLM':>21} {'latencia/turno (s)':>19}")
+    llm_labels = None
+    for mode in ("llm", "hybrid", "local"):
+        labels, mode_latencies = evaluate(lambda text: detect_intent(text, mode=mode))
+        llm_labels = llm_labels or labels
+        print(f"{mode:>7} {accuracy(labels, expected):>8.0%} {accuracy(labels, llm_labels):>21.0%} "
+              f"{statistics.mean(mode_latencies):>19.3f}")
+
+
+if __name__ == "__main__":
+    main()
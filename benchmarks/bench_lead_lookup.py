@@ -0,0 +1,74 @@
+"""
+Benchmark de escalado de búsquedas de leads con y sin las migraciones de índices
+
+Uso:
+    python benchmarks/bench_lead_lookup.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+from src.database.connection import configure_database
+from src.database.migrations import apply_migrations
+from src.database.models import LeadDetails
+from src.database.repository import get_lead_by_email, update_lead_details, get_db_connection
+
+
+def populate(conn, size):
+    """Insertar leads sintéticos en bloque"""
+    with open("data/schema.sql") as f:
+        conn.executescript(f.read())
+    conn.executemany(
+        "INSERT INTO leads (name, company, email) VALUES (?, ?, ?)",
+        ((f"Lead {i}", f"Empresa {i % 500}", f"lead{i}@example.com") for i in range(size))
+    )
+    conn.commit()
+
+
+def time_lookups(size, lookups):
+    """Medir la latencia media de get_lead_by_email en microsegundos"""
+    emails = [f"lead{random.randrange(size)}@example.com" for _ in range(lookups)]
+    start = time.perf_counter()
+    for email in emails:
+        get_lead_by_email(email)
+    return (time.perf_counter() - start) / lookups * 1e6
+
+
+def time_upserts(size, updates):
+    """Medir la latencia media de update_lead_details en microsegundos"""
+    start = time.perf_counter()
+    for _ in range(updates):
+        update_lead_details(LeadDetails(lead_id=random.randrange(1, size + 1), budget="10000"))
+    return (time.perf_counter() - start) / updates * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--lookups", type=int, default=200, help="Búsquedas por medición")
+    args = parser.parse_args()
+
+    print(f"{'leads':>10} {'sin índices (µs)':>18} {'con índices (µs)':>18} {'upsert (µs)':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            configure_database(os.path.join(tmp, f"leads_{size}.db"))
+            conn = get_db_connection()
+            populate(conn, size)
+
+            before = time_lookups(size, args.lookups)
+            apply_migrations(conn)
+            after = time_lookups(size, args.lookups)
+            upsert = time_upserts(size, args.lookups)
+
+            print(f"{size:>10} {before:>18.1f} {after:>18.1f} {upsert:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark de la caché de respuestas del LLM: tasa de aciertos y latencia ahorrada
+
+El modelo se sustituye por uno con latencia fija para medir solo el efecto de
+la caché sobre una carga con entradas cortas muy repetidas.
+
+Uso:
+    python benchmarks/bench_llm_cache.py --calls 2000 --latency 0.05
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+from src.conversation.intent import INTENT_SYSTEM_PROMPT, INTENT_USER_PROMPT
+from src.llm.cache import cached_invoke, configure_response_cache
+from src.llm.clients import make_messages
+
+# Respuestas cortas habituales de los leads, de más a menos frecuentes
+INPUTS = ["sí", "Sí.", "no", "gracias", "Gracias!", "vale", "de acuerdo", "no sé", "ok", "perfecto",
+          "Sí, claro", "más adelante", "no, gracias", "¿cuánto cuesta?", "llámame mañana"]
+
+
+class SlowModel:
+    """Modelo simulado con latencia fija por llamada"""
+
+    model_name = "simulado"
+    temperature = 0.3
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+
+    def invoke(self, messages, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return SimpleNamespace(content="INTEREST")
+
+
+def workload(calls, unique):
+    """Generar entradas con frecuencias tipo Zipf más una cola de textos únicos"""
+    weights = [1 / (rank + 1) for rank in range(len(INPUTS))]
+    for i in range(calls):
+        if random.random() < unique:
+            yield f"Mensaje único número {i} sobre nuestro proyecto"
+        else:
+            yield random.choices(INPUTS, weights)[0]
+
+
+def run(count, unique, latency, **cache_options):
+    """Ejecutar la carga y devolver tiempo total, llamadas al modelo y métricas"""
+    random.seed(42)
+    cache = configure_response_cache(**cache_options)
+    model = SlowModel(latency)
+    start = time.perf_counter()
+    for text in workload(count, unique):
+        messages = make_messages(INTENT_SYSTEM_PROMPT, INTENT_USER_PROMPT.format(text=text))
+        cached_invoke("intent", model, messages, text)
+    return time.perf_counter() - start, model.calls, cache.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Latencia simulada por llamada (s)")
+    parser.add_argument("--unique", type=float, default=0.3, help="Proporción de entradas únicas")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        modes = (
+            ("sin caché", {"calls": []}),
+            ("memoria", {"calls": ["intent"]}),
+            ("memoria+SQLite", {"calls": ["intent"], "path": os.path.join(tmp, "llm_cache.db")}),
+        )
+        print(f"{'modo':>15} {'tiempo (s)':>11} {'llamadas LLM':>13} {'tasa de aciertos':>17}")
+        for name, options in modes:
+            elapsed, model_calls, stats = run(args.calls, args.unique, args.latency, **options)
+            print(f"{name:>15} {elapsed:>11.2f} {model_calls:>13} {stats['hit_rate']:>16.0%}")
+
+        # Un segundo proceso con el mismo fichero parte con la caché caliente
+        elapsed, model_calls, stats = run(
+            args.calls, args.unique, args.latency, calls=["intent"], path=os.path.join(tmp, "llm_cache.db")
+        )
+        print(f"{'SQLite caliente':>15} {elapsed:>11.2f} {model_calls:>13} {stats['hit_rate']:>16.0%}")
+
+    configure_response_cache()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark de las políticas de llamada: latencia de cola con reintentos y peticiones duplicadas
+
+Levanta un servidor local con la forma de la API de chat de OpenAI que inyecta
+latencia: la mayoría de respuestas tardan unos milisegundos, una fracción se
+queda bloqueada y otra devuelve 503. Compara las llamadas sin política, con
+reintentos y con reintentos más petición duplicada tras el p95.
+
+Uso:
+    python benchmarks/bench_llm_policy.py --calls 300 --stall 0.05 --errors 0.03
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+from src.llm import clients
+from src.llm.clients import get_chat_model, make_messages
+from src.llm.fake_server import FakeOpenAIServer
+from src.llm.policy import (
+    CallPolicy,
+    LLMCallError,
+    POLICIES,
+    invoke_with_policy,
+    get_call_stats,
+    reset_call_stats
+)
+
+
+def run(server, model, calls, policy):
+    """Hacer las llamadas con una política y devolver latencias, fallos y peticiones enviadas"""
+    POLICIES["intent"] = policy
+    reset_call_stats()
+    server.reset_stats()
+    messages = make_messages("Detecta la intención", "¿Cuánto cuesta?")
+    latencies, failures = [], 0
+    for _ in range(calls):
+        start = time.perf_counter()
+        try:
+            invoke_with_policy("intent", model, messages)
+        except LLMCallError:
+            failures += 1
+        latencies.append(time.perf_counter() - start)
+    return latencies, failures, server.stats()["requests"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.03, help="Latencia habitual del servidor (s)")
+    parser.add_argument("--stall", type=float, default=0.05, help="Proporción de respuestas bloqueadas")
+    parser.add_argument("--stall-latency", type=float, default=2.0, help="Duración de un bloqueo (s)")
+    parser.add_argument("--errors", type=float, default=0.03, help="Proporción de respuestas 503")
+    parser.add_argument("--timeout", type=float, default=1.0, help="Tiempo máximo por intento (s)")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(latency=args.latency, jitter=0.2, stall_rate=args.stall,
+                              stall_latency=args.stall_latency, error_rate=args.errors, seed=42)
+    server.start()
+    clients.OPENAI_API_KEY = "sk-bench"  # El servidor local no comprueba la clave
+    model = get_chat_model(0.3, base_url=server.base_url)
+
+    policies = (
+        ("sin política", CallPolicy(timeout=args.stall_latency * 2, max_attempts=1)),
+        ("reintentos", CallPolicy(timeout=args.timeout, backoff=0.05, max_backoff=0.2)),
+        ("reintentos+duplicada", CallPolicy(timeout=args.timeout, backoff=0.05, max_backoff=0.2, hedge=True)),
+    )
+    print(f"{'política':>21} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'máx (ms)':>9} "
+          f"{'fallos':>7} {'peticiones/llamada':>19}")
+    for name, policy in policies:
+        latencies, failures, requests = run(server, model, args.calls, policy)
+        cuts = statistics.quantiles(latencies, n=100)
+        print(f"{name:>21} {cuts[49] * 1000:>9.0f} {cuts[94] * 1000:>9.0f} {cuts[98] * 1000:>9.0f} "
+              f"{max(latencies) * 1000:>9.0f} {failures:>7} {requests / args.calls:>19.2f}")
+        stats = get_call_stats().get("intent", {})
+        if stats.get("hedges"):
+            print(f"{'':>21} duplicadas: {stats['hedges']}, ganadas por la duplicada: {stats['hedge_wins']}")
+
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
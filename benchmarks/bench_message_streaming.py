@@ -0,0 +1,108 @@
+"""
+Benchmark de lectura de una conversación larga: filas/s y memoria pico
+
+Compara la ruta anterior (fetchall + Message validado por fila) con la
+lectura completa sin validación y con el recorrido paginado por clave.
+
+Uso:
+    python benchmarks/bench_message_streaming.py --messages 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+from src.database.connection import configure_database
+from src.database.models import Message
+from src.database.repository import (
+    initialize_database,
+    get_db_connection,
+    get_conversation_messages,
+    iter_conversation_messages,
+)
+
+
+def read_validated(conversation_id):
+    """Ruta anterior: fetchall y un Message validado por fila"""
+    cursor = get_db_connection().cursor()
+    cursor.execute(
+        "SELECT * FROM messages WHERE conversation_id = ? ORDER BY timestamp",
+        (conversation_id,)
+    )
+    return [
+        Message(
+            id=row['id'],
+            conversation_id=row['conversation_id'],
+            sender=row['sender'],
+            content=row['content'],
+            timestamp=row['timestamp']
+        )
+        for row in cursor.fetchall()
+    ]
+
+
+def consume_stream(conversation_id):
+    """Recorrer la conversación sin materializarla completa"""
+    count = 0
+    for _ in iter_conversation_messages(conversation_id):
+        count += 1
+    return count
+
+
+def measure(func, conversation_id):
+    """Medir tiempo y memoria pico de una estrategia de lectura"""
+    # El tiempo se mide sin tracemalloc, que penaliza cada asignación
+    start = time.perf_counter()
+    result = func(conversation_id)
+    elapsed = time.perf_counter() - start
+    count = result if isinstance(result, int) else len(result)
+    del result
+
+    tracemalloc.start()
+    func(conversation_id)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_database(os.path.join(tmp, "messages.db"))
+        initialize_database()
+        conn = get_db_connection()
+        conn.execute("INSERT INTO leads (name) VALUES ('Benchmark')")
+        conversation_id = conn.execute("INSERT INTO conversations (lead_id) VALUES (1)").lastrowid
+        now = datetime.now()
+        conn.executemany(
+            "INSERT INTO messages (conversation_id, sender, content, timestamp) VALUES (?, ?, ?, ?)",
+            (
+                (conversation_id, "lead" if i % 2 else "agent", f"Mensaje de prueba número {i} " * 3, now)
+                for i in range(args.messages)
+            )
+        )
+        conn.commit()
+
+        strategies = (
+            ("validado (anterior)", read_validated),
+            ("sin validación", get_conversation_messages),
+            ("paginado por clave", consume_stream),
+        )
+        print(f"{'estrategia':>20} {'filas/s':>12} {'memoria pico (MB)':>18}")
+        for name, func in strategies:
+            count, elapsed, peak = measure(func, conversation_id)
+            print(f"{name:>20} {count / elapsed:>12.0f} {peak / 1024 / 1024:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark del coste de la instrumentación de los turnos, desactivada y activada
+
+Mide el coste de abrir y cerrar una etapa y de registrar los tokens de una
+llamada, y el de un turno completo del agente con las etapas sustituidas por
+funciones instantáneas, de modo que todo el tiempo medido es sobrecarga del
+agente. Con la instrumentación activada se usan los tres exportadores
+(memoria, JSONL en un fichero temporal y Prometheus sin servidor).
+
+Uso:
+    python benchmarks/bench_monitoring.py --spans 200000 --turns 2000
+"""
+import argparse
+import contextlib
+import os
+import statistics
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+from src.conversation.agent import VoiceAgent
+from src.database.models import Lead
+from src.database.repository import initialize_database, create_lead
+from src.monitoring import (
+    configure_monitoring,
+    span,
+    turn,
+    record_usage,
+    MemoryExporter,
+    JsonlExporter,
+    PrometheusExporter
+)
+
+
+def time_spans(count):
+    """Coste medio (ns) de una etapa vacía y de registrar una llamada"""
+    start = time.perf_counter_ns()
+    for _ in range(count):
+        with contextlib.nullcontext():
+            pass
+    baseline = (time.perf_counter_ns() - start) / count
+
+    start = time.perf_counter_ns()
+    for _ in range(count):
+        with span("stage.response"):
+            pass
+    spans = (time.perf_counter_ns() - start) / count
+
+    start = time.perf_counter_ns()
+    for _ in range(count):
+        record_usage("response", "gpt-3.5-turbo", 400, 40)
+    usage = (time.perf_counter_ns() - start) / count
+    return baseline, spans, usage
+
+
+def time_turns(lead_id, turns):
+    """Duraciones (µs) de los turnos del agente con etapas instantáneas"""
+    samples = []
+    with patch("src.conversation.agent.detect_intent_with_source", return_value=("INQUIRY", "llm")), \
+         patch("src.conversation.agent.extract_lead_info", side_effect=lambda text, info: info), \
+         patch("src.conversation.agent.generate_response", return_value="Respuesta simulada"):
+        agent = VoiceAgent(concurrent=False)
+        agent.start_session(lead_id)
+        agent.history.summarize = False
+        for i in range(turns):
+            start = time.perf_counter()
+            with turn(input="text"):
+                agent.process_text_input(f"Mensaje de prueba {i}")
+            samples.append((time.perf_counter() - start) * 1e6)
+        agent.end_session()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--spans", type=int, default=200000, help="Etapas medidas")
+    parser.add_argument("--turns", type=int, default=2000, help="Turnos medidos en cada modo")
+    parser.add_argument("--rounds", type=int, default=10, help="Rondas alternando los dos modos")
+    args = parser.parse_args()
+
+    initialize_database()
+    lead_id = create_lead(Lead(name="Benchmark", email="benchmark@example.com"))
+    modes = (("desactivada", False), ("activada", True))
+
+    with tempfile.TemporaryDirectory() as folder:
+        memory = MemoryExporter()
+        configure_monitoring(exporters=[memory, JsonlExporter(os.path.join(folder, "turns.jsonl")), PrometheusExporter()])
+
+        # Los modos se alternan por rondas para que el crecimiento de la base
+        # de datos afecte por igual a ambos
+        turn_samples = {name: [] for name, _ in modes}
+        span_costs = {}
+        for round_number in range(args.rounds):
+            for name, enabled in modes:
+                configure_monitoring(enabled=enabled)
+                if round_number == 0:
+                    # Calentamiento: tokenizador, conexión a la base de datos y ficheros
+                    time_turns(lead_id, 20)
+                    span_costs[name] = time_spans(args.spans)
+                turn_samples[name] += time_turns(lead_id, args.turns // args.rounds)
+        configure_monitoring(enabled=False, exporters=[])
+
+        print(f"{'instrumentación':>16} {'with vacío':>11} {'etapa':>10} {'tokens':>10} {'turno p50':>10} {'turno p95':>10}")
+        for name, _ in modes:
+            baseline, spans, usage = span_costs[name]
+            ordered = sorted(turn_samples[name])
+            print(f"{name:>16} {baseline:>9.0f}ns {spans:>8.0f}ns {usage:>8.0f}ns "
+                  f"{statistics.median(ordered):>8.0f}µs {ordered[int(0.95 * (len(ordered) - 1))]:>8.0f}µs")
+
+        record = memory.recent()[-1]
+        print(f"\nEtapas por turno con la instrumentación activada: {len(record['spans'])} "
+              f"({', '.join(sorted(record['stages']))})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark de búsqueda de mensajes: FTS5 frente a LIKE
+
+Uso:
+    python benchmarks/bench_search.py --messages 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+from src.database.connection import configure_database
+from src.database.repository import initialize_database, get_db_connection, search_messages
+
+WORDS = (
+    "necesitamos automatizar ventas equipo comercial presupuesto plazo integración correo "
+    "clientes informes panel soporte migración datos nube seguridad contrato licencias "
+    "formación usuarios reunión propuesta demo precio descuento trimestre proyecto"
+).split()
+RARE_TERMS = ["salesforce", "hubspot", "zoho", "pipedrive"]
+QUERIES = ["salesforce", "hubspot precio", "zoho migración", "presupuesto trimestre"]
+
+
+def populate(messages, conversations):
+    """Insertar mensajes sintéticos; ~1% menciona a un competidor"""
+    conn = get_db_connection()
+    conn.executemany("INSERT INTO leads (name) VALUES (?)", [(f"Lead {i}",) for i in range(conversations)])
+    conn.executemany("INSERT INTO conversations (lead_id) VALUES (?)", [(i + 1,) for i in range(conversations)])
+    now = datetime.now()
+
+    def rows():
+        for i in range(messages):
+            words = random.choices(WORDS, k=12)
+            if random.random() < 0.01:
+                words[random.randrange(12)] = random.choice(RARE_TERMS)
+            yield (random.randint(1, conversations), "lead", " ".join(words), now)
+
+    conn.executemany(
+        "INSERT INTO messages (conversation_id, sender, content, timestamp) VALUES (?, ?, ?, ?)",
+        rows()
+    )
+    conn.commit()
+
+
+def time_like(query):
+    """Búsqueda previa: escaneo completo con LIKE por cada término
+
+    Sin LIMIT, ya que ordenar por relevancia exige ver todas las coincidencias.
+    """
+    terms = query.split()
+    sql = "SELECT id, content FROM messages WHERE " + " AND ".join("content LIKE ?" for _ in terms)
+    start = time.perf_counter()
+    get_db_connection().execute(sql, [f"%{t}%" for t in terms]).fetchall()
+    return (time.perf_counter() - start) * 1000
+
+
+def time_fts(query, limit):
+    """Búsqueda con FTS5 ordenada por relevancia"""
+    start = time.perf_counter()
+    search_messages(query, limit=limit)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--conversations", type=int, default=20_000)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_database(os.path.join(tmp, "search.db"))
+        initialize_database()
+
+        start = time.perf_counter()
+        populate(args.messages, args.conversations)
+        print(f"{args.messages} mensajes insertados e indexados en {time.perf_counter() - start:.1f} s")
+
+        print(f"{'consulta':>24} {'LIKE (ms)':>10} {'FTS5 (ms)':>10}")
+        for query in QUERIES:
+            print(f"{query:>24} {time_like(query):>10.1f} {time_fts(query, args.limit):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
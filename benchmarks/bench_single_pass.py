@@ -0,0 +1,103 @@
+"""
+Benchmark de latencia y coste por turno: tres llamadas frente a una sola llamada
+
+Requiere OPENAI_API_KEY, ya que mide llamadas reales al modelo configurado.
+
+Uso:
+    python benchmarks/bench_single_pass.py --repeat 2
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+from langchain_core.callbacks import BaseCallbackHandler
+from src.config import OPENAI_API_KEY, LLM_MODEL_NAME
+from src.conversation.agent import VoiceAgent
+from src.conversation.intent import intent_model
+from src.database.repository import initialize_database
+from src.llm.model import llm
+
+# Conversaciones fijas para que ambos modos procesen exactamente los mismos turnos
+TRANSCRIPTS = [
+    [
+        "Hola, me llamo Laura Gómez y trabajo en Distribuciones Norte.",
+        "Estamos buscando un CRM para un equipo comercial de quince personas.",
+        "Tenemos un presupuesto de unos 12.000 euros anuales.",
+        "Nos gustaría tenerlo funcionando antes de septiembre.",
+        "Mi correo es laura.gomez@distnorte.es, enviadme una propuesta.",
+    ],
+    [
+        "Buenas, soy Carlos de Logística Rápida.",
+        "Ahora usamos hojas de cálculo y perdemos muchos pedidos.",
+        "¿Cuánto cuesta la automatización de procesos que ofrecéis?",
+        "Ahora mismo estamos comparando con Salesforce.",
+        "Podéis llamarme al +34 600 123 456 la semana que viene.",
+    ],
+]
+
+
+class UsageCounter(BaseCallbackHandler):
+    """Acumula llamadas y tokens informados por la API"""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self.calls += 1
+        self.prompt_tokens += usage.get("prompt_tokens", 0)
+        self.completion_tokens += usage.get("completion_tokens", 0)
+
+
+def run_mode(single_pass, repeat):
+    """Procesar todas las transcripciones y devolver la latencia de cada turno"""
+    latencies = []
+    for _ in range(repeat):
+        for transcript in TRANSCRIPTS:
+            agent = VoiceAgent(single_pass=single_pass)
+            agent.start_session()
+            for turn in transcript:
+                start = time.perf_counter()
+                agent.process_text_input(turn)
+                latencies.append(time.perf_counter() - start)
+            agent.end_session()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=1, help="Repeticiones del conjunto de transcripciones")
+    parser.add_argument("--prompt-price", type=float, default=0.5, help="USD por millón de tokens de entrada")
+    parser.add_argument("--completion-price", type=float, default=1.5, help="USD por millón de tokens de salida")
+    args = parser.parse_args()
+
+    if not OPENAI_API_KEY:
+        sys.exit("Este benchmark necesita OPENAI_API_KEY")
+
+    initialize_database()
+    print(f"modelo: {LLM_MODEL_NAME}")
+    print(f"{'modo':>14} {'llamadas/turno':>15} {'media (s)':>10} {'p95 (s)':>8} {'tokens/turno':>13} {'USD/1000 turnos':>16}")
+    for name, single_pass in (("tres llamadas", False), ("una llamada", True)):
+        counter = UsageCounter()
+        llm.callbacks = [counter]
+        intent_model.callbacks = [counter]
+        latencies = run_mode(single_pass, args.repeat)
+
+        turns = len(latencies)
+        tokens = (counter.prompt_tokens + counter.completion_tokens) / turns
+        cost = (counter.prompt_tokens * args.prompt_price + counter.completion_tokens * args.completion_price) / 1e6
+        p95 = statistics.quantiles(latencies, n=20)[-1] if turns > 1 else latencies[0]
+        print(f"{name:>14} {counter.calls / turns:>15.1f} {statistics.mean(latencies):>10.2f} "
+              f"{p95:>8.2f} {tokens:>13.0f} {cost / turns * 1000:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark del tiempo hasta el primer audio: respuesta completa frente a streaming por frases
+
+Requiere OPENAI_API_KEY y acceso a gTTS. El audio no se reproduce: se mide el
+momento en que el primer fichero de voz está listo para sonar.
+
+Uso:
+    python benchmarks/bench_time_to_first_audio.py --repeat 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+from src.config import OPENAI_API_KEY
+from src.llm.model import generate_response, stream_response
+from src.voice.tts import text_to_speech, cleanup_audio_files, SpeechStream
+
+PROMPTS = [
+    "Hola, estamos buscando un CRM para un equipo de veinte comerciales. ¿Qué nos podéis ofrecer?",
+    "¿Cómo funciona la automatización de procesos y cuánto se tarda en implantar?",
+    "Nuestro presupuesto es limitado, ¿tenéis planes para pequeñas empresas?",
+]
+
+
+def bench_full(prompt):
+    """Ruta anterior: respuesta completa y síntesis de todo el texto"""
+    start = time.perf_counter()
+    response = generate_response(prompt)
+    audio_file = text_to_speech(response, play_audio=False)
+    first_audio = time.perf_counter() - start
+    return first_audio, first_audio, [audio_file] if audio_file else []
+
+
+def bench_streaming(prompt):
+    """Respuesta en streaming sintetizada frase a frase"""
+    start = time.perf_counter()
+    first_audio = []
+    speech = SpeechStream(play_audio=False, on_audio=lambda audio_file: first_audio.append(time.perf_counter() - start))
+    speech.feed(stream_response(prompt))
+    audio_files = speech.close()
+    return first_audio[0] if first_audio else float("nan"), time.perf_counter() - start, audio_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=1, help="Repeticiones de cada prompt")
+    args = parser.parse_args()
+
+    if not OPENAI_API_KEY:
+        sys.exit("Este benchmark necesita OPENAI_API_KEY")
+
+    print(f"{'modo':>10} {'primer audio (s)':>17} {'audio completo (s)':>19}")
+    for name, bench in (("completa", bench_full), ("streaming", bench_streaming)):
+        first, total = [], []
+        for _ in range(args.repeat):
+            for prompt in PROMPTS:
+                first_audio, elapsed, audio_files = bench(prompt)
+                first.append(first_audio)
+                total.append(elapsed)
+                cleanup_audio_files(audio_files)
+        print(f"{name:>10} {statistics.mean(first):>17.2f} {statistics.mean(total):>19.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark del camino crítico de un turno: etapas en serie frente a concurrentes
+
+Las llamadas al LLM se sustituyen por esperas con la latencia indicada, de
+modo que el resultado refleja solo la planificación de las etapas.
+
+Uso:
+    python benchmarks/bench_turn_pipeline.py --intent 0.6 --extraction 0.9 --response 1.2
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from unittest.mock import patch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+os.chdir(ROOT)
+
+from src.conversation.agent import VoiceAgent
+from src.database.models import Lead
+from src.database.repository import initialize_database, create_lead
+
+STAGES = ("intent", "extraction", "database", "response", "total")
+
+
+def run_turns(lead_id, concurrent, turns, latencies):
+    """Procesar varios turnos y devolver la duración media de cada etapa"""
+    def intent(text):
+        time.sleep(latencies["intent"])
+        return "INQUIRY", "llm"
+
+    def extraction(text, info):
+        time.sleep(latencies["extraction"])
+        return {**info, "needs": text}
+
+    def response(text, history, info):
+        time.sleep(latencies["response"])
+        return "Respuesta simulada"
+
+    samples = {stage: [] for stage in STAGES}
+    with patch("src.conversation.agent.detect_intent_with_source", side_effect=intent), \
+         patch("src.conversation.agent.extract_lead_info", side_effect=extraction), \
+         patch("src.conversation.agent.generate_response", side_effect=response):
+        agent = VoiceAgent(concurrent=concurrent)
+        agent.start_session(lead_id)
+        for i in range(turns):
+            agent.process_text_input(f"Mensaje de prueba {i}")
+            for stage in STAGES:
+                samples[stage].append(agent.last_turn_timings.get(stage, 0.0))
+        agent.end_session()
+    return {stage: statistics.mean(values) for stage, values in samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--intent", type=float, default=0.6, help="Latencia simulada de la intención (s)")
+    parser.add_argument("--extraction", type=float, default=0.9, help="Latencia simulada de la extracción (s)")
+    parser.add_argument("--response", type=float, default=1.2, help="Latencia simulada de la respuesta (s)")
+    args = parser.parse_args()
+
+    initialize_database()
+    lead_id = create_lead(Lead(name="Benchmark", email="benchmark@example.com"))
+    latencies = {"intent": args.intent, "extraction": args.extraction, "response": args.response}
+
+    print(f"{'modo':>12} " + " ".join(f"{stage:>11}" for stage in STAGES))
+    for name, concurrent in (("serie", False), ("concurrente", True)):
+        means = run_turns(lead_id, concurrent, args.turns, latencies)
+        print(f"{name:>12} " + " ".join(f"{means[stage]:>10.3f}s" for stage in STAGES))
+
+
+if __name__ == "__main__":
+    main()
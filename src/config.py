@@ -10,21 +10,91 @@ DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 
 # Configuración de la base de datos
 DATABASE_PATH = os.getenv("DATABASE_PATH", ":memory:")  # Usar base de datos en memoria por defecto
+DATABASE_SNAPSHOT_PATH = os.getenv("DATABASE_SNAPSHOT_PATH", "")  # Volcado a disco de la base en memoria al salir
+DATABASE_SYNCHRONOUS = os.getenv("DATABASE_SYNCHRONOUS", "NORMAL").upper()  # OFF, NORMAL, FULL o EXTRA
+DATABASE_CACHE_SIZE = int(os.getenv("DATABASE_CACHE_SIZE", "-20000"))  # Valores negativos en KiB (~20 MB)
+DATABASE_MMAP_SIZE = int(os.getenv("DATABASE_MMAP_SIZE", str(256 * 1024 * 1024)))
+DATABASE_BUSY_TIMEOUT = float(os.getenv("DATABASE_BUSY_TIMEOUT", "5.0"))  # Segundos de espera ante bloqueos
+DATABASE_STATEMENT_CACHE_SIZE = int(os.getenv("DATABASE_STATEMENT_CACHE_SIZE", "256"))
+DATABASE_EXECUTOR_QUEUE_SIZE = int(os.getenv("DATABASE_EXECUTOR_QUEUE_SIZE", "1000"))  # Operaciones asíncronas en cola
+LEAD_CACHE_SIZE = int(os.getenv("LEAD_CACHE_SIZE", "1024"))  # Leads en la caché de lectura
+LEAD_CACHE_TTL = float(os.getenv("LEAD_CACHE_TTL", "300"))  # Segundos de validez de cada lead en caché
+MESSAGE_PAGE_SIZE = int(os.getenv("MESSAGE_PAGE_SIZE", "500"))  # Mensajes por página al recorrer conversaciones
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))  # Antigüedad mínima de conversaciones a archivar
+ARCHIVE_COMPRESSION_LEVEL = int(os.getenv("ARCHIVE_COMPRESSION_LEVEL", "10"))  # Nivel de compresión zstandard
+SEARCH_RESULTS_LIMIT = int(os.getenv("SEARCH_RESULTS_LIMIT", "20"))  # Resultados por búsqueda de mensajes
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "5000"))  # Registros por transacción en importaciones masivas
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "8"))  # Conversaciones por llamada al LLM al reextraer datos de leads
+BACKFILL_BATCH_TOKENS = int(os.getenv("BACKFILL_BATCH_TOKENS", "3000"))  # Tokens máximos de mensajes por llamada
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "4"))  # Llamadas al LLM simultáneas
 
 # Configuración del modelo de lenguaje
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")  # URL alternativa de la API (vacío = api.openai.com)
 LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "gpt-3.5-turbo")
 LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.7"))
+LLM_SINGLE_PASS = os.getenv("LLM_SINGLE_PASS", "False").lower() == "true"  # Intención, datos y respuesta en una sola llamada
+LLM_CONCURRENT_TURN = os.getenv("LLM_CONCURRENT_TURN", "True").lower() == "true"  # Etapas independientes del turno en paralelo
+LLM_TURN_WORKERS = int(os.getenv("LLM_TURN_WORKERS", "8"))  # Hilos compartidos para las etapas de los turnos
+LLM_INTENT_TIMEOUT = float(os.getenv("LLM_INTENT_TIMEOUT", "10"))  # Segundos máximos por etapa del turno
+LLM_EXTRACTION_TIMEOUT = float(os.getenv("LLM_EXTRACTION_TIMEOUT", "15"))
+LLM_RESPONSE_TIMEOUT = float(os.getenv("LLM_RESPONSE_TIMEOUT", "30"))
+LLM_TURN_DEADLINE = float(os.getenv("LLM_TURN_DEADLINE", "45"))  # Segundos máximos para todas las llamadas de un turno (0 = sin límite)
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))  # Intentos por llamada ante errores recuperables
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))  # Espera inicial entre intentos (se duplica en cada uno)
+LLM_RETRY_MAX_BACKOFF = float(os.getenv("LLM_RETRY_MAX_BACKOFF", "4"))  # Espera máxima entre intentos
+LLM_HEDGE_CALLS = [c.strip() for c in os.getenv("LLM_HEDGE_CALLS", "").split(",") if c.strip()]  # Llamadas con petición duplicada (p. ej. intent,extraction)
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))  # Percentil de latencia tras el que se duplica la petición
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.1"))  # Espera mínima antes de duplicar (s)
+LLM_CACHE_CALLS = [c.strip() for c in os.getenv("LLM_CACHE_CALLS", "").split(",") if c.strip()]  # response, extraction y/o intent
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "1024"))  # Respuestas en la caché en memoria
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))  # Segundos de validez de cada respuesta (0 = sin caducidad)
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")  # Fichero SQLite compartido entre procesos (vacío = solo memoria)
+LLM_CACHE_MAX_ROWS = int(os.getenv("LLM_CACHE_MAX_ROWS", "100000"))  # Respuestas máximas en el fichero SQLite
+LLM_HISTORY_MAX_TOKENS = int(os.getenv("LLM_HISTORY_MAX_TOKENS", "1500"))  # Tokens máximos del historial en el prompt (0 = sin límite)
+LLM_HISTORY_KEEP_MESSAGES = int(os.getenv("LLM_HISTORY_KEEP_MESSAGES", "6"))  # Mensajes recientes que nunca se resumen
+LLM_HISTORY_SUMMARY = os.getenv("LLM_HISTORY_SUMMARY", "True").lower() == "true"  # Resumir los mensajes antiguos en segundo plano
+
+# Configuración del transporte HTTP compartido con OpenAI
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))  # Conexiones simultáneas máximas
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))  # Conexiones inactivas que se mantienen abiertas (≥ llamadas concurrentes habituales)
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "120"))  # Segundos antes de cerrar una conexión inactiva
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "60"))  # Segundos máximos de lectura y escritura
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))  # Segundos máximos para establecer la conexión
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "True").lower() == "true"  # HTTP/2 si el paquete h2 está instalado
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "")  # Fichero en el que grabar o del que reproducir las peticiones a OpenAI (vacío = red real)
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "replay").lower()  # record, replay o auto
 
 # Configuración de la voz
 ASR_MODEL = os.getenv("ASR_MODEL", "whisper-1")
 TTS_LANGUAGE = os.getenv("TTS_LANGUAGE", "es")  # Idioma para la síntesis de voz
 AUDIO_TEMP_FOLDER = os.getenv("AUDIO_TEMP_FOLDER", "temp_audio")
+TTS_MIN_SENTENCE_CHARS = int(os.getenv("TTS_MIN_SENTENCE_CHARS", "20"))  # Longitud mínima de cada fragmento de voz en streaming
+
+# Configuración de la instrumentación de los turnos
+MONITORING_ENABLED = os.getenv("MONITORING_ENABLED", "False").lower() == "true"  # Medir etapas, tokens y coste de cada turno
+MONITORING_EXPORTERS = [e.strip() for e in os.getenv("MONITORING_EXPORTERS", "memory").split(",") if e.strip()]  # memory, jsonl y/o prometheus
+MONITORING_BUFFER_SIZE = int(os.getenv("MONITORING_BUFFER_SIZE", "200"))  # Turnos recientes que se conservan en memoria
+MONITORING_JSONL_PATH = os.getenv("MONITORING_JSONL_PATH", "data/turns.jsonl")  # Fichero con un turno por línea
+MONITORING_PROMETHEUS_PORT = int(os.getenv("MONITORING_PROMETHEUS_PORT", "9464"))  # Puerto de /metrics (0 = solo generar el texto)
+MONITORING_PRICES = os.getenv("MONITORING_PRICES", "")  # JSON modelo -> [USD por millón de tokens de entrada, de salida]
+
+
+# Los directorios temporales se crean al usarlos, no al importar la configuración
+def ensure_audio_temp_folder():
+    """Crear la carpeta de audio temporal si no existe y devolver su ruta"""
+    os.makedirs(AUDIO_TEMP_FOLDER, exist_ok=True)
+    return AUDIO_TEMP_FOLDER
 
-# Creación de directorios temporales si no existen
-os.makedirs(AUDIO_TEMP_FOLDER, exist_ok=True)
 
 # Configuración del agente
 AGENT_NAME = os.getenv("AGENT_NAME", "Asistente de Ventas")
 COMPANY_NAME = os.getenv("COMPANY_NAME", "ATOM")
-COMPANY_DESCRIPTION = os.getenv("COMPANY_DESCRIPTION", "Una empresa líder en soluciones tecnológicas")
\ No newline at end of file
+COMPANY_DESCRIPTION = os.getenv("COMPANY_DESCRIPTION", "Una empresa líder en soluciones tecnológicas")
+MESSAGE_FLUSH_SIZE = int(os.getenv("MESSAGE_FLUSH_SIZE", "20"))  # Mensajes pendientes antes de escribir
+MESSAGE_FLUSH_INTERVAL = float(os.getenv("MESSAGE_FLUSH_INTERVAL", "5.0"))  # Segundos máximos sin escribir
+ENTITY_EXTRACTION_POLICY = os.getenv("ENTITY_EXTRACTION_POLICY", "auto").lower()  # llm, auto o rules
+
+INTENT_CLASSIFIER_MODE = os.getenv("INTENT_CLASSIFIER_MODE", "llm").lower()  # llm, hybrid o local
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.6"))  # Confianza mínima del clasificador local
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", "data/intent_model.npz")  # Modelo entrenado con los mensajes
@@ -1,9 +1,17 @@
 from src.conversation.agent import VoiceAgent
-from src.conversation.intent import detect_intent
-from src.conversation.entities import extract_lead_info
+from src.conversation.intent import detect_intent, detect_intent_with_source
+from src.conversation.intent_classifier import classify_intent, train_intent_classifier
+from src.conversation.entities import extract_lead_info, pre_extract, get_extraction_stats
+from src.conversation.backfill import backfill_lead_details
 
 __all__ = [
     'VoiceAgent',
     'detect_intent',
+    'detect_intent_with_source',
+    'classify_intent',
+    'train_intent_classifier',
     'extract_lead_info',
+    'pre_extract',
+    'get_extraction_stats',
+    'backfill_lead_details',
 ]
\ No newline at end of file
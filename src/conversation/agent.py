@@ -2,12 +2,31 @@
 Módulo principal del agente de voz para nutrición de leads
 """
 import json
+import time
+import atexit
+import weakref
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
-from src.llm.model import generate_response
+from src.config import (
+    MESSAGE_FLUSH_SIZE,
+    MESSAGE_FLUSH_INTERVAL,
+    LLM_SINGLE_PASS,
+    LLM_CONCURRENT_TURN,
+    LLM_TURN_WORKERS,
+    LLM_INTENT_TIMEOUT,
+    LLM_EXTRACTION_TIMEOUT,
+    LLM_RESPONSE_TIMEOUT,
+    LLM_TURN_DEADLINE
+)
+from src.llm.model import generate_response, stream_response, analyze_turn
+from src.llm.history import ConversationHistory
+from src.llm.policy import turn_deadline, LLMCallError, DeadlineExceeded
+from src.monitoring import span, turn
 from src.voice.asr import transcribe_audio
-from src.voice.tts import text_to_speech, cleanup_audio_files
-from src.conversation.intent import detect_intent
-from src.conversation.entities import extract_lead_info, create_lead_from_info, update_lead_from_info
+from src.voice.tts import text_to_speech, cleanup_audio_files, SpeechStream
+from src.conversation.intent import detect_intent_with_source, INTENTS
+from src.conversation.entities import extract_lead_info, merge_lead_info, create_lead_from_info, update_lead_from_info
 from src.database.models import Lead, LeadDetails, Conversation, Message
 from src.database.repository import (
     create_lead,
@@ -17,24 +36,58 @@ from src.database.repository import (
     start_conversation,
     end_conversation,
     add_message,
+    add_messages,
     get_conversation_messages
 )
 
+# Agentes vivos cuyos mensajes pendientes deben escribirse al salir del proceso
+_active_agents = weakref.WeakSet()
+
+# Hilos compartidos por todos los agentes para ejecutar las etapas de cada turno
+_turn_executor = ThreadPoolExecutor(max_workers=LLM_TURN_WORKERS, thread_name_prefix="agent-turn")
+
+# Respuesta cuando la generación falla o supera su tiempo máximo
+RESPONSE_FALLBACK_MESSAGE = "Disculpa, no he podido procesar tu mensaje. ¿Podrías repetírmelo?"
+
+
+@atexit.register
+def _flush_active_agents():
+    """
+    Escribir los mensajes pendientes de todos los agentes al cerrar el proceso
+    """
+    for agent in list(_active_agents):
+        agent.flush_messages()
+
 
 class VoiceAgent:
     """
     Agente de voz para nutrición de leads
     """
     
-    def __init__(self):
+    def __init__(self, single_pass=None, concurrent=None):
         """
         Inicializar el agente de voz
+        
+        Args:
+            single_pass (bool, optional): Analizar cada turno con una sola llamada
+                al LLM (por defecto, LLM_SINGLE_PASS)
+            concurrent (bool, optional): Ejecutar en paralelo las etapas
+                independientes del turno (por defecto, LLM_CONCURRENT_TURN)
         """
+        self.single_pass = LLM_SINGLE_PASS if single_pass is None else single_pass
+        self.concurrent = LLM_CONCURRENT_TURN if concurrent is None else concurrent
+        self.last_intent = None
+        self.last_intent_source = None  # "llm", "local" o None si la intención es de respaldo
+        self.last_turn_timings = {}
         self.current_lead = None
         self.lead_info = {}
         self.conversation_id = None
         self.conversation_history = []
+        self.history = ConversationHistory()
         self.audio_files = []
+        self._pending_messages = []
+        self._pending_since = None
+        _active_agents.add(self)
     
     def start_session(self, lead_id=None):
         """
@@ -46,6 +99,9 @@ class VoiceAgent:
         Returns:
             str: Mensaje de bienvenida del agente
         """
+        # Escribir los mensajes pendientes de una sesión anterior
+        self.flush_messages()
+        
         # Si se proporciona un ID de lead, cargar el lead existente
         if lead_id:
             self.current_lead = get_lead_by_id(lead_id)
@@ -66,65 +122,130 @@ class VoiceAgent:
         
         # Limpiar el historial de conversación
         self.conversation_history = []
+        self.history.clear()
         
         # Generar mensaje de bienvenida
         greeting = self._generate_greeting()
         
         # Agregar mensaje a la conversación
         self._add_to_history("agent", greeting)
+        self.flush_messages()
         
         return greeting
     
-    def process_voice_input(self):
+    def process_voice_input(self, stream_voice=False):
         """
         Procesar entrada de voz del usuario
         
+        Args:
+            stream_voice (bool): Responder con voz frase a frase mientras se
+                genera la respuesta
+            
         Returns:
             tuple: (texto_transcrito, respuesta_del_agente)
         """
-        # Transcribir audio a texto
-        transcribed_text = transcribe_audio()
-        
-        if not transcribed_text:
-            response = "Lo siento, no pude entender lo que dijiste. ¿Podrías repetirlo?"
-            self._add_to_history("agent", response)
-            return "", response
-        
-        # Procesar el texto y generar respuesta
-        return transcribed_text, self.process_text_input(transcribed_text)
+        # La grabación y la transcripción cuentan en el mismo turno que la respuesta
+        with turn(input="voice", conversation_id=self.conversation_id):
+            # Transcribir audio a texto
+            transcribed_text = transcribe_audio()
+            
+            if not transcribed_text:
+                response = "Lo siento, no pude entender lo que dijiste. ¿Podrías repetirlo?"
+                self._add_to_history("agent", response)
+                self.flush_messages()
+                return "", response
+            
+            # Procesar el texto y generar respuesta
+            return transcribed_text, self.process_text_input(transcribed_text, stream_voice)
     
-    def process_text_input(self, user_input):
+    def process_text_input(self, user_input, stream_voice=False):
         """
         Procesar entrada de texto del usuario
         
         Args:
             user_input (str): Texto del usuario
+            stream_voice (bool): Responder con voz frase a frase mientras se
+                genera la respuesta, en lugar de devolver solo el texto
             
         Returns:
             str: Respuesta del agente
         """
-        # Agregar entrada del usuario al historial
-        self._add_to_history("lead", user_input)
+        # Etapas, tokens y coste del turno (sin efecto si la instrumentación está desactivada)
+        with turn(conversation_id=self.conversation_id, stream_voice=stream_voice) as current_turn:
+            response = self._process_turn(user_input, stream_voice)
+            current_turn.set(conversation_id=self.conversation_id, intent=self.last_intent)
+        return response
+    
+    def _process_turn(self, user_input, stream_voice):
+        """
+        Procesar un turno: intención, datos del lead, respuesta y escritura
         
-        # Detectar intención del usuario
-        intent = detect_intent(user_input)
+        Args:
+            user_input (str): Texto del usuario
+            stream_voice (bool): Responder con voz frase a frase
+            
+        Returns:
+            str: Respuesta del agente
+        """
+        turn_start = time.perf_counter()
+        timings = {}
+        self.last_turn_timings = timings
+        self.last_intent_source = None
         
-        # Extraer información del lead
-        updated_lead_info = extract_lead_info(user_input, self.lead_info)
-        self.lead_info = updated_lead_info
+        # Agregar entrada del usuario al historial; se encola para la base de datos
+        # al final del turno, cuando ya se conoce su intención (un volcado por
+        # tamaño o por tiempo lo escribiría antes sin ella)
+        lead_message = self._add_to_history("lead", user_input, queue=False)
         
-        # Actualizar o crear el lead en la base de datos
-        self._update_lead_in_db()
+        respond = generate_response
+        speech = None
+        if stream_voice:
+            speech = SpeechStream(
+                on_audio=lambda audio_file: timings.setdefault("first_audio", time.perf_counter() - turn_start)
+            )
+            respond = lambda *args: speech.feed(stream_response(*args))
         
-        # Generar respuesta basada en la intención y el contexto
-        response = generate_response(
-            user_input,
-            self.conversation_history,
-            self.lead_info
-        )
+        response = None
+        try:
+            # Todas las llamadas al LLM del turno comparten un plazo máximo
+            with turn_deadline(LLM_TURN_DEADLINE):
+                try:
+                    # Intentar obtener intención, datos y respuesta en una sola llamada
+                    if self.single_pass:
+                        response = self._run_stage(timings, "analysis", self._process_single_pass, user_input)
+                    
+                    # Si no está activado o falla, usar las tres llamadas independientes
+                    if response is None:
+                        if self.concurrent:
+                            response = self._process_concurrent(user_input, timings, respond)
+                        else:
+                            response = self._process_sequential(user_input, timings, respond)
+                    
+                    timings["total"] = time.perf_counter() - turn_start
+                finally:
+                    if speech:
+                        # Lo que siga llegando de una respuesta fuera de plazo ya no se dice
+                        speech.stop()
+                        if not speech.spoken and response:
+                            # Respuestas que no se generaron en streaming (una sola llamada o respaldo)
+                            speech.say(response)
+                        elif response == RESPONSE_FALLBACK_MESSAGE:
+                            # La respuesta falló después de empezar a sonar: se guarda lo que se dijo
+                            response = speech.text
+                        self.audio_files.extend(speech.close())
+            
+            # Registrar la intención para reentrenar el clasificador local solo si la
+            # decidió el LLM: ni los valores de respaldo ni las predicciones del
+            # propio clasificador son etiquetas fiables
+            if lead_message and self.last_intent_source == "llm":
+                lead_message.intent = self.last_intent
+        finally:
+            if lead_message:
+                self._queue_message(lead_message)
         
-        # Agregar respuesta al historial
+        # Agregar respuesta al historial y escribir el turno completo
         self._add_to_history("agent", response)
+        self.flush_messages()
         
         return response
     
@@ -150,6 +271,9 @@ class VoiceAgent:
         Returns:
             bool: True si la sesión se cerró correctamente
         """
+        # Escribir los mensajes pendientes antes de cerrar la conversación
+        self.flush_messages()
+        
         # Finalizar la conversación en la base de datos
         if self.conversation_id:
             end_conversation(self.conversation_id)
@@ -163,6 +287,7 @@ class VoiceAgent:
         self.lead_info = {}
         self.conversation_id = None
         self.conversation_history = []
+        self.history.clear()
         
         return True
     
@@ -175,6 +300,192 @@ class VoiceAgent:
         """
         return self.lead_info
     
+    def flush_messages(self):
+        """
+        Escribir en la base de datos los mensajes pendientes en una sola transacción
+        
+        Returns:
+            bool: True si no quedan mensajes pendientes
+        """
+        if not self._pending_messages:
+            return True
+        
+        pending = self._pending_messages
+        try:
+            with span("db.flush", messages=len(pending)):
+                add_messages(pending)
+        except Exception as e:
+            # Conservar los mensajes para reintentar en el próximo volcado
+            print(f"Error al guardar mensajes: {e}")
+            return False
+        
+        self._pending_messages = []
+        self._pending_since = None
+        return True
+    
+    def _process_single_pass(self, user_input):
+        """
+        Analizar el turno con una única llamada estructurada al LLM
+        
+        Args:
+            user_input (str): Texto del usuario
+            
+        Returns:
+            str: Respuesta del agente, o None si el análisis no es válido
+        """
+        analysis = analyze_turn(user_input, self.history, self.lead_info, INTENTS)
+        if analysis is None:
+            return None
+        
+        self.last_intent, self.last_intent_source = analysis.intent, "llm"
+        self.lead_info = merge_lead_info(self.lead_info, analysis.lead_info.model_dump(exclude_none=True))
+        self._update_lead_in_db()
+        return analysis.reply
+    
+    def _process_sequential(self, user_input, timings, respond):
+        """
+        Procesar el turno con las tres llamadas al LLM una tras otra
+        
+        Args:
+            user_input (str): Texto del usuario
+            timings (dict): Duración de cada etapa en segundos
+            respond (callable): Función que genera la respuesta
+            
+        Returns:
+            str: Respuesta del agente
+        """
+        # Si una llamada falla tras su política se continúa con lo ya conocido,
+        # igual que en el modo concurrente
+        
+        # Detectar intención del usuario
+        self.last_intent, self.last_intent_source = self._run_stage_or_default(
+            timings, "intent", (self.last_intent, None), detect_intent_with_source, user_input
+        )
+        
+        # Extraer información del lead
+        self.lead_info = self._run_stage_or_default(
+            timings, "extraction", self.lead_info, extract_lead_info, user_input, self.lead_info
+        )
+        
+        # Actualizar o crear el lead en la base de datos
+        self._run_stage(timings, "database", self._update_lead_in_db)
+        
+        # Generar respuesta basada en la intención y el contexto
+        return self._run_stage_or_default(
+            timings, "response", RESPONSE_FALLBACK_MESSAGE, respond, user_input, self.history, self.lead_info
+        )
+    
+    def _process_concurrent(self, user_input, timings, respond):
+        """
+        Procesar el turno lanzando cada etapa en cuanto sus dependencias están listas
+        
+        La intención y la extracción se ejecutan en paralelo. La respuesta solo
+        depende de los datos extraídos, así que se genera a la vez que se
+        actualiza el lead en la base de datos, sin esperar a la intención.
+        
+        Args:
+            user_input (str): Texto del usuario
+            timings (dict): Duración de cada etapa en segundos
+            respond (callable): Función que genera la respuesta
+            
+        Returns:
+            str: Respuesta del agente
+        """
+        intent_future = self._submit_stage(timings, "intent", detect_intent_with_source, user_input)
+        extraction_future = self._submit_stage(timings, "extraction", extract_lead_info, user_input, self.lead_info)
+        
+        # Sin datos nuevos a tiempo se continúa con la información ya conocida
+        self.lead_info = self._stage_result(extraction_future, "extraction", LLM_EXTRACTION_TIMEOUT, self.lead_info)
+        
+        database_future = self._submit_stage(timings, "database", self._update_lead_in_db)
+        response_future = self._submit_stage(
+            timings, "response", respond, user_input, self.history, self.lead_info
+        )
+        response = self._stage_result(response_future, "response", LLM_RESPONSE_TIMEOUT, RESPONSE_FALLBACK_MESSAGE)
+        
+        # La respuesta se guarda en la conversación que haya podido crear la base de datos
+        self._stage_result(database_future, "database", None, None)
+        self.last_intent, self.last_intent_source = self._stage_result(
+            intent_future, "intent", LLM_INTENT_TIMEOUT, ("IRRELEVANT", None)
+        )
+        return response
+    
+    def _run_stage(self, timings, name, func, *args):
+        """
+        Ejecutar una etapa del turno registrando su duración
+        
+        Args:
+            timings (dict): Duración de cada etapa en segundos
+            name (str): Nombre de la etapa
+            func (callable): Función de la etapa
+            
+        Returns:
+            El resultado de la etapa
+        """
+        start = time.perf_counter()
+        try:
+            with span(f"stage.{name}"):
+                return func(*args)
+        finally:
+            timings[name] = time.perf_counter() - start
+    
+    def _run_stage_or_default(self, timings, name, default, func, *args):
+        """
+        Ejecutar una etapa del turno usando un valor por defecto si el LLM falla
+        
+        Args:
+            timings (dict): Duración de cada etapa en segundos
+            name (str): Nombre de la etapa
+            default: Valor a usar si la llamada falla o se agota el plazo del turno
+            func (callable): Función de la etapa
+            
+        Returns:
+            El resultado de la etapa o el valor por defecto
+        """
+        try:
+            return self._run_stage(timings, name, func, *args)
+        except (LLMCallError, DeadlineExceeded) as e:
+            print(f"Error en la etapa {name}: {e}")
+            return default
+    
+    def _submit_stage(self, timings, name, func, *args):
+        """
+        Lanzar una etapa del turno en los hilos compartidos
+        
+        Se copia el contexto actual para que las etapas hereden las variables
+        de contexto del turno.
+        
+        Returns:
+            concurrent.futures.Future: Resultado pendiente de la etapa
+        """
+        context = contextvars.copy_context()
+        return _turn_executor.submit(context.run, self._run_stage, timings, name, func, *args)
+    
+    def _stage_result(self, future, name, timeout, default):
+        """
+        Esperar el resultado de una etapa con un tiempo máximo
+        
+        Si la etapa no termina a tiempo se cancela (si aún no había empezado)
+        y se descarta su resultado; si falla, se usa el valor por defecto.
+        
+        Args:
+            future (concurrent.futures.Future): Resultado pendiente de la etapa
+            name (str): Nombre de la etapa
+            timeout (float): Segundos máximos de espera, o None para esperar siempre
+            default: Valor a usar si la etapa no termina a tiempo o falla
+            
+        Returns:
+            El resultado de la etapa o el valor por defecto
+        """
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            print(f"Tiempo agotado en la etapa {name} tras {timeout} s")
+        except Exception as e:
+            print(f"Error en la etapa {name}: {e}")
+        return default
+    
     def _generate_greeting(self):
         """
         Generar un mensaje de bienvenida para el lead
@@ -187,13 +498,18 @@ class VoiceAgent:
         else:
             return "Hola, soy AsistenteATOM, el asistente virtual de ATOM. Estoy aquí para conocer más sobre tus necesidades tecnológicas y cómo podemos ayudarte. ¿Podrías contarme un poco sobre ti y tu empresa?"
     
-    def _add_to_history(self, sender, content):
+    def _add_to_history(self, sender, content, queue=True):
         """
         Agregar un mensaje al historial de conversación
         
         Args:
             sender (str): Remitente del mensaje ('agent' o 'lead')
             content (str): Contenido del mensaje
+            queue (bool): Encolar el mensaje para la base de datos; si es False,
+                se encola después con _queue_message
+            
+        Returns:
+            Message: Mensaje para la base de datos, o None si no hay conversación activa
         """
         # Agregar al historial en memoria
         message = {
@@ -202,8 +518,9 @@ class VoiceAgent:
             "timestamp": datetime.now().isoformat()
         }
         self.conversation_history.append(message)
+        self.history.append(sender, content)
         
-        # Agregar a la base de datos si hay una conversación activa
+        # Encolar para la base de datos si hay una conversación activa
         if self.conversation_id:
             message_obj = Message(
                 conversation_id=self.conversation_id,
@@ -211,7 +528,26 @@ class VoiceAgent:
                 content=content,
                 timestamp=datetime.now()
             )
-            add_message(message_obj)
+            if queue:
+                self._queue_message(message_obj)
+            return message_obj
+        return None
+    
+    def _queue_message(self, message):
+        """
+        Encolar un mensaje para escribirlo en la base de datos
+        
+        Args:
+            message (Message): Mensaje a escribir
+        """
+        self._pending_messages.append(message)
+        if self._pending_since is None:
+            self._pending_since = time.monotonic()
+        
+        # Volcar antes del fin de turno si se supera el tamaño o el tiempo máximo
+        if (len(self._pending_messages) >= MESSAGE_FLUSH_SIZE
+                or time.monotonic() - self._pending_since >= MESSAGE_FLUSH_INTERVAL):
+            self.flush_messages()
     
     def _update_lead_in_db(self):
         """
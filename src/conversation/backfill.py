@@ -0,0 +1,327 @@
+"""
+Reextracción por lotes de los datos de los leads a partir de las conversaciones guardadas
+
+Cuando cambian los prompts de extracción o FIELD_MAPPING, este trabajo vuelve
+a extraer los datos de todas las conversaciones:
+
+- recorre las conversaciones con paginación por clave y lee los mensajes del
+  lead de cada página en una sola consulta (los de conversaciones archivadas,
+  desde su archivo), sin cargar todo en memoria;
+- agrupa varias conversaciones en cada llamada al LLM (BACKFILL_BATCH_SIZE
+  conversaciones, hasta BACKFILL_BATCH_TOKENS tokens de mensajes) y mantiene
+  hasta BACKFILL_CONCURRENCY llamadas en curso;
+- escribe los detalles de cada lote con update_lead_details_many en la misma
+  transacción que el punto de control, de modo que una ejecución interrumpida
+  o con un lote fallido se reanuda tras el último lote confirmado.
+
+El punto de control depende del prompt, del mapeo de campos y del modelo: si
+cambian, la siguiente ejecución empieza desde el principio.
+
+Uso:
+    python -m src.conversation.backfill --database data/leads.db --concurrency 4
+"""
+import argparse
+import hashlib
+import json
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from src.config import (
+    BACKFILL_BATCH_SIZE,
+    BACKFILL_BATCH_TOKENS,
+    BACKFILL_CONCURRENCY,
+    LLM_MODEL_NAME
+)
+from src.conversation.entities import FIELD_MAPPING, merge_lead_info, pre_extract
+from src.database.archive import load_archived_messages
+from src.database.connection import configure_database
+from src.database.models import LeadDetails
+from src.database.repository import (
+    MAX_QUERY_PARAMS,
+    initialize_database,
+    connection,
+    transaction,
+    update_lead_details_many,
+    get_job_checkpoint,
+    set_job_checkpoint,
+    clear_job_checkpoint,
+)
+from src.llm.history import count_tokens
+from src.llm.model import extract_entities_batch
+from src.llm.policy import LLMCallError
+from src.llm.prompt_templates import BATCH_EXTRACTION_PROMPT
+
+BACKFILL_JOB = "backfill_lead_details"
+
+DETAIL_FIELDS = ("budget", "needs", "product_interest", "timeline")
+
+
+def backfill_source():
+    """
+    Identificar la versión de la extracción para el punto de control
+
+    Returns:
+        str: Hash del prompt por lotes, el mapeo de campos y el modelo
+    """
+    digest = hashlib.sha256(
+        (BATCH_EXTRACTION_PROMPT + json.dumps(FIELD_MAPPING, sort_keys=True) + LLM_MODEL_NAME).encode()
+    )
+    return digest.hexdigest()[:16]
+
+
+def iter_conversations(after_id=0, page_size=MAX_QUERY_PARAMS):
+    """
+    Recorrer las conversaciones con los mensajes del lead
+
+    Args:
+        after_id (int): Empezar tras esta conversación
+        page_size (int): Conversaciones por consulta
+
+    Yields:
+        tuple: (ID de conversación, ID de lead, lista de textos del lead)
+    """
+    while True:
+        with connection() as conn:
+            page = conn.execute(
+                """
+                SELECT id, lead_id FROM conversations
+                WHERE id > ? AND lead_id IS NOT NULL
+                ORDER BY id
+                LIMIT ?
+                """,
+                (after_id, page_size)
+            ).fetchall()
+            if not page:
+                return
+            placeholders = ",".join("?" * len(page))
+            texts = {row[0]: [] for row in page}
+            for conversation_id, content in conn.execute(
+                f"""
+                SELECT conversation_id, content FROM messages
+                WHERE conversation_id IN ({placeholders}) AND sender = 'lead'
+                ORDER BY conversation_id, id
+                """,
+                [row[0] for row in page]
+            ):
+                if content:
+                    texts[conversation_id].append(content)
+            # Las conversaciones archivadas ya no tienen mensajes en la tabla messages
+            for conversation_id, conversation_texts in texts.items():
+                if not conversation_texts:
+                    archived = load_archived_messages(conn, conversation_id) or []
+                    conversation_texts.extend(m.content for m in archived if m.sender == "lead" and m.content)
+
+        for conversation_id, lead_id in page:
+            yield conversation_id, lead_id, texts[conversation_id]
+        if len(page) < page_size:
+            return
+        after_id = page[-1][0]
+
+
+def iter_batches(conversations, batch_size=BACKFILL_BATCH_SIZE, max_tokens=BACKFILL_BATCH_TOKENS):
+    """
+    Agrupar conversaciones en lotes para una llamada al LLM
+
+    Una conversación que supera por sí sola el límite de tokens forma su
+    propio lote. Las conversaciones sin mensajes del lead acompañan al lote
+    sin ocupar sitio, para que el punto de control avance sobre ellas.
+
+    Args:
+        conversations (iterable): Tuplas (ID de conversación, ID de lead, textos)
+        batch_size (int): Conversaciones con mensajes por lote
+        max_tokens (int): Tokens máximos de mensajes por lote
+
+    Yields:
+        list: Tuplas de las conversaciones del lote
+    """
+    batch, size, tokens = [], 0, 0
+    for conversation in conversations:
+        conversation_tokens = count_tokens("\n".join(conversation[2])) if conversation[2] else 0
+        if size and (size >= batch_size or tokens + conversation_tokens > max_tokens):
+            yield batch
+            batch, size, tokens = [], 0, 0
+        batch.append(conversation)
+        if conversation[2]:
+            size += 1
+            tokens += conversation_tokens
+    if batch:
+        yield batch
+
+
+def _extract_batch(batch):
+    """Extraer los datos de un lote: reglas deterministas y una llamada al LLM"""
+    conversations = {conversation_id: texts for conversation_id, _, texts in batch if texts}
+    if not conversations:
+        return {}, {"prompt_tokens": 0, "completion_tokens": 0}, 0
+    extracted, tokens = extract_entities_batch(conversations)
+
+    results = {}
+    for conversation_id, texts in conversations.items():
+        rules_info = {}
+        for text in texts:
+            rules_info.update(pre_extract(text)[0])
+        # Los valores del LLM prevalecen sobre las reglas, como en extract_lead_info
+        results[conversation_id] = merge_lead_info(merge_lead_info({}, rules_info), extracted.get(conversation_id, {}))
+    return results, tokens, 1
+
+
+def _as_text(value):
+    """Convertir un valor extraído en texto para la base de datos"""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (list, tuple)):
+        return ", ".join(str(item) for item in value)
+    return str(value)
+
+
+def _write_batch(batch, results, source):
+    """
+    Escribir los detalles de un lote y su punto de control en una transacción
+
+    Returns:
+        int: Leads actualizados
+    """
+    # Varias conversaciones de un mismo lead se combinan en orden
+    lead_info = {}
+    for conversation_id, lead_id, _ in batch:
+        if conversation_id in results:
+            lead_info[lead_id] = merge_lead_info(lead_info.get(lead_id), results[conversation_id])
+
+    details = [
+        LeadDetails(lead_id=lead_id, **{field: _as_text(info.get(field)) for field in DETAIL_FIELDS})
+        for lead_id, info in lead_info.items()
+        if any(info.get(field) for field in DETAIL_FIELDS)
+    ]
+    with transaction():
+        updated = update_lead_details_many(details)
+        set_job_checkpoint(BACKFILL_JOB, source, batch[-1][0])
+    return updated
+
+
+def backfill_lead_details(batch_size=BACKFILL_BATCH_SIZE, max_tokens=BACKFILL_BATCH_TOKENS,
+                          concurrency=BACKFILL_CONCURRENCY, resume=True, limit=None, progress=True):
+    """
+    Volver a extraer los datos de los leads de todas las conversaciones guardadas
+
+    Los lotes se escriben en el orden de las conversaciones aunque las
+    llamadas terminen en otro orden. Si un lote falla tras los reintentos de
+    su política, el trabajo se detiene y conserva el punto de control anterior.
+
+    Args:
+        batch_size (int): Conversaciones por llamada al LLM
+        max_tokens (int): Tokens máximos de mensajes por llamada
+        concurrency (int): Llamadas al LLM simultáneas
+        resume (bool): Reanudar desde el último punto de control
+        limit (int, optional): Máximo de conversaciones a procesar en esta ejecución
+        progress (bool): Mostrar el progreso por stderr
+
+    Returns:
+        dict: Conversaciones, mensajes, lotes, llamadas al LLM, leads
+            actualizados, tokens, duración y conversaciones por minuto
+    """
+    source = backfill_source()
+    start_position = get_job_checkpoint(BACKFILL_JOB, source) if resume else 0
+
+    stats = {
+        "conversations": 0, "messages": 0, "batches": 0, "llm_calls": 0, "leads_updated": 0,
+        "prompt_tokens": 0, "completion_tokens": 0, "failed_batches": 0,
+        "resumed_from": start_position, "completed": False,
+    }
+    started = time.perf_counter()
+
+    conversations = iter_conversations(start_position)
+    batches = iter_batches(conversations, batch_size, max_tokens)
+    processed = 0
+    exhausted = True
+    pending = deque()
+
+    def write_oldest():
+        batch, future = pending.popleft()
+        try:
+            results, tokens, calls = future.result()
+        except LLMCallError as e:
+            print(f"Error al extraer el lote que empieza en la conversación {batch[0][0]}: {e}", file=sys.stderr)
+            stats["failed_batches"] += 1
+            return False
+        stats["leads_updated"] += _write_batch(batch, results, source)
+        stats["batches"] += 1
+        stats["llm_calls"] += calls
+        stats["conversations"] += len(batch)
+        stats["messages"] += sum(len(texts) for _, _, texts in batch)
+        stats["prompt_tokens"] += tokens["prompt_tokens"]
+        stats["completion_tokens"] += tokens["completion_tokens"]
+        if progress:
+            rate = stats["conversations"] / (time.perf_counter() - started) * 60
+            print(
+                f"\r{stats['conversations']} conversaciones procesadas, {stats['leads_updated']} leads actualizados "
+                f"({rate:.0f} conversaciones/min, {stats['prompt_tokens'] + stats['completion_tokens']} tokens)",
+                end="", file=sys.stderr
+            )
+        return True
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="backfill") as executor:
+        ok = True
+        for batch in batches:
+            if limit is not None and processed >= limit:
+                exhausted = False
+                break
+            processed += len(batch)
+            pending.append((batch, executor.submit(_extract_batch, batch)))
+            # Los lotes se escriben en orden en cuanto hay tantos en curso como llamadas simultáneas
+            if len(pending) >= max(1, concurrency):
+                ok = write_oldest()
+                if not ok:
+                    break
+        while ok and pending:
+            ok = write_oldest()
+        # Tras un fallo, los lotes posteriores no se escriben para no saltar el punto de control
+        for _, future in pending:
+            future.cancel()
+
+    if progress:
+        print(file=sys.stderr)
+
+    stats["completed"] = ok and exhausted
+    if stats["completed"]:
+        clear_job_checkpoint(BACKFILL_JOB, source)
+
+    elapsed = time.perf_counter() - started
+    stats["elapsed"] = round(elapsed, 3)
+    stats["conversations_per_minute"] = round(stats["conversations"] / elapsed * 60, 1) if elapsed else 0.0
+    total_tokens = stats["prompt_tokens"] + stats["completion_tokens"]
+    stats["tokens_per_conversation"] = round(total_tokens / stats["conversations"], 1) if stats["conversations"] else 0.0
+    return stats
+
+
+def main(argv=None):
+    """
+    Punto de entrada de la línea de comandos
+    """
+    parser = argparse.ArgumentParser(description="Reextracción por lotes de los datos de los leads")
+    parser.add_argument("--database", help="Ruta de la base de datos (por defecto DATABASE_PATH)")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE, help="Conversaciones por llamada al LLM")
+    parser.add_argument("--batch-tokens", type=int, default=BACKFILL_BATCH_TOKENS, help="Tokens máximos de mensajes por llamada")
+    parser.add_argument("--concurrency", type=int, default=BACKFILL_CONCURRENCY, help="Llamadas al LLM simultáneas")
+    parser.add_argument("--limit", type=int, help="Máximo de conversaciones en esta ejecución")
+    parser.add_argument("--no-resume", action="store_true", help="Ignorar el punto de control de una ejecución previa")
+    parser.add_argument("--quiet", action="store_true", help="No mostrar el progreso")
+    args = parser.parse_args(argv)
+
+    if args.database:
+        configure_database(args.database)
+    initialize_database()
+
+    stats = backfill_lead_details(
+        batch_size=args.batch_size,
+        max_tokens=args.batch_tokens,
+        concurrency=args.concurrency,
+        resume=not args.no_resume,
+        limit=args.limit,
+        progress=not args.quiet
+    )
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,122 @@
 """
 Módulo para la extracción de entidades e información del lead
 """
+import re
+import threading
+from src.config import ENTITY_EXTRACTION_POLICY
 from src.llm.model import extract_entities
 from src.database.models import Lead, LeadDetails
 
+# Políticas de extracción: siempre con el LLM, LLM solo si las reglas no bastan, o solo reglas
+EXTRACTION_POLICIES = ("llm", "auto", "rules")
 
-def extract_lead_info(text, existing_lead_info=None):
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+PHONE_PATTERN = re.compile(r"(?<![\w+])\+?\(?\d[\d\s().-]{7,}\d(?!\w)")
+BUDGET_PATTERN = re.compile(
+    r"(?:[€$]\s?\d[\d.,]*(?:\s?(?:k|mil|millones?))?"
+    r"|\d[\d.,]*\s?(?:k|mil|millones?)?\s?(?:€|euros?|eur\b|\$|dólares|usd\b))",
+    re.IGNORECASE
+)
+NUMBER_WORDS = r"(?:\d+|un|una|dos|tres|cuatro|cinco|seis|siete|ocho|nueve|diez|once|doce|quince|veinte|treinta)"
+TIME_UNITS = r"(?:días?|semanas?|mes(?:es)?|años?|trimestres?)"
+MONTHS = r"(?:enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|setiembre|octubre|noviembre|diciembre)"
+TIMELINE_PATTERN = re.compile(
+    rf"\b(?:(?:en|dentro de|para|antes de|durante)\s+(?:los\s+próximos\s+|las\s+próximas\s+)?{NUMBER_WORDS}\s+{TIME_UNITS}"
+    rf"|(?:antes de|para|en|a partir de|desde)\s+(?:finales de\s+|principios de\s+|mediados de\s+)?{MONTHS}"
+    rf"|(?:el|la|este|esta)\s+(?:próximo|próxima|que viene)?\s*(?:semana|mes|año|trimestre)(?:\s+que viene)?"
+    rf"|cuanto antes|lo antes posible|de inmediato|urgente(?:mente)?|ya mismo)\b",
+    re.IGNORECASE
+)
+
+# Respuestas breves sin información del lead
+FILLER_WORDS = {
+    "ok", "okay", "vale", "sí", "si", "no", "gracias", "muchas", "claro", "perfecto", "genial", "bien",
+    "muy", "de", "acuerdo", "entendido", "hola", "buenas", "buenos", "días", "tardes", "adiós", "hasta",
+    "luego", "correcto", "exacto", "eso", "es", "mi", "el", "la", "los", "las", "y", "o", "a", "en",
+    "email", "correo", "teléfono", "telefono", "número", "numero", "móvil", "movil", "presupuesto",
+    "plazo", "unos", "unas", "sobre", "aproximadamente", "más", "menos", "así", "pues", "tenemos",
+    "sería", "seria", "mejor", "por", "favor", "este", "esta", "al", "del", "con", "para", "que",
+    "lo", "me", "nos", "te", "le", "un", "una", "son", "aquí", "tienes", "tenéis",
+    "máximo", "mínimo", "alrededor", "entre", "ronda", "nuestro", "nuestra", "contamos", "disponemos",
+    "necesitamos", "necesitaríamos", "queremos", "querríamos", "gustaría", "tenerlo", "empezar",
+    "llamadme", "llámame", "llamarme", "escríbeme", "escribidme", "contactad", "contactar", "podéis", "puedes",
+}
+_WORD = re.compile(r"[^\W\d_]+")
+
+# Mapeo de las claves devueltas por el LLM a los campos del lead
+FIELD_MAPPING = {
+    "nombre": "name",
+    "name": "name",
+    "empresa": "company",
+    "company": "company",
+    "email": "email",
+    "correo": "email",
+    "teléfono": "phone",
+    "telefono": "phone",
+    "phone": "phone",
+    "necesidades": "needs",
+    "needs": "needs",
+    "problemas": "needs",
+    "presupuesto": "budget",
+    "budget": "budget",
+    "producto": "product_interest",
+    "product_interest": "product_interest",
+    "servicio": "product_interest",
+    "plazo": "timeline",
+    "timeline": "timeline",
+    "tiempo": "timeline"
+}
+
+
+# Turnos procesados y llamadas al LLM evitadas por las reglas
+_extraction_stats = {"turns": 0, "llm_skipped": 0}
+_extraction_stats_lock = threading.Lock()
+
+
+def pre_extract(text):
+    """
+    Extraer con reglas deterministas los campos que no necesitan el LLM
+    
+    Detecta emails y teléfonos con expresiones regulares, y presupuestos y
+    plazos con heurísticas de palabras clave. Si al quitar lo reconocido solo
+    quedan palabras de relleno ("ok", "gracias", "mi email es"...), el texto no
+    contiene nada más que el LLM pueda aportar.
+    
+    Args:
+        text (str): Texto del lead
+        
+    Returns:
+        tuple: (campos extraídos, True si hace falta el LLM)
+    """
+    info = {}
+    remaining = text
+    for field, pattern in (
+        ("email", EMAIL_PATTERN),
+        ("budget", BUDGET_PATTERN),
+        ("phone", PHONE_PATTERN),
+        ("timeline", TIMELINE_PATTERN),
+    ):
+        for match in pattern.finditer(remaining):
+            value = match.group(0).strip()
+            # Un teléfono necesita entre 9 y 15 dígitos
+            if field == "phone" and not 9 <= sum(c.isdigit() for c in value) <= 15:
+                continue
+            info.setdefault(field, value)
+            remaining = remaining.replace(match.group(0), " ")
+    
+    words = _WORD.findall(remaining.lower())
+    needs_llm = any(word not in FILLER_WORDS for word in words)
+    return info, needs_llm
+
+
+def extract_lead_info(text, existing_lead_info=None, policy=None):
     """
     Extraer información del lead del texto proporcionado
     
     Args:
         text (str): Texto del lead
         existing_lead_info (dict): Información existente del lead
+        policy (str, optional): 'llm', 'auto' o 'rules' (por defecto, ENTITY_EXTRACTION_POLICY)
         
     Returns:
         dict: Información actualizada del lead
@@ -19,9 +124,49 @@ def extract_lead_info(text, existing_lead_info=None):
     if not text:
         return existing_lead_info or {}
     
-    # Extraer entidades usando el LLM
-    extracted_info = extract_entities(text, existing_lead_info)
+    policy = policy or ENTITY_EXTRACTION_POLICY
+    if policy not in EXTRACTION_POLICIES:
+        raise ValueError(f"Política de extracción no válida: {policy}")
+    
+    # Campos reconocibles sin el LLM
+    extracted_info, needs_llm = pre_extract(text)
+    
+    # Extraer entidades usando el LLM; sus valores prevalecen sobre las reglas
+    call_llm = policy == "llm" or (policy == "auto" and needs_llm)
+    if call_llm:
+        extracted_info.update(extract_entities(text, existing_lead_info))
     
+    with _extraction_stats_lock:
+        _extraction_stats["turns"] += 1
+        _extraction_stats["llm_skipped"] += not call_llm
+    
+    return merge_lead_info(existing_lead_info, extracted_info)
+
+
+def get_extraction_stats():
+    """
+    Obtener cuántos turnos se han resuelto sin llamar al LLM
+    
+    Returns:
+        dict: Turnos, llamadas evitadas y proporción evitada
+    """
+    with _extraction_stats_lock:
+        turns = _extraction_stats["turns"]
+        skipped = _extraction_stats["llm_skipped"]
+    return {"turns": turns, "llm_skipped": skipped, "skip_rate": skipped / turns if turns else 0.0}
+
+
+def merge_lead_info(existing_lead_info, extracted_info):
+    """
+    Combinar la información existente del lead con las entidades extraídas
+    
+    Args:
+        existing_lead_info (dict): Información existente del lead
+        extracted_info (dict): Entidades extraídas (claves en español o inglés)
+        
+    Returns:
+        dict: Información actualizada del lead
+    """
     # Si no hay información existente, inicializar un diccionario vacío
     if existing_lead_info is None:
         existing_lead_info = {}
@@ -29,35 +174,11 @@ def extract_lead_info(text, existing_lead_info=None):
     # Actualizar la información existente con la nueva información
     updated_info = {**existing_lead_info}
     
-    # Mapear campos específicos
-    field_mapping = {
-        "nombre": "name",
-        "name": "name",
-        "empresa": "company",
-        "company": "company",
-        "email": "email",
-        "correo": "email",
-        "teléfono": "phone",
-        "telefono": "phone",
-        "phone": "phone",
-        "necesidades": "needs",
-        "needs": "needs",
-        "problemas": "needs",
-        "presupuesto": "budget",
-        "budget": "budget",
-        "producto": "product_interest",
-        "product_interest": "product_interest",
-        "servicio": "product_interest",
-        "plazo": "timeline",
-        "timeline": "timeline",
-        "tiempo": "timeline"
-    }
-    
     # Actualizar la información con las entidades extraídas
     for key, value in extracted_info.items():
         normalized_key = key.lower()
-        if normalized_key in field_mapping and value:
-            mapped_key = field_mapping[normalized_key]
+        if normalized_key in FIELD_MAPPING and value:
+            mapped_key = FIELD_MAPPING[normalized_key]
             updated_info[mapped_key] = value
     
     return updated_info
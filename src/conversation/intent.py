@@ -1,17 +1,15 @@
 """
 Módulo para la detección de intenciones del usuario
 """
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, SystemMessage
 import json
-from src.config import OPENAI_API_KEY, LLM_MODEL_NAME
+from src.config import INTENT_CLASSIFIER_MODE, INTENT_CONFIDENCE_THRESHOLD
+from src.conversation.intent_classifier import classify_intent
+from src.llm.cache import cached_invoke
+from src.llm.clients import LazyClient, get_chat_model, make_messages
+from src.llm.policy import LLMCallError
 
-# Inicializar el modelo de lenguaje
-intent_model = ChatOpenAI(
-    openai_api_key=OPENAI_API_KEY,
-    model_name=LLM_MODEL_NAME,
-    temperature=0.3  # Temperatura baja para respuestas más deterministas
-)
+# Modelo de lenguaje (se crea en la primera llamada)
+intent_model = LazyClient(get_chat_model, 0.3)  # Temperatura baja para respuestas más deterministas
 
 # Definir las posibles intenciones
 INTENTS = {
@@ -38,36 +36,69 @@ y determinar cuál es la intención principal entre las siguientes opciones:
 Responde únicamente con el identificador de la intención (por ejemplo, "GREETING").
 """
 
+# Prompt de usuario para la detección de intenciones
+INTENT_USER_PROMPT = "Analiza la siguiente entrada del usuario y determina su intención principal:\n\n\"{text}\""
 
-def detect_intent(text):
+
+def detect_intent(text, mode=None):
     """
     Detectar la intención principal en el texto del usuario
     
+    En modo "hybrid" se consulta primero el clasificador local y solo se llama
+    al LLM cuando su confianza no alcanza INTENT_CONFIDENCE_THRESHOLD. En modo
+    "local" no se llama nunca al LLM.
+    
     Args:
         text (str): Texto del usuario
+        mode (str, optional): "llm", "hybrid" o "local" (por defecto INTENT_CLASSIFIER_MODE)
         
     Returns:
         str: Identificador de la intención detectada
     """
+    return detect_intent_with_source(text, mode)[0]
+
+
+def detect_intent_with_source(text, mode=None):
+    """
+    Detectar la intención principal indicando quién la ha decidido
+    
+    Solo las intenciones con origen "llm" sirven de etiqueta para reentrenar
+    el clasificador local.
+    
+    Args:
+        text (str): Texto del usuario
+        mode (str, optional): "llm", "hybrid" o "local" (por defecto INTENT_CLASSIFIER_MODE)
+        
+    Returns:
+        tuple: (intención, origen), con origen "llm", "local" o None si la
+            intención es un valor de respaldo (texto vacío, respuesta no
+            válida o fallo del LLM)
+    """
     if not text:
-        return "IRRELEVANT"
+        return "IRRELEVANT", None
+    
+    mode = mode or INTENT_CLASSIFIER_MODE
+    local_intent = None
+    if mode != "llm":
+        local_intent, confidence = classify_intent(text)
+        if mode == "local" or confidence >= INTENT_CONFIDENCE_THRESHOLD:
+            return local_intent, "local"
     
     # Crear mensajes para el modelo
-    messages = [
-        SystemMessage(content=INTENT_SYSTEM_PROMPT),
-        HumanMessage(content=f"Analiza la siguiente entrada del usuario y determina su intención principal:\n\n\"{text}\"")
-    ]
+    messages = make_messages(INTENT_SYSTEM_PROMPT, INTENT_USER_PROMPT.format(text=text))
     
     # Obtener la respuesta del modelo
     try:
-        response = intent_model.invoke(messages)
-        intent = response.content.strip().upper()
+        intent = cached_invoke("intent", intent_model, messages, text).strip().upper()
         
         # Verificar que la intención devuelta sea válida
         if intent in INTENTS:
-            return intent
+            return intent, "llm"
         else:
-            return "IRRELEVANT"
-    except Exception as e:
+            return "IRRELEVANT", None
+    except LLMCallError as e:
         print(f"Error en la detección de intención: {e}")
-        return "IRRELEVANT"
\ No newline at end of file
+        # Si el LLM falla, mejor la estimación local que ninguna
+        if local_intent:
+            return local_intent, "local"
+        return "IRRELEVANT", None
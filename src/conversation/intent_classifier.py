@@ -0,0 +1,395 @@
+"""
+Clasificador local de intenciones
+
+Combina reglas de palabras clave de alta precisión con un modelo Naive Bayes
+multinomial sobre TF-IDF implementado con NumPy. Responde en microsegundos y
+devuelve una confianza que detect_intent usa para decidir si consultar al LLM.
+
+El modelo parte de ejemplos semilla y puede reentrenarse con los mensajes del
+lead que ya tienen una intención registrada en la tabla messages:
+
+    python -m src.conversation.intent_classifier --database data/leads.db
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import unicodedata
+import numpy as np
+from src.config import INTENT_MODEL_PATH
+
+# Confianza asignada cuando una sola intención coincide con las reglas
+RULE_CONFIDENCE = 0.95
+
+# Reglas de palabras clave (sobre texto en minúsculas y sin tildes)
+KEYWORD_RULES = {
+    "GREETING": [r"^(hola|buenas|buenos dias|buenas tardes|buenas noches)\W*$"],
+    "CLOSING": [r"\b(adios|hasta luego|hasta pronto|eso es todo|nada mas|que tengas buen dia)\b"],
+    "CONTACT_INFO": [r"[\w.+-]+@[\w-]+\.[\w.-]+", r"\b(mi (email|correo|telefono|movil|numero) es)\b"],
+    "COMPETITOR": [r"\b(salesforce|hubspot|zoho|pipedrive|competencia|otro proveedor)\b"],
+    "PRICING": [r"\b(precio|precios|cuanto cuesta|cuanto vale|tarifa|tarifas|coste|costo)\b"],
+    "TIMELINE": [r"\b(plazo|plazos|cuanto tarda|cuanto tiempo|fecha de entrega|cuando estaria)\b"],
+}
+_COMPILED_RULES = {intent: [re.compile(p) for p in patterns] for intent, patterns in KEYWORD_RULES.items()}
+
+# Ejemplos semilla para disponer de un modelo sin datos registrados
+SEED_EXAMPLES = {
+    "GREETING": [
+        "hola", "buenos días", "hola, qué tal", "buenas tardes, encantado", "hola, ¿cómo estás?",
+        "saludos", "hola, soy yo otra vez",
+    ],
+    "INQUIRY": [
+        "¿qué servicios ofrecéis?", "me gustaría saber más sobre vuestros productos",
+        "¿tenéis alguna solución de CRM?", "¿cómo funciona vuestra plataforma?",
+        "¿qué incluye el servicio de automatización?", "¿hacéis desarrollo a medida?",
+        "quería información sobre vuestras soluciones",
+    ],
+    "PRICING": [
+        "¿cuánto cuesta?", "¿qué precio tiene el plan básico?", "¿tenéis descuentos por volumen?",
+        "nuestro presupuesto es de 10.000 euros", "¿cuál es la tarifa mensual?",
+        "¿cuánto costaría para veinte usuarios?", "es importante que el coste sea razonable",
+    ],
+    "TIMELINE": [
+        "¿cuánto tardaríais en implantarlo?", "lo necesitamos para el mes que viene",
+        "¿en qué plazo estaría listo?", "queremos empezar en tres meses",
+        "¿para cuándo podría estar funcionando?", "tenemos prisa, es urgente",
+        "la fecha límite es septiembre",
+    ],
+    "REQUIREMENTS": [
+        "necesitamos automatizar el proceso de ventas", "tenemos un equipo comercial de quince personas",
+        "buscamos integrar el correo con el CRM", "perdemos pedidos porque todo va en hojas de cálculo",
+        "queremos un panel con informes de ventas", "necesitamos que funcione en el móvil",
+        "el sistema debe integrarse con nuestro ERP",
+    ],
+    "CONTACT_INFO": [
+        "mi email es ana@empresa.com", "mi teléfono es 600 123 456", "podéis llamarme al 912345678",
+        "me llamo Laura Gómez", "trabajo en Distribuciones Norte", "escribidme a contacto@acme.es",
+        "soy Carlos, director comercial de Logística Rápida",
+    ],
+    "COMPETITOR": [
+        "ahora usamos Salesforce", "estamos comparando con HubSpot", "¿en qué os diferenciáis de Zoho?",
+        "otro proveedor nos ofrece algo parecido", "Pipedrive nos sale más barato",
+        "la competencia tiene más funciones", "ya trabajamos con otra empresa",
+    ],
+    "OBJECTION": [
+        "me parece caro", "no estoy seguro de que lo necesitemos", "no me convence",
+        "es demasiado complicado para nosotros", "ahora no es buen momento",
+        "tenemos dudas sobre la seguridad", "no sé si mi equipo lo usaría",
+    ],
+    "INTEREST": [
+        "me interesa", "me gustaría ver una demo", "¿podemos agendar una reunión?",
+        "enviadme una propuesta", "suena muy bien, sigamos adelante", "quiero probarlo",
+        "¿cuáles son los siguientes pasos?",
+    ],
+    "CLOSING": [
+        "gracias, eso es todo", "adiós", "hasta luego", "muchas gracias por tu tiempo",
+        "hablamos pronto", "perfecto, quedo a la espera", "nada más por ahora, gracias",
+    ],
+    "IRRELEVANT": [
+        "¿qué tiempo hace hoy?", "me gusta el fútbol", "¿has visto la película de ayer?",
+        "cuéntame un chiste", "¿cuál es la capital de Francia?", "tengo hambre", "jajaja",
+    ],
+}
+
+_TOKEN = re.compile(r"\w+")
+
+
+def normalize_text(text):
+    """Pasar a minúsculas y eliminar tildes"""
+    text = unicodedata.normalize("NFD", text.lower())
+    return "".join(c for c in text if unicodedata.category(c) != "Mn")
+
+
+def tokenize(text):
+    """
+    Obtener unigramas y bigramas de un texto normalizado
+
+    Args:
+        text (str): Texto del usuario
+
+    Returns:
+        list: Términos del texto
+    """
+    words = _TOKEN.findall(normalize_text(text))
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def match_rules(text):
+    """
+    Aplicar las reglas de palabras clave
+
+    Args:
+        text (str): Texto del usuario
+
+    Returns:
+        str: Intención si coincide exactamente una, o None
+    """
+    normalized = normalize_text(text).strip()
+    matches = [
+        intent for intent, patterns in _COMPILED_RULES.items()
+        if any(pattern.search(normalized) for pattern in patterns)
+    ]
+    return matches[0] if len(matches) == 1 else None
+
+
+class IntentClassifier:
+    """
+    Naive Bayes multinomial sobre vectores TF-IDF
+    """
+
+    def __init__(self, alpha=0.1):
+        """
+        Inicializar el clasificador
+
+        Args:
+            alpha (float): Suavizado de Laplace
+        """
+        self.alpha = alpha
+        self.labels = []
+        self.vocabulary = {}
+        self.idf = None
+        self.feature_log_prob = None
+        self.class_log_prior = None
+
+    def _vectorize(self, texts):
+        """Convertir textos en una matriz TF-IDF con filas de norma 1"""
+        matrix = np.zeros((len(texts), len(self.vocabulary)))
+        for row, text in enumerate(texts):
+            for term in tokenize(text):
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    matrix[row, column] += 1
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return np.divide(matrix, norms, out=matrix, where=norms > 0)
+
+    def fit(self, texts, labels):
+        """
+        Entrenar el clasificador
+
+        Args:
+            texts (list): Textos de entrenamiento
+            labels (list): Intención de cada texto
+
+        Returns:
+            IntentClassifier: El propio clasificador
+        """
+        self.labels = sorted(set(labels))
+        terms = sorted({term for text in texts for term in tokenize(text)})
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+
+        # IDF suavizado a partir de la frecuencia de documentos
+        document_frequency = np.zeros(len(terms))
+        for text in texts:
+            for term in set(tokenize(text)):
+                document_frequency[self.vocabulary[term]] += 1
+        self.idf = np.log((1 + len(texts)) / (1 + document_frequency)) + 1
+
+        matrix = self._vectorize(texts)
+        label_index = np.array([self.labels.index(label) for label in labels])
+        one_hot = np.eye(len(self.labels))[label_index]
+
+        feature_count = one_hot.T @ matrix + self.alpha
+        self.feature_log_prob = np.log(feature_count / feature_count.sum(axis=1, keepdims=True))
+        class_count = one_hot.sum(axis=0)
+        self.class_log_prior = np.log(class_count / class_count.sum())
+        return self
+
+    def predict_proba(self, text):
+        """
+        Calcular la probabilidad de cada intención
+
+        Args:
+            text (str): Texto del usuario
+
+        Returns:
+            dict: Intención -> probabilidad
+        """
+        scores = self._vectorize([text])[0] @ self.feature_log_prob.T + self.class_log_prior
+        probabilities = np.exp(scores - scores.max())
+        probabilities /= probabilities.sum()
+        return dict(zip(self.labels, probabilities.tolist()))
+
+    def predict(self, text):
+        """
+        Obtener la intención más probable
+
+        Args:
+            text (str): Texto del usuario
+
+        Returns:
+            tuple: (intención, confianza)
+        """
+        probabilities = self.predict_proba(text)
+        intent = max(probabilities, key=probabilities.get)
+        return intent, probabilities[intent]
+
+    def save(self, path):
+        """
+        Guardar el modelo en un fichero .npz
+
+        Args:
+            path (str): Ruta del fichero
+        """
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        np.savez(
+            path,
+            labels=np.array(self.labels),
+            terms=np.array(terms),
+            idf=self.idf,
+            feature_log_prob=self.feature_log_prob,
+            class_log_prior=self.class_log_prior,
+            alpha=np.array(self.alpha),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Cargar un modelo guardado con save
+
+        Args:
+            path (str): Ruta del fichero
+
+        Returns:
+            IntentClassifier: Modelo cargado
+        """
+        with np.load(path, allow_pickle=False) as data:
+            classifier = cls(alpha=float(data["alpha"]))
+            classifier.labels = data["labels"].tolist()
+            classifier.vocabulary = {term: i for i, term in enumerate(data["terms"].tolist())}
+            classifier.idf = data["idf"]
+            classifier.feature_log_prob = data["feature_log_prob"]
+            classifier.class_log_prior = data["class_log_prior"]
+        return classifier
+
+
+def seed_dataset():
+    """Obtener los ejemplos semilla como listas paralelas de textos e intenciones"""
+    texts, labels = [], []
+    for intent, examples in SEED_EXAMPLES.items():
+        texts.extend(examples)
+        labels.extend([intent] * len(examples))
+    return texts, labels
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_intent_classifier():
+    """
+    Obtener el clasificador del proceso
+
+    Se carga de INTENT_MODEL_PATH si existe y, si no, se entrena con los
+    ejemplos semilla.
+    """
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            if INTENT_MODEL_PATH and os.path.exists(INTENT_MODEL_PATH):
+                _classifier = IntentClassifier.load(INTENT_MODEL_PATH)
+            else:
+                _classifier = IntentClassifier().fit(*seed_dataset())
+        return _classifier
+
+
+def classify_intent(text):
+    """
+    Clasificar un texto con las reglas y, si no deciden, con el modelo
+
+    Args:
+        text (str): Texto del usuario
+
+    Returns:
+        tuple: (intención, confianza)
+    """
+    intent = match_rules(text)
+    if intent:
+        return intent, RULE_CONFIDENCE
+    return get_intent_classifier().predict(text)
+
+
+def load_labeled_messages(conn, limit=None):
+    """
+    Leer los mensajes del lead con una intención registrada
+
+    El agente solo registra las intenciones decididas por el LLM, así que no
+    se incluyen valores de respaldo ni predicciones del propio clasificador.
+
+    Args:
+        conn (sqlite3.Connection): Conexión a la base de datos
+        limit (int, optional): Máximo de mensajes (los más recientes)
+
+    Returns:
+        tuple: (textos, intenciones)
+    """
+    rows = conn.execute(
+        """
+        SELECT content, intent FROM messages
+        WHERE sender = 'lead' AND intent IS NOT NULL AND content <> ''
+        ORDER BY id DESC
+        LIMIT ?
+        """,
+        (-1 if limit is None else limit,)
+    ).fetchall()
+    return [row[0] for row in rows], [row[1] for row in rows]
+
+
+def train_intent_classifier(path=INTENT_MODEL_PATH, include_seed=True, limit=None):
+    """
+    Reentrenar el clasificador con los mensajes registrados y guardarlo
+
+    Args:
+        path (str): Fichero donde guardar el modelo (vacío = no guardar)
+        include_seed (bool): Añadir los ejemplos semilla al entrenamiento
+        limit (int, optional): Máximo de mensajes registrados a usar
+
+    Returns:
+        dict: Ejemplos usados por intención
+    """
+    global _classifier
+    from src.database.repository import connection
+
+    with connection() as conn:
+        texts, labels = load_labeled_messages(conn, limit)
+    if include_seed:
+        seed_texts, seed_labels = seed_dataset()
+        texts += seed_texts
+        labels += seed_labels
+    if not texts:
+        raise ValueError("No hay mensajes etiquetados para entrenar el clasificador")
+
+    classifier = IntentClassifier().fit(texts, labels)
+    if path:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        classifier.save(path)
+    with _classifier_lock:
+        _classifier = classifier
+    return {label: labels.count(label) for label in classifier.labels}
+
+
+def main(argv=None):
+    """
+    Punto de entrada de la línea de comandos
+    """
+    from src.database.connection import configure_database
+    from src.database.repository import initialize_database
+
+    parser = argparse.ArgumentParser(description="Entrenar el clasificador local de intenciones")
+    parser.add_argument("--database", help="Ruta de la base de datos (por defecto DATABASE_PATH)")
+    parser.add_argument("--output", default=INTENT_MODEL_PATH, help="Fichero del modelo")
+    parser.add_argument("--limit", type=int, help="Máximo de mensajes a usar")
+    parser.add_argument("--no-seed", action="store_true", help="No incluir los ejemplos semilla")
+    args = parser.parse_args(argv)
+
+    if args.database:
+        configure_database(args.database)
+    initialize_database()
+
+    counts = train_intent_classifier(args.output, include_seed=not args.no_seed, limit=args.limit)
+    print(json.dumps(counts))
+
+
+if __name__ == "__main__":
+    main()
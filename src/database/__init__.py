@@ -1,23 +1,46 @@
+from src.database.connection import configure_database, snapshot_database
 from src.database.repository import (
     initialize_database,
     create_lead,
     update_lead_details,
+    update_lead_details_many,
     get_lead_by_id,
     get_lead_by_email,
+    get_lead_cache_stats,
+    get_full_lead,
+    get_full_leads,
     start_conversation,
     end_conversation,
     add_message,
+    add_messages,
     get_conversation_messages,
+    iter_conversation_messages,
+    search_messages,
+    get_stats_overview,
+    get_product_interest_counts,
+    get_conversation_stats,
 )
 
 __all__ = [
+    'configure_database',
+    'snapshot_database',
     'initialize_database',
     'create_lead',
     'update_lead_details',
+    'update_lead_details_many',
     'get_lead_by_id',
     'get_lead_by_email',
+    'get_lead_cache_stats',
+    'get_full_lead',
+    'get_full_leads',
     'start_conversation',
     'end_conversation',
     'add_message',
+    'add_messages',
     'get_conversation_messages',
+    'iter_conversation_messages',
+    'search_messages',
+    'get_stats_overview',
+    'get_product_interest_counts',
+    'get_conversation_stats',
 ]
\ No newline at end of file
@@ -0,0 +1,226 @@
+"""
+Archivo comprimido de conversaciones finalizadas
+
+Los mensajes de las conversaciones cerradas con end_conversation y más
+antiguas que una edad configurable se mueven a un único blob comprimido
+con zstandard por conversación, liberando la tabla messages y su caché de
+páginas. get_conversation_messages lee de forma transparente de ambos
+niveles, y search_messages busca también en los mensajes archivados a
+través de un índice FTS5 sin contenido.
+
+Uso:
+    python -m src.database.archive --older-than-days 30 --database data/leads.db
+"""
+import argparse
+import bisect
+import json
+from datetime import datetime, timedelta
+import zstandard
+from src.config import ARCHIVE_AFTER_DAYS, ARCHIVE_COMPRESSION_LEVEL
+from src.database.cache import archive_cache
+from src.database.connection import get_connection_manager
+from src.database.models import Message, construct_trusted
+
+def _serialize_messages(rows):
+    """Serializar filas de mensajes a JSON compacto"""
+    return json.dumps(
+        [[row[0], row[1], row[2], row[3], row[4]] for row in rows],
+        ensure_ascii=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+def archive_conversation(conn, conversation_id, compressor):
+    """
+    Archivar los mensajes de una conversación dentro de la transacción en curso
+
+    Args:
+        conn (sqlite3.Connection): Conexión con una transacción abierta
+        conversation_id (int): ID de la conversación
+        compressor (zstandard.ZstdCompressor): Compresor a utilizar
+
+    Returns:
+        tuple: (mensajes archivados, bytes sin comprimir, bytes comprimidos)
+    """
+    rows = conn.execute(
+        """
+        SELECT id, sender, content, CAST(timestamp AS TEXT), intent FROM messages
+        WHERE conversation_id = ?
+        ORDER BY id
+        """,
+        (conversation_id,)
+    ).fetchall()
+
+    raw = _serialize_messages(rows)
+    payload = compressor.compress(raw)
+    _index_archived_rows(conn, conversation_id, rows)
+    conn.execute(
+        """
+        INSERT INTO archived_conversations
+            (conversation_id, message_count, last_message_at, raw_size, compressed_size, payload, archived_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (conversation_id, len(rows), rows[-1][3] if rows else None, len(raw), len(payload), payload, datetime.now())
+    )
+    conn.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+    return len(rows), len(raw), len(payload)
+
+
+def _index_archived_rows(conn, conversation_id, rows):
+    """Añadir los mensajes archivados de una conversación al índice de búsqueda"""
+    conn.executemany(
+        "INSERT INTO archived_messages_fts (rowid, content) VALUES (?, ?)",
+        [(row[0], row[2]) for row in rows]
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO archived_messages_index (message_id, conversation_id, timestamp) VALUES (?, ?, ?)",
+        [(row[0], conversation_id, row[3]) for row in rows]
+    )
+
+
+def index_archived_conversations(conn):
+    """
+    Indexar para la búsqueda las conversaciones archivadas antes de existir el índice
+
+    Args:
+        conn (sqlite3.Connection): Conexión con una transacción abierta
+
+    Returns:
+        int: Conversaciones indexadas
+    """
+    pending = [row[0] for row in conn.execute(
+        """
+        SELECT a.conversation_id FROM archived_conversations a
+        WHERE a.message_count > 0 AND NOT EXISTS (
+            SELECT 1 FROM archived_messages_index i WHERE i.conversation_id = a.conversation_id
+        )
+        """
+    )]
+    for conversation_id in pending:
+        messages = load_archived_messages(conn, conversation_id)
+        _index_archived_rows(conn, conversation_id, [
+            (m.id, m.sender, m.content, m.timestamp.isoformat(sep=" ") if m.timestamp else None)
+            for m in messages
+        ])
+    return len(pending)
+
+
+def archive_conversations(older_than_days=ARCHIVE_AFTER_DAYS, limit=None, level=ARCHIVE_COMPRESSION_LEVEL):
+    """
+    Archivar las conversaciones finalizadas hace más de `older_than_days` días
+
+    Cada conversación se archiva en su propia transacción, de modo que el
+    trabajo puede interrumpirse y relanzarse en cualquier momento.
+
+    Args:
+        older_than_days (float): Antigüedad mínima desde el fin de la conversación
+        limit (int, optional): Máximo de conversaciones a archivar
+        level (int): Nivel de compresión zstandard
+
+    Returns:
+        dict: Conversaciones y mensajes archivados y bytes antes/después de comprimir
+    """
+    manager = get_connection_manager()
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    with manager.connection() as conn:
+        conversation_ids = [row[0] for row in conn.execute(
+            """
+            SELECT c.id FROM conversations c
+            LEFT JOIN archived_conversations a ON a.conversation_id = c.id
+            WHERE c.ended_at IS NOT NULL AND c.ended_at < ? AND a.conversation_id IS NULL
+            ORDER BY c.id
+            LIMIT ?
+            """,
+            (cutoff, -1 if limit is None else limit)
+        )]
+
+    compressor = zstandard.ZstdCompressor(level=level)
+    stats = {"conversations": 0, "messages": 0, "raw_bytes": 0, "compressed_bytes": 0}
+    for conversation_id in conversation_ids:
+        with manager.transaction() as conn:
+            messages, raw_size, compressed_size = archive_conversation(conn, conversation_id, compressor)
+        stats["conversations"] += 1
+        stats["messages"] += messages
+        stats["raw_bytes"] += raw_size
+        stats["compressed_bytes"] += compressed_size
+    return stats
+
+
+def load_archived_messages(conn, conversation_id, after_id=None, limit=None):
+    """
+    Leer los mensajes archivados de una conversación
+
+    La caché guarda las filas descomprimidas, no los mensajes: cada llamada
+    construye mensajes nuevos, de modo que quien los modifique no altera los
+    que reciban otras llamadas.
+
+    Args:
+        conn (sqlite3.Connection): Conexión a la base de datos
+        conversation_id (int): ID de la conversación
+        after_id (int, optional): Devolver solo los mensajes con ID mayor
+        limit (int, optional): Número máximo de mensajes
+
+    Returns:
+        list: Mensajes ordenados por ID, o None si la conversación no está archivada
+    """
+    cached = archive_cache.get(conversation_id, None)
+    if cached is None:
+        row = conn.execute(
+            "SELECT payload FROM archived_conversations WHERE conversation_id = ?",
+            (conversation_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        raw = zstandard.ZstdDecompressor().decompress(row[0])
+        rows = tuple(tuple(row) for row in json.loads(raw))
+        cached = ([row[0] for row in rows], rows)
+        archive_cache.set(conversation_id, cached)
+
+    ids, rows = cached
+    start = bisect.bisect_right(ids, after_id) if after_id else 0
+    end = len(rows) if limit is None else start + limit
+    # Los archivos anteriores a la migración 6 no guardan la intención
+    return [
+        construct_trusted(Message, {
+            'id': row[0],
+            'conversation_id': conversation_id,
+            'sender': row[1],
+            'content': row[2],
+            'timestamp': datetime.fromisoformat(row[3]) if row[3] else None,
+            'intent': row[4] if len(row) > 4 else None
+        })
+        for row in rows[start:end]
+    ]
+
+
+def main(argv=None):
+    """
+    Punto de entrada de la línea de comandos
+    """
+    from src.database.connection import configure_database
+    from src.database.repository import initialize_database
+
+    parser = argparse.ArgumentParser(description="Archivar conversaciones finalizadas")
+    parser.add_argument("--older-than-days", type=float, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--limit", type=int, help="Máximo de conversaciones a archivar")
+    parser.add_argument("--level", type=int, default=ARCHIVE_COMPRESSION_LEVEL, help="Nivel de compresión zstandard")
+    parser.add_argument("--database", help="Ruta de la base de datos (por defecto DATABASE_PATH)")
+    parser.add_argument("--vacuum", action="store_true", help="Compactar el fichero tras archivar")
+    args = parser.parse_args(argv)
+
+    if args.database:
+        configure_database(args.database)
+    initialize_database()
+
+    stats = archive_conversations(args.older_than_days, limit=args.limit, level=args.level)
+    if args.vacuum:
+        conn = get_connection_manager().get_connection()
+        conn.execute("VACUUM")
+        # En modo WAL el fichero principal solo se reduce al volcar el WAL
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
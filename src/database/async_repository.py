@@ -0,0 +1,186 @@
+"""
+API asíncrona del repositorio
+
+Las operaciones se ejecutan en un hilo dedicado de base de datos alimentado
+por una cola acotada, de modo que un pipeline basado en asyncio puede
+solapar la persistencia con las llamadas al LLM y el audio sin bloquear el
+bucle de eventos. El hilo reutiliza las funciones síncronas del repositorio
+y, por tanto, el mismo gestor de conexiones.
+"""
+import asyncio
+import atexit
+import queue
+import threading
+from src.config import DATABASE_EXECUTOR_QUEUE_SIZE
+from src.database import repository
+from src.database.connection import get_connection_manager
+
+_STOP = object()
+
+
+def _set_result(future, result):
+    if not future.cancelled():
+        future.set_result(result)
+
+
+def _set_exception(future, exception):
+    if not future.cancelled():
+        future.set_exception(exception)
+
+
+class DatabaseExecutor:
+    """
+    Hilo dedicado que ejecuta en orden las operaciones de base de datos
+    """
+
+    def __init__(self, max_queue_size=DATABASE_EXECUTOR_QUEUE_SIZE):
+        """
+        Inicializar el ejecutor
+
+        Args:
+            max_queue_size (int): Operaciones pendientes máximas antes de aplicar contrapresión
+        """
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Arrancar el hilo de base de datos si no está en ejecución
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="database-executor", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        """
+        Bucle del hilo: ejecutar operaciones hasta recibir la señal de parada
+        """
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            func, args, kwargs, loop, future = item
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                callback, value = _set_exception, e
+            else:
+                callback, value = _set_result, result
+            try:
+                loop.call_soon_threadsafe(callback, future, value)
+            except RuntimeError:
+                # El bucle de eventos ya se cerró; nadie espera el resultado
+                pass
+        get_connection_manager().close_thread_connection()
+
+    async def submit(self, func, *args, **kwargs):
+        """
+        Ejecutar una función en el hilo de base de datos
+
+        Args:
+            func (callable): Función síncrona a ejecutar
+            *args: Argumentos posicionales
+            **kwargs: Argumentos con nombre
+
+        Returns:
+            Resultado de la función
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        item = (func, args, kwargs, loop, future)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            # Contrapresión: esperar hueco en la cola sin bloquear el bucle de eventos
+            await loop.run_in_executor(None, self._queue.put, item)
+        return await future
+
+    def shutdown(self, wait=True):
+        """
+        Detener el hilo tras completar las operaciones encoladas
+
+        Args:
+            wait (bool): Esperar a que el hilo termine
+        """
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        if wait:
+            thread.join()
+
+
+# Ejecutor global compartido por las funciones asíncronas
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Obtener el ejecutor de base de datos global
+
+    Returns:
+        DatabaseExecutor: Ejecutor compartido por el proceso
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = DatabaseExecutor()
+                atexit.register(_executor.shutdown)
+    return _executor
+
+
+async def initialize_database():
+    """Inicializar la base de datos con el esquema definido y sus migraciones"""
+    return await get_executor().submit(repository.initialize_database)
+
+
+async def create_lead(lead):
+    """Crear un nuevo lead en la base de datos"""
+    return await get_executor().submit(repository.create_lead, lead)
+
+
+async def update_lead_details(details):
+    """Actualizar o crear detalles de un lead"""
+    return await get_executor().submit(repository.update_lead_details, details)
+
+
+async def get_lead_by_id(lead_id):
+    """Obtener un lead por su ID"""
+    return await get_executor().submit(repository.get_lead_by_id, lead_id)
+
+
+async def get_lead_by_email(email):
+    """Obtener un lead por su email"""
+    return await get_executor().submit(repository.get_lead_by_email, email)
+
+
+async def start_conversation(lead_id):
+    """Iniciar una nueva conversación con un lead"""
+    return await get_executor().submit(repository.start_conversation, lead_id)
+
+
+async def end_conversation(conversation_id):
+    """Finalizar una conversación"""
+    return await get_executor().submit(repository.end_conversation, conversation_id)
+
+
+async def add_message(message):
+    """Añadir un mensaje a una conversación"""
+    return await get_executor().submit(repository.add_message, message)
+
+
+async def add_messages(messages):
+    """Añadir varios mensajes en una única transacción"""
+    return await get_executor().submit(repository.add_messages, messages)
+
+
+async def get_conversation_messages(conversation_id, after_id=None, limit=None):
+    """Obtener los mensajes de una conversación, opcionalmente a partir de un ID y hasta un límite"""
+    return await get_executor().submit(repository.get_conversation_messages, conversation_id, after_id, limit)
@@ -0,0 +1,342 @@
+"""
+Importación y exportación masiva de leads en CSV o JSONL
+
+Uso:
+    python -m src.database.bulk import leads.csv
+    python -m src.database.bulk export leads.jsonl --database data/leads.db
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+from src.config import BULK_CHUNK_SIZE
+from src.database.cache import lead_cache
+from src.database.connection import configure_database
+from src.database.repository import (
+    MAX_QUERY_PARAMS,
+    initialize_database,
+    connection,
+    transaction,
+    get_job_checkpoint,
+    set_job_checkpoint,
+    clear_job_checkpoint,
+)
+
+LEAD_FIELDS = ("name", "company", "email", "phone")
+DETAIL_FIELDS = ("budget", "needs", "product_interest", "timeline")
+EXPORT_FIELDS = ("id",) + LEAD_FIELDS + DETAIL_FIELDS + ("created_at",)
+
+IMPORT_JOB = "import_leads"
+
+
+def detect_format(path, file_format=None):
+    """
+    Determinar el formato de un fichero a partir de su extensión
+
+    Args:
+        path (str): Ruta del fichero
+        file_format (str, optional): Formato explícito ('csv' o 'jsonl')
+
+    Returns:
+        str: 'csv' o 'jsonl'
+    """
+    file_format = (file_format or os.path.splitext(path)[1].lstrip(".")).lower()
+    if file_format == "ndjson":
+        file_format = "jsonl"
+    if file_format not in ("csv", "jsonl"):
+        raise ValueError(f"Formato no soportado: {file_format}")
+    return file_format
+
+
+def read_records(path, file_format=None):
+    """
+    Leer registros de un fichero sin cargarlo completo en memoria
+
+    Args:
+        path (str): Ruta del fichero
+        file_format (str, optional): Formato explícito
+
+    Yields:
+        dict: Registro leído
+    """
+    file_format = detect_format(path, file_format)
+    with open(path, newline="", encoding="utf-8") as f:
+        if file_format == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def _clean(value):
+    """Normalizar un valor de texto: cadenas vacías a None"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _normalize_record(record):
+    """
+    Normalizar un registro de entrada a los campos de lead y detalles
+
+    El email se guarda tal como viene, para que get_lead_by_email lo
+    encuentre con la misma escritura; la deduplicación no distingue mayúsculas.
+
+    Returns:
+        dict: Registro normalizado o None si no tiene ni nombre ni email
+    """
+    normalized = {field: _clean(record.get(field)) for field in LEAD_FIELDS + DETAIL_FIELDS}
+    if not normalized["name"] and not normalized["email"]:
+        return None
+    normalized["name"] = normalized["name"] or ""
+    return normalized
+
+
+def _existing_emails(conn, emails):
+    """Obtener cuáles de los emails dados (en minúsculas) ya existen en la base de datos, sin distinguir mayúsculas"""
+    emails = list(emails)
+    existing = set()
+    for i in range(0, len(emails), MAX_QUERY_PARAMS):
+        batch = emails[i:i + MAX_QUERY_PARAMS]
+        placeholders = ",".join("?" * len(batch))
+        # Usa el índice idx_leads_email_lower
+        existing.update(
+            row[0] for row in conn.execute(
+                f"SELECT lower(email) FROM leads WHERE lower(email) IN ({placeholders})", batch
+            )
+        )
+    return existing
+
+
+def import_source(path):
+    """
+    Identificar un fichero de importación para su punto de control
+
+    Incluye el tamaño y la fecha de modificación: si el fichero cambia, su
+    punto de control anterior deja de aplicarse y la importación empieza de
+    nuevo en lugar de saltarse registros que ya no son los mismos.
+
+    Args:
+        path (str): Ruta del fichero
+
+    Returns:
+        str: Ruta absoluta con el tamaño y la fecha de modificación
+    """
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}@{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _write_chunk(records, source, position, seen_emails):
+    """
+    Escribir un bloque de registros en una única transacción
+
+    Args:
+        records (list): Registros normalizados del bloque
+        source (str): Identificador del fichero para el punto de control
+        position (int): Registros consumidos tras este bloque
+        seen_emails (set): Emails (en minúsculas) ya vistos en esta importación
+
+    Returns:
+        tuple: (insertados, duplicados)
+    """
+    with transaction() as conn:
+        # Bloqueo de escritura desde el inicio para que los IDs nuevos sean solo nuestros
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+
+        candidates = []
+        for record in records:
+            email = record["email"].lower() if record["email"] else None
+            if email:
+                if email in seen_emails:
+                    continue
+                seen_emails.add(email)
+            candidates.append(record)
+
+        existing = _existing_emails(conn, {r["email"].lower() for r in candidates if r["email"]})
+        new_records = [r for r in candidates if not r["email"] or r["email"].lower() not in existing]
+
+        if new_records:
+            max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM leads").fetchone()[0]
+            conn.executemany(
+                "INSERT INTO leads (name, company, email, phone) VALUES (?, ?, ?, ?)",
+                [tuple(r[field] for field in LEAD_FIELDS) for r in new_records]
+            )
+            lead_ids = [row[0] for row in conn.execute("SELECT id FROM leads WHERE id > ? ORDER BY id", (max_id,))]
+            conn.executemany(
+                "INSERT INTO lead_details (lead_id, budget, needs, product_interest, timeline) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (lead_id,) + tuple(r[field] for field in DETAIL_FIELDS)
+                    for lead_id, r in zip(lead_ids, new_records)
+                    if any(r[field] for field in DETAIL_FIELDS)
+                ]
+            )
+
+        set_job_checkpoint(IMPORT_JOB, source, position)
+
+    return len(new_records), len(records) - len(new_records)
+
+
+def import_leads(path, file_format=None, chunk_size=BULK_CHUNK_SIZE, resume=True, progress=True):
+    """
+    Importar leads desde un fichero CSV o JSONL
+
+    Los registros se deduplican por email sin distinguir mayúsculas (dentro
+    del fichero y contra la base de datos) y se escriben en bloques
+    transaccionales. El punto de control se guarda en la misma transacción que
+    cada bloque, por lo que una importación interrumpida se reanuda
+    exactamente tras el último bloque confirmado, siempre que el fichero no
+    haya cambiado.
+
+    Args:
+        path (str): Ruta del fichero
+        file_format (str, optional): Formato explícito ('csv' o 'jsonl')
+        chunk_size (int): Registros por transacción
+        resume (bool): Reanudar desde el último punto de control
+        progress (bool): Mostrar el progreso por stderr
+
+    Returns:
+        dict: Registros leídos, insertados, duplicados e inválidos
+    """
+    source = import_source(path)
+    start_position = get_job_checkpoint(IMPORT_JOB, source) if resume else 0
+
+    stats = {"read": 0, "inserted": 0, "duplicates": 0, "invalid": 0, "resumed_from": start_position}
+    seen_emails = set()
+    position = start_position
+    started = time.perf_counter()
+
+    records = islice(read_records(path, file_format), start_position, None)
+    while True:
+        raw_chunk = list(islice(records, chunk_size))
+        if not raw_chunk:
+            break
+        position += len(raw_chunk)
+        stats["read"] += len(raw_chunk)
+
+        chunk = [r for r in map(_normalize_record, raw_chunk) if r is not None]
+        stats["invalid"] += len(raw_chunk) - len(chunk)
+
+        inserted, duplicates = _write_chunk(chunk, source, position, seen_emails)
+        stats["inserted"] += inserted
+        stats["duplicates"] += duplicates
+
+        if progress:
+            rate = stats["read"] / (time.perf_counter() - started)
+            print(
+                f"\r{position} registros procesados, {stats['inserted']} insertados, "
+                f"{stats['duplicates']} duplicados ({rate:.0f} registros/s)",
+                end="", file=sys.stderr
+            )
+
+    if progress:
+        print(file=sys.stderr)
+
+    clear_job_checkpoint(IMPORT_JOB, source)
+    # Los leads importados pueden coincidir con búsquedas por email ya cacheadas
+    lead_cache.clear()
+    return stats
+
+
+def iter_leads(page_size=BULK_CHUNK_SIZE):
+    """
+    Recorrer todos los leads con sus detalles usando paginación por clave
+
+    Yields:
+        dict: Lead con sus detalles
+    """
+    last_id = 0
+    while True:
+        with connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT l.id, l.name, l.company, l.email, l.phone,
+                       d.budget, d.needs, d.product_interest, d.timeline,
+                       CAST(l.created_at AS TEXT) AS created_at
+                FROM leads l
+                LEFT JOIN lead_details d ON d.lead_id = l.id
+                WHERE l.id > ?
+                ORDER BY l.id
+                LIMIT ?
+                """,
+                (last_id, page_size)
+            ).fetchall()
+        for row in rows:
+            yield dict(row)
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+def export_leads(path, file_format=None, progress=True):
+    """
+    Exportar todos los leads con sus detalles a CSV o JSONL
+
+    Args:
+        path (str): Ruta del fichero de salida
+        file_format (str, optional): Formato explícito ('csv' o 'jsonl')
+        progress (bool): Mostrar el progreso por stderr
+
+    Returns:
+        int: Número de leads exportados
+    """
+    file_format = detect_format(path, file_format)
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = None
+        if file_format == "csv":
+            writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS)
+            writer.writeheader()
+        for lead in iter_leads():
+            if writer:
+                writer.writerow(lead)
+            else:
+                f.write(json.dumps(lead, ensure_ascii=False) + "\n")
+            count += 1
+            if progress and count % BULK_CHUNK_SIZE == 0:
+                print(f"\r{count} leads exportados", end="", file=sys.stderr)
+    if progress:
+        print(f"\r{count} leads exportados", file=sys.stderr)
+    return count
+
+
+def main(argv=None):
+    """
+    Punto de entrada de la línea de comandos
+    """
+    parser = argparse.ArgumentParser(description="Importación y exportación masiva de leads")
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("path", help="Fichero CSV o JSONL")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="Formato del fichero (por defecto, según la extensión)")
+    parser.add_argument("--database", help="Ruta de la base de datos (por defecto DATABASE_PATH)")
+    parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE, help="Registros por transacción")
+    parser.add_argument("--no-resume", action="store_true", help="Ignorar el punto de control de una importación previa")
+    parser.add_argument("--quiet", action="store_true", help="No mostrar el progreso")
+    args = parser.parse_args(argv)
+
+    if args.database:
+        configure_database(args.database)
+    initialize_database()
+
+    if args.command == "import":
+        stats = import_leads(
+            args.path,
+            file_format=args.format,
+            chunk_size=args.chunk_size,
+            resume=not args.no_resume,
+            progress=not args.quiet
+        )
+        print(json.dumps(stats))
+    else:
+        count = export_leads(args.path, file_format=args.format, progress=not args.quiet)
+        print(json.dumps({"exported": count}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Cachés en memoria para lecturas frecuentes de la base de datos
+"""
+import threading
+import time
+from collections import OrderedDict
+from src.config import LEAD_CACHE_SIZE, LEAD_CACHE_TTL
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Caché LRU acotada, con expiración opcional por TTL y contadores de aciertos
+    """
+
+    def __init__(self, max_size=1024, ttl=None):
+        """
+        Inicializar la caché
+
+        Args:
+            max_size (int): Número máximo de entradas
+            ttl (float, optional): Segundos de validez de cada entrada
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()  # clave -> (expiración, valor)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=MISSING):
+        """
+        Obtener un valor de la caché
+
+        Args:
+            key: Clave buscada
+            default: Valor devuelto si la clave no está o ha expirado
+
+        Returns:
+            Valor almacenado o `default`
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """
+        Guardar un valor, desalojando la entrada menos usada si es necesario
+
+        Args:
+            key: Clave
+            value: Valor a almacenar
+        """
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """
+        Eliminar una entrada de la caché
+
+        Args:
+            key: Clave a eliminar
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """
+        Vaciar la caché y reiniciar los contadores
+        """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """
+        Obtener las métricas de la caché
+
+        Returns:
+            dict: Aciertos, fallos, desalojos, tamaño y tasa de aciertos
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class LeadCache:
+    """
+    Caché de lectura de leads por ID y por email
+
+    Los leads se guardan por ID y el email solo apunta al ID, de modo que
+    invalidar un lead por su ID basta para que ninguna de las dos búsquedas
+    devuelva datos obsoletos. Siempre se devuelven copias para que los
+    agentes que modifican su lead no alteren la versión en caché.
+    """
+
+    def __init__(self, max_size=LEAD_CACHE_SIZE, ttl=LEAD_CACHE_TTL):
+        self.leads = LRUCache(max_size, ttl)
+        self.emails = LRUCache(max_size, ttl)
+
+    def get_by_id(self, lead_id):
+        lead = self.leads.get(lead_id, None)
+        return lead.model_copy() if lead is not None else None
+
+    def get_id_by_email(self, email):
+        return self.emails.get(email, None)
+
+    def put(self, lead):
+        self.leads.set(lead.id, lead.model_copy())
+        if lead.email:
+            self.emails.set(lead.email, lead.id)
+
+    def invalidate(self, lead_id=None, email=None):
+        if lead_id is not None:
+            self.leads.invalidate(lead_id)
+        if email is not None:
+            self.emails.invalidate(email)
+
+    def clear(self):
+        self.leads.clear()
+        self.emails.clear()
+
+    def stats(self):
+        """
+        Obtener las métricas de ambas cachés
+
+        Returns:
+            dict: Métricas por ID y por email
+        """
+        return {"by_id": self.leads.stats(), "by_email": self.emails.stats()}
+
+
+# Caché compartida por todos los agentes del proceso
+lead_cache = LeadCache()
+
+# Filas descomprimidas de las conversaciones archivadas, para recorrerlas por
+# páginas sin descomprimir el blob en cada página
+archive_cache = LRUCache(max_size=32)
@@ -0,0 +1,317 @@
+"""
+Gestión de conexiones persistentes a la base de datos SQLite
+"""
+import atexit
+import sqlite3
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+from src.config import (
+    DATABASE_PATH,
+    DATABASE_SYNCHRONOUS,
+    DATABASE_CACHE_SIZE,
+    DATABASE_MMAP_SIZE,
+    DATABASE_BUSY_TIMEOUT,
+    DATABASE_STATEMENT_CACHE_SIZE,
+    DATABASE_SNAPSHOT_PATH,
+)
+from src.database.cache import lead_cache, archive_cache
+
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+class ConnectionManager:
+    """
+    Mantiene una conexión SQLite de larga duración por hilo
+
+    Cada hilo (los hilos de script de Streamlit, los hilos de trabajo, etc.)
+    obtiene su propia conexión, que se reutiliza en todas las llamadas del
+    repositorio. Las sentencias preparadas se reutilizan mediante la caché
+    de sentencias de sqlite3, indexada por el texto SQL.
+
+    Con ":memory:" todos los hilos comparten una única conexión, protegida
+    por un cerrojo reentrante, para que el esquema y los datos persistan
+    durante la vida del proceso. Se evita el modo de caché compartida
+    ("file::memory:?cache=shared") porque sus bloqueos a nivel de tabla
+    fallan con SQLITE_LOCKED en lugar de esperar como busy_timeout.
+    """
+
+    def __init__(
+        self,
+        database_path=DATABASE_PATH,
+        synchronous=DATABASE_SYNCHRONOUS,
+        cache_size=DATABASE_CACHE_SIZE,
+        mmap_size=DATABASE_MMAP_SIZE,
+        busy_timeout=DATABASE_BUSY_TIMEOUT,
+        cached_statements=DATABASE_STATEMENT_CACHE_SIZE,
+    ):
+        """
+        Inicializar el gestor de conexiones
+
+        Args:
+            database_path (str): Ruta a la base de datos
+            synchronous (str): Modo de PRAGMA synchronous
+            cache_size (int): Valor de PRAGMA cache_size (negativo en KiB)
+            mmap_size (int): Bytes a mapear en memoria (PRAGMA mmap_size)
+            busy_timeout (float): Segundos de espera ante una base de datos bloqueada
+            cached_statements (int): Tamaño de la caché de sentencias preparadas
+        """
+        synchronous = synchronous.upper()
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Modo synchronous no válido: {synchronous}")
+
+        self.database_path = database_path
+        self.synchronous = synchronous
+        self.cache_size = int(cache_size)
+        self.mmap_size = int(mmap_size)
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+
+        self._local = threading.local()
+        self._connections = {}  # ident del hilo -> (hilo, conexión)
+        self._lock = threading.Lock()
+
+        # Modo en memoria: una conexión para todo el proceso
+        self.in_memory = database_path == ":memory:"
+        self._shared_connection = None
+        self._shared_lock = threading.RLock()
+        self._shared_state = SimpleNamespace(depth=0)
+
+    def _connect(self):
+        """
+        Abrir y configurar una nueva conexión
+
+        Returns:
+            sqlite3.Connection: Conexión configurada
+        """
+        # check_same_thread=False solo permite cerrar conexiones de hilos ya
+        # finalizados; cada conexión se usa únicamente desde su propio hilo.
+        conn = sqlite3.connect(
+            self.database_path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            timeout=self.busy_timeout,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        if self.database_path != ":memory:":
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size={self.cache_size}")
+        conn.execute(f"PRAGMA mmap_size={self.mmap_size}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _prune_dead_threads(self):
+        """
+        Cerrar las conexiones de hilos que ya han terminado
+
+        Streamlit ejecuta cada rerun en un hilo nuevo, por lo que sin esta
+        limpieza las conexiones se acumularían durante la vida del proceso.
+        """
+        for ident, (thread, conn) in list(self._connections.items()):
+            if not thread.is_alive():
+                del self._connections[ident]
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+
+    def get_connection(self):
+        """
+        Obtener la conexión del hilo actual, creándola si no existe
+
+        Returns:
+            sqlite3.Connection: Conexión del hilo actual
+        """
+        if self.in_memory:
+            with self._shared_lock:
+                if self._shared_connection is None:
+                    self._shared_connection = self._connect()
+                return self._shared_connection
+
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.connection = conn
+            self._local.depth = 0
+            thread = threading.current_thread()
+            with self._lock:
+                self._prune_dead_threads()
+                self._connections[thread.ident] = (thread, conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """
+        Contexto de lectura sobre la conexión del hilo actual
+
+        Yields:
+            sqlite3.Connection: Conexión del hilo actual
+        """
+        if self.in_memory:
+            with self._shared_lock:
+                yield self.get_connection()
+        else:
+            yield self.get_connection()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Contexto transaccional: confirma al salir o revierte ante un error
+
+        Las transacciones anidadas se integran en la más externa, que es la
+        única que confirma los cambios.
+
+        Yields:
+            sqlite3.Connection: Conexión del hilo actual
+        """
+        if self.in_memory:
+            with self._shared_lock:
+                yield from self._transaction(self.get_connection(), self._shared_state)
+        else:
+            conn = self.get_connection()
+            yield from self._transaction(conn, self._local)
+
+    @staticmethod
+    def _transaction(conn, state):
+        """
+        Cuerpo común de transaction(): solo la transacción más externa confirma
+
+        Args:
+            conn (sqlite3.Connection): Conexión de la transacción
+            state: Objeto con el atributo `depth` de anidamiento
+        """
+        state.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            state.depth -= 1
+            if state.depth == 0:
+                conn.rollback()
+            raise
+        state.depth -= 1
+        if state.depth == 0:
+            conn.commit()
+
+    def close_thread_connection(self):
+        """
+        Cerrar la conexión del hilo actual si existe
+
+        En modo en memoria no hace nada: cerrar la conexión compartida
+        destruiría la base de datos.
+        """
+        if self.in_memory:
+            return
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            return
+        self._local.connection = None
+        with self._lock:
+            self._connections.pop(threading.get_ident(), None)
+        conn.close()
+
+    def close_all(self):
+        """
+        Cerrar todas las conexiones abiertas por el gestor
+        """
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        with self._shared_lock:
+            if self._shared_connection is not None:
+                connections.append((None, self._shared_connection))
+                self._shared_connection = None
+        for _, conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+    def snapshot(self, path):
+        """
+        Copiar la base de datos completa a un fichero mediante la API de backup de SQLite
+
+        La copia es consistente aunque otros hilos sigan escribiendo.
+
+        Args:
+            path (str): Ruta del fichero de destino (se sobrescribe)
+        """
+        destination = sqlite3.connect(path)
+        try:
+            with self.connection() as conn:
+                conn.backup(destination)
+        finally:
+            destination.close()
+
+
+# Gestor global utilizado por el repositorio
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_connection_manager():
+    """
+    Obtener el gestor de conexiones global
+
+    Returns:
+        ConnectionManager: Gestor de conexiones compartido por el proceso
+    """
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = ConnectionManager()
+    return _manager
+
+
+def configure_database(database_path=DATABASE_PATH, **options):
+    """
+    Reemplazar el gestor global, cerrando las conexiones del anterior
+
+    Args:
+        database_path (str): Ruta a la base de datos
+        **options: Opciones adicionales para ConnectionManager
+
+    Returns:
+        ConnectionManager: Nuevo gestor de conexiones
+    """
+    global _manager
+    with _manager_lock:
+        if _manager is not None:
+            _manager.close_all()
+        _manager = ConnectionManager(database_path, **options)
+    # Los leads y archivos en caché pertenecen a la base de datos anterior
+    lead_cache.clear()
+    archive_cache.clear()
+    return _manager
+
+
+def snapshot_database(path=None):
+    """
+    Volcar la base de datos actual (por ejemplo, la de memoria) a un fichero
+
+    Args:
+        path (str, optional): Ruta de destino (por defecto DATABASE_SNAPSHOT_PATH)
+
+    Returns:
+        str: Ruta del fichero generado
+    """
+    path = path or DATABASE_SNAPSHOT_PATH
+    if not path:
+        raise ValueError("No se ha indicado la ruta del volcado (DATABASE_SNAPSHOT_PATH)")
+    get_connection_manager().snapshot(path)
+    return path
+
+
+@atexit.register
+def _snapshot_on_exit():
+    """
+    Volcar la base de datos en memoria al salir si DATABASE_SNAPSHOT_PATH está definido
+    """
+    if DATABASE_SNAPSHOT_PATH and _manager is not None and _manager.in_memory:
+        try:
+            snapshot_database(DATABASE_SNAPSHOT_PATH)
+        except Exception as e:
+            print(f"Error al volcar la base de datos en memoria: {e}")
@@ -0,0 +1,301 @@
+"""
+Migraciones versionadas del esquema de la base de datos
+"""
+
+# Lista ordenada de migraciones: (versión, nombre, script SQL).
+# Las migraciones ya publicadas no deben modificarse; los cambios nuevos
+# se añaden siempre al final con el siguiente número de versión.
+MIGRATIONS = [
+    (1, "indices_y_detalles_unicos", """
+        CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages(conversation_id, id);
+        CREATE INDEX IF NOT EXISTS idx_leads_email ON leads(email);
+        CREATE INDEX IF NOT EXISTS idx_conversations_lead ON conversations(lead_id);
+
+        -- Conservar solo los detalles más recientes de cada lead antes de exigir unicidad
+        DELETE FROM lead_details
+        WHERE id NOT IN (SELECT MAX(id) FROM lead_details GROUP BY lead_id);
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_lead_details_lead ON lead_details(lead_id);
+    """),
+    (2, "puntos_de_control", """
+        -- Progreso de trabajos masivos reanudables (importaciones, reprocesados)
+        CREATE TABLE IF NOT EXISTS job_checkpoints (
+            job TEXT NOT NULL,
+            source TEXT NOT NULL,
+            position INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (job, source)
+        );
+    """),
+    (3, "archivo_de_conversaciones", """
+        -- Mensajes de conversaciones finalizadas, comprimidos en un único blob
+        CREATE TABLE IF NOT EXISTS archived_conversations (
+            conversation_id INTEGER PRIMARY KEY,
+            message_count INTEGER NOT NULL,
+            last_message_at TIMESTAMP,
+            raw_size INTEGER NOT NULL,
+            compressed_size INTEGER NOT NULL,
+            payload BLOB NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (conversation_id) REFERENCES conversations(id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_conversations_ended ON conversations(ended_at);
+    """),
+    (4, "busqueda_de_texto_completo", """
+        -- Índice FTS5 de contenido externo sobre messages.content, sincronizado por triggers
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+            content,
+            content='messages',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+            INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+        END;
+
+        -- Indexar los mensajes existentes
+        INSERT INTO messages_fts(messages_fts) VALUES ('rebuild');
+    """),
+    (5, "estadisticas_incrementales", """
+        -- Contadores globales (clave -> valor) mantenidos por triggers
+        CREATE TABLE IF NOT EXISTS stats_totals (
+            name TEXT PRIMARY KEY,
+            value REAL NOT NULL DEFAULT 0
+        );
+
+        -- Resumen por conversación
+        CREATE TABLE IF NOT EXISTS conversation_stats (
+            conversation_id INTEGER PRIMARY KEY,
+            lead_id INTEGER,
+            message_count INTEGER NOT NULL DEFAULT 0,
+            lead_message_count INTEGER NOT NULL DEFAULT 0,
+            agent_message_count INTEGER NOT NULL DEFAULT 0,
+            started_at TIMESTAMP,
+            ended_at TIMESTAMP,
+            first_message_at TIMESTAMP,
+            last_message_at TIMESTAMP,
+            duration_seconds REAL
+        );
+
+        -- Leads por producto de interés ('' = sin especificar)
+        CREATE TABLE IF NOT EXISTS product_interest_stats (
+            product_interest TEXT PRIMARY KEY,
+            lead_count INTEGER NOT NULL DEFAULT 0
+        );
+
+        -- Carga inicial a partir de los datos existentes
+        INSERT OR REPLACE INTO stats_totals (name, value)
+        SELECT 'leads', COUNT(*) FROM leads
+        UNION ALL SELECT 'conversations', COUNT(*) FROM conversations
+        UNION ALL SELECT 'ended_conversations', COUNT(*) FROM conversations WHERE ended_at IS NOT NULL
+        UNION ALL SELECT 'duration_seconds', COALESCE(SUM((julianday(ended_at) - julianday(started_at)) * 86400), 0)
+            FROM conversations WHERE ended_at IS NOT NULL
+        UNION ALL SELECT 'messages',
+            (SELECT COUNT(*) FROM messages) + (SELECT COALESCE(SUM(message_count), 0) FROM archived_conversations)
+        UNION ALL SELECT 'lead_messages', COUNT(*) FROM messages WHERE sender = 'lead'
+        UNION ALL SELECT 'leads_with_details', COUNT(*) FROM lead_details
+        UNION ALL SELECT 'budget_filled', COUNT(*) FROM lead_details WHERE COALESCE(budget, '') <> ''
+        UNION ALL SELECT 'timeline_filled', COUNT(*) FROM lead_details WHERE COALESCE(timeline, '') <> ''
+        UNION ALL SELECT 'needs_filled', COUNT(*) FROM lead_details WHERE COALESCE(needs, '') <> ''
+        UNION ALL SELECT 'product_interest_filled', COUNT(*) FROM lead_details WHERE COALESCE(product_interest, '') <> '';
+
+        INSERT OR REPLACE INTO conversation_stats
+            (conversation_id, lead_id, message_count, lead_message_count, agent_message_count,
+             started_at, ended_at, first_message_at, last_message_at, duration_seconds)
+        SELECT c.id, c.lead_id,
+               COUNT(m.id) + COALESCE(a.message_count, 0),
+               COALESCE(SUM(m.sender = 'lead'), 0),
+               COALESCE(SUM(m.sender = 'agent'), 0),
+               c.started_at, c.ended_at,
+               MIN(m.timestamp), COALESCE(MAX(m.timestamp), a.last_message_at),
+               (julianday(c.ended_at) - julianday(c.started_at)) * 86400
+        FROM conversations c
+        LEFT JOIN messages m ON m.conversation_id = c.id
+        LEFT JOIN archived_conversations a ON a.conversation_id = c.id
+        GROUP BY c.id;
+
+        INSERT OR REPLACE INTO product_interest_stats (product_interest, lead_count)
+        SELECT COALESCE(product_interest, ''), COUNT(*) FROM lead_details GROUP BY COALESCE(product_interest, '');
+
+        -- Leads
+        CREATE TRIGGER IF NOT EXISTS stats_leads_insert AFTER INSERT ON leads BEGIN
+            UPDATE stats_totals SET value = value + 1 WHERE name = 'leads';
+        END;
+
+        -- Conversaciones
+        CREATE TRIGGER IF NOT EXISTS stats_conversations_insert AFTER INSERT ON conversations BEGIN
+            UPDATE stats_totals SET value = value + 1 WHERE name = 'conversations';
+            INSERT OR IGNORE INTO conversation_stats (conversation_id, lead_id, started_at)
+            VALUES (new.id, new.lead_id, new.started_at);
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS stats_conversations_end AFTER UPDATE OF ended_at ON conversations
+        WHEN new.ended_at IS NOT NULL BEGIN
+            UPDATE stats_totals SET value = value + 1
+            WHERE name = 'ended_conversations' AND old.ended_at IS NULL;
+            UPDATE stats_totals SET value = value
+                + (julianday(new.ended_at) - julianday(new.started_at)) * 86400
+                - COALESCE((julianday(old.ended_at) - julianday(old.started_at)) * 86400, 0)
+            WHERE name = 'duration_seconds';
+            UPDATE conversation_stats SET
+                ended_at = new.ended_at,
+                duration_seconds = (julianday(new.ended_at) - julianday(new.started_at)) * 86400
+            WHERE conversation_id = new.id;
+        END;
+
+        -- Mensajes (sin trigger de borrado: archivar no debe alterar las estadísticas)
+        CREATE TRIGGER IF NOT EXISTS stats_messages_insert AFTER INSERT ON messages BEGIN
+            UPDATE stats_totals SET value = value + 1 WHERE name = 'messages';
+            UPDATE stats_totals SET value = value + 1 WHERE name = 'lead_messages' AND new.sender = 'lead';
+            INSERT INTO conversation_stats
+                (conversation_id, message_count, lead_message_count, agent_message_count,
+                 first_message_at, last_message_at)
+            VALUES (new.conversation_id, 1, new.sender = 'lead', new.sender = 'agent', new.timestamp, new.timestamp)
+            ON CONFLICT(conversation_id) DO UPDATE SET
+                message_count = message_count + 1,
+                lead_message_count = lead_message_count + excluded.lead_message_count,
+                agent_message_count = agent_message_count + excluded.agent_message_count,
+                first_message_at = COALESCE(first_message_at, excluded.first_message_at),
+                last_message_at = excluded.last_message_at;
+        END;
+
+        -- Detalles de leads
+        CREATE TRIGGER IF NOT EXISTS stats_lead_details_insert AFTER INSERT ON lead_details BEGIN
+            UPDATE stats_totals SET value = value + 1 WHERE name = 'leads_with_details';
+            UPDATE stats_totals SET value = value + 1 WHERE name = 'budget_filled' AND COALESCE(new.budget, '') <> '';
+            UPDATE stats_totals SET value = value + 1 WHERE name = 'timeline_filled' AND COALESCE(new.timeline, '') <> '';
+            UPDATE stats_totals SET value = value + 1 WHERE name = 'needs_filled' AND COALESCE(new.needs, '') <> '';
+            UPDATE stats_totals SET value = value + 1
+            WHERE name = 'product_interest_filled' AND COALESCE(new.product_interest, '') <> '';
+            INSERT INTO product_interest_stats (product_interest, lead_count)
+            VALUES (COALESCE(new.product_interest, ''), 1)
+            ON CONFLICT(product_interest) DO UPDATE SET lead_count = lead_count + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS stats_lead_details_update AFTER UPDATE ON lead_details BEGIN
+            UPDATE stats_totals SET value = value
+                + (COALESCE(new.budget, '') <> '') - (COALESCE(old.budget, '') <> '')
+            WHERE name = 'budget_filled';
+            UPDATE stats_totals SET value = value
+                + (COALESCE(new.timeline, '') <> '') - (COALESCE(old.timeline, '') <> '')
+            WHERE name = 'timeline_filled';
+            UPDATE stats_totals SET value = value
+                + (COALESCE(new.needs, '') <> '') - (COALESCE(old.needs, '') <> '')
+            WHERE name = 'needs_filled';
+            UPDATE stats_totals SET value = value
+                + (COALESCE(new.product_interest, '') <> '') - (COALESCE(old.product_interest, '') <> '')
+            WHERE name = 'product_interest_filled';
+            UPDATE product_interest_stats SET lead_count = lead_count - 1
+            WHERE product_interest = COALESCE(old.product_interest, '');
+            INSERT INTO product_interest_stats (product_interest, lead_count)
+            VALUES (COALESCE(new.product_interest, ''), 1)
+            ON CONFLICT(product_interest) DO UPDATE SET lead_count = lead_count + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS stats_lead_details_delete AFTER DELETE ON lead_details BEGIN
+            UPDATE stats_totals SET value = value - 1 WHERE name = 'leads_with_details';
+            UPDATE stats_totals SET value = value - 1 WHERE name = 'budget_filled' AND COALESCE(old.budget, '') <> '';
+            UPDATE stats_totals SET value = value - 1 WHERE name = 'timeline_filled' AND COALESCE(old.timeline, '') <> '';
+            UPDATE stats_totals SET value = value - 1 WHERE name = 'needs_filled' AND COALESCE(old.needs, '') <> '';
+            UPDATE stats_totals SET value = value - 1
+            WHERE name = 'product_interest_filled' AND COALESCE(old.product_interest, '') <> '';
+            UPDATE product_interest_stats SET lead_count = lead_count - 1
+            WHERE product_interest = COALESCE(old.product_interest, '');
+        END;
+    """),
+    (6, "intencion_de_mensajes", """
+        -- Intención detectada en cada mensaje del lead, para entrenar el clasificador local
+        ALTER TABLE messages ADD COLUMN intent TEXT;
+    """),
+    (7, "email_sin_mayusculas", """
+        -- Deduplicación de leads por email sin distinguir mayúsculas en la importación masiva
+        CREATE INDEX IF NOT EXISTS idx_leads_email_lower ON leads(lower(email));
+    """),
+    (8, "busqueda_en_el_archivo", """
+        -- Índice FTS5 sin contenido de los mensajes archivados: el texto solo se
+        -- guarda comprimido, el índice conserva los términos para buscarlos
+        CREATE VIRTUAL TABLE IF NOT EXISTS archived_messages_fts USING fts5(
+            content,
+            content='',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+
+        -- Conversación y fecha de cada mensaje archivado (rowid del índice = ID del mensaje)
+        CREATE TABLE IF NOT EXISTS archived_messages_index (
+            message_id INTEGER PRIMARY KEY,
+            conversation_id INTEGER NOT NULL,
+            timestamp TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_archived_messages_index_conversation
+            ON archived_messages_index(conversation_id);
+    """),
+]
+
+SCHEMA_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def get_schema_version(conn):
+    """
+    Obtener la versión actual del esquema
+
+    Args:
+        conn (sqlite3.Connection): Conexión a la base de datos
+
+    Returns:
+        int: Última versión aplicada (0 si no hay ninguna)
+    """
+    conn.execute(SCHEMA_VERSION_TABLE)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def apply_migrations(conn, migrations=MIGRATIONS):
+    """
+    Aplicar en orden las migraciones pendientes
+
+    Cada migración se ejecuta en su propia transacción junto con el registro
+    de su versión, de modo que una migración fallida no deja cambios a medias.
+
+    Args:
+        conn (sqlite3.Connection): Conexión a la base de datos
+        migrations (list): Migraciones disponibles
+
+    Returns:
+        list: Versiones aplicadas en esta llamada
+    """
+    current_version = get_schema_version(conn)
+    conn.commit()
+
+    applied = []
+    for version, name, script in sorted(migrations):
+        if version <= current_version:
+            continue
+        try:
+            conn.executescript(f"""
+                BEGIN;
+                {script}
+                INSERT INTO schema_version (version, name) VALUES ({int(version)}, '{name}');
+                COMMIT;
+            """)
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        applied.append(version)
+
+    return applied
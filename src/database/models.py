@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, SerializeAsAny
 from typing import Optional, List
 from datetime import datetime
 
@@ -14,7 +14,7 @@ class Lead(BaseModel):
 
 class LeadDetails(BaseModel):
     id: Optional[int] = None
-    lead_id: int
+    lead_id: Optional[int] = None  # Se asigna al crear el lead
     budget: Optional[str] = None
     needs: Optional[str] = None
     product_interest: Optional[str] = None
@@ -28,15 +28,62 @@ class Conversation(BaseModel):
     ended_at: Optional[datetime] = None
 
 
+class ConversationSummary(Conversation):
+    message_count: int = 0
+    last_activity_at: Optional[datetime] = None
+
+
+class ConversationStats(BaseModel):
+    conversation_id: int
+    lead_id: Optional[int] = None
+    message_count: int = 0
+    lead_message_count: int = 0
+    agent_message_count: int = 0
+    started_at: Optional[datetime] = None
+    ended_at: Optional[datetime] = None
+    first_message_at: Optional[datetime] = None
+    last_message_at: Optional[datetime] = None
+    duration_seconds: Optional[float] = None
+
+
 class Message(BaseModel):
     id: Optional[int] = None
     conversation_id: int
     sender: str  # 'agent' o 'lead'
     content: str
     timestamp: datetime = Field(default_factory=datetime.now)
+    intent: Optional[str] = None  # Intención detectada en los mensajes del lead
+
+
+class SearchHit(BaseModel):
+    message_id: int
+    conversation_id: int
+    lead_id: Optional[int] = None
+    sender: str
+    content: str
+    snippet: str
+    timestamp: Optional[datetime] = None
+    rank: float
 
 
 class FullLead(BaseModel):
     lead: Lead
     details: Optional[LeadDetails] = None
-    conversations: List[Conversation] = []
\ No newline at end of file
+    # Con include_stats son ConversationSummary: se serializan con todos sus campos
+    conversations: List[SerializeAsAny[Conversation]] = []
+
+
+def construct_trusted(model_class, values):
+    """
+    Construir un modelo sin validación a partir de datos de la propia base de datos
+
+    Equivale a model_construct pero asigna directamente el estado interno, lo
+    que lo hace varias veces más rápido en lecturas masivas. `values` debe
+    contener todos los campos del modelo con sus tipos ya correctos.
+    """
+    instance = model_class.__new__(model_class)
+    object.__setattr__(instance, '__dict__', values)
+    object.__setattr__(instance, '__pydantic_fields_set__', set(values))
+    object.__setattr__(instance, '__pydantic_extra__', None)
+    object.__setattr__(instance, '__pydantic_private__', None)
+    return instance
\ No newline at end of file
@@ -1,34 +1,59 @@
-import sqlite3
-import os
+import re
+import unicodedata
 from datetime import datetime
-from src.config import DATABASE_PATH
-from src.database.models import Lead, LeadDetails, Conversation, Message
+from src.config import MESSAGE_PAGE_SIZE, SEARCH_RESULTS_LIMIT
+from src.database.archive import load_archived_messages, index_archived_conversations
+from src.database.cache import lead_cache
+from src.database.connection import get_connection_manager
+from src.database.migrations import apply_migrations
+from src.database.models import (
+    Lead,
+    LeadDetails,
+    Conversation,
+    ConversationSummary,
+    ConversationStats,
+    Message,
+    FullLead,
+    SearchHit,
+    construct_trusted,
+)
+
+# Límite conservador de parámetros por consulta IN (...)
+MAX_QUERY_PARAMS = 500
 
 
 def get_db_connection():
-    """Crear una conexión a la base de datos"""
-    conn = sqlite3.connect(DATABASE_PATH, detect_types=sqlite3.PARSE_DECLTYPES)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Obtener la conexión persistente del hilo actual"""
+    return get_connection_manager().get_connection()
+
+
+def connection():
+    """Contexto de lectura sobre la conexión del hilo actual"""
+    return get_connection_manager().connection()
+
+
+def transaction():
+    """Contexto transaccional sobre la conexión del hilo actual"""
+    return get_connection_manager().transaction()
 
 
 def initialize_database():
-    """Inicializar la base de datos con el esquema definido"""
-    conn = get_db_connection()
+    """Inicializar la base de datos con el esquema definido y sus migraciones"""
     try:
         with open('data/schema.sql') as f:
-            conn.executescript(f.read())
-        conn.commit()
+            schema = f.read()
+        with transaction() as conn:
+            conn.executescript(schema)
+            apply_migrations(conn)
+            # Archivos anteriores al índice de búsqueda del archivo
+            index_archived_conversations(conn)
     except Exception as e:
         print(f"Error initializing database: {e}")
-    finally:
-        conn.close()
 
 
 def create_lead(lead: Lead):
     """Crear un nuevo lead en la base de datos"""
-    conn = get_db_connection()
-    try:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute(
             """
@@ -38,96 +63,456 @@ def create_lead(lead: Lead):
             (lead.name, lead.company, lead.email, lead.phone)
         )
         lead_id = cursor.lastrowid
-        conn.commit()
-        return lead_id
-    finally:
-        conn.close()
+    lead_cache.invalidate(email=lead.email)
+    return lead_id
 
 
 def update_lead_details(details: LeadDetails):
     """Actualizar o crear detalles de un lead"""
-    conn = get_db_connection()
-    try:
-        cursor = conn.cursor()
-        # Verificar si ya existen detalles para este lead
-        cursor.execute("SELECT id FROM lead_details WHERE lead_id = ?", (details.lead_id,))
-        existing_id = cursor.fetchone()
-        
-        if existing_id:
-            # Actualizar detalles existentes
-            cursor.execute(
-                """
-                UPDATE lead_details
-                SET budget = ?, needs = ?, product_interest = ?, timeline = ?
-                WHERE lead_id = ?
-                """,
-                (details.budget, details.needs, details.product_interest, details.timeline, details.lead_id)
-            )
-        else:
-            # Crear nuevos detalles
-            cursor.execute(
-                """
-                INSERT INTO lead_details (lead_id, budget, needs, product_interest, timeline)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (details.lead_id, details.budget, details.needs, details.product_interest, details.timeline)
-            )
-        
-        conn.commit()
-    finally:
-        conn.close()
+    with transaction() as conn:
+        conn.execute(
+            """
+            INSERT INTO lead_details (lead_id, budget, needs, product_interest, timeline)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(lead_id) DO UPDATE SET
+                budget = excluded.budget,
+                needs = excluded.needs,
+                product_interest = excluded.product_interest,
+                timeline = excluded.timeline
+            """,
+            (details.lead_id, details.budget, details.needs, details.product_interest, details.timeline)
+        )
+    lead_cache.invalidate(lead_id=details.lead_id)
+
+
+def update_lead_details_many(details_list, keep_existing=True):
+    """Actualizar o crear los detalles de varios leads en una única transacción (con keep_existing, los campos a None no borran lo guardado)"""
+    if not details_list:
+        return 0
+    assignments = ",\n".join(
+        f"{field} = COALESCE(excluded.{field}, lead_details.{field})" if keep_existing else f"{field} = excluded.{field}"
+        for field in ("budget", "needs", "product_interest", "timeline")
+    )
+    with transaction() as conn:
+        conn.executemany(
+            f"""
+            INSERT INTO lead_details (lead_id, budget, needs, product_interest, timeline)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(lead_id) DO UPDATE SET
+                {assignments}
+            """,
+            [(d.lead_id, d.budget, d.needs, d.product_interest, d.timeline) for d in details_list]
+        )
+    for details in details_list:
+        lead_cache.invalidate(lead_id=details.lead_id)
+    return len(details_list)
+
+
+def _lead_from_row(lead_data):
+    """Construir un Lead a partir de una fila de la tabla leads"""
+    return Lead(
+        id=lead_data['id'],
+        name=lead_data['name'],
+        company=lead_data['company'],
+        email=lead_data['email'],
+        phone=lead_data['phone'],
+        created_at=lead_data['created_at']
+    )
 
 
 def get_lead_by_id(lead_id: int):
     """Obtener un lead por su ID"""
-    conn = get_db_connection()
-    try:
+    lead = lead_cache.get_by_id(lead_id)
+    if lead is not None:
+        return lead
+    
+    with connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM leads WHERE id = ?", (lead_id,))
         lead_data = cursor.fetchone()
-        
-        if lead_data:
-            lead = Lead(
-                id=lead_data['id'],
-                name=lead_data['name'],
-                company=lead_data['company'],
-                email=lead_data['email'],
-                phone=lead_data['phone'],
-                created_at=lead_data['created_at']
-            )
-            return lead
-        return None
-    finally:
-        conn.close()
+    
+    if lead_data:
+        lead = _lead_from_row(lead_data)
+        lead_cache.put(lead)
+        return lead
+    return None
 
 
 def get_lead_by_email(email: str):
     """Obtener un lead por su email"""
-    conn = get_db_connection()
-    try:
+    lead_id = lead_cache.get_id_by_email(email)
+    if lead_id is not None:
+        lead = get_lead_by_id(lead_id)
+        if lead is not None:
+            return lead
+    
+    with connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM leads WHERE email = ?", (email,))
         lead_data = cursor.fetchone()
+    
+    if lead_data:
+        lead = _lead_from_row(lead_data)
+        lead_cache.put(lead)
+        return lead
+    return None
+
+
+def _fts_query(query: str):
+    """Convertir texto libre en una consulta FTS5 segura (todos los términos, literales)"""
+    terms = query.split()
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def _normalize_term(text: str):
+    """Quitar tildes y mayúsculas, igual que el tokenizador unicode61 con remove_diacritics"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _archived_snippet(content: str, match: str, tokens: int = 12):
+    """
+    Fragmento resaltado de un mensaje archivado, como snippet() de FTS5
+
+    El índice del archivo no guarda el texto, así que el fragmento se
+    construye sobre el mensaje descomprimido.
+    """
+    terms = [
+        (_normalize_term(term), prefix == "*")
+        for term, prefix in re.findall(r'(\w+)(\*?)', match)
+        if term not in ("AND", "OR", "NOT", "NEAR")
+    ]
+    words = list(re.finditer(r'\w+', content))
+    matched = {
+        i for i, word in enumerate(words)
+        if any(_normalize_term(word.group()) == term or (prefix and _normalize_term(word.group()).startswith(term))
+               for term, prefix in terms)
+    }
+    if not words:
+        return content
+    first = min(matched) if matched else 0
+    start = max(0, min(first - tokens // 2, len(words) - tokens))
+    end = min(len(words), start + tokens)
+    
+    parts = ["…" if start > 0 else content[:words[0].start()]]
+    for i in range(start, end):
+        word = words[i].group()
+        parts.append(f"[{word}]" if i in matched else word)
+        parts.append(content[words[i].end():words[i + 1].start()] if i + 1 < end else "")
+    parts.append("…" if end < len(words) else content[words[end - 1].end():])
+    return "".join(parts)
+
+
+def search_messages(query: str, lead_id: int = None, since: datetime = None,
+                    limit: int = SEARCH_RESULTS_LIMIT, raw_query: bool = False):
+    """
+    Buscar mensajes por texto completo, ordenados por relevancia (BM25)
+    
+    Se buscan tanto los mensajes activos como los de conversaciones
+    archivadas, que tienen su propio índice sin contenido. La relevancia de
+    cada índice se calcula con sus propias estadísticas, por lo que el orden
+    entre mensajes activos y archivados es aproximado.
+    
+    Args:
+        query (str): Texto a buscar; todos los términos deben aparecer
+        lead_id (int, optional): Restringir a las conversaciones de un lead
+        since (datetime, optional): Restringir a mensajes posteriores a esta fecha
+        limit (int): Número máximo de resultados
+        raw_query (bool): Pasar `query` sin escapar, con la sintaxis de FTS5 (OR, NEAR, prefijo*)
         
-        if lead_data:
-            lead = Lead(
-                id=lead_data['id'],
-                name=lead_data['name'],
-                company=lead_data['company'],
-                email=lead_data['email'],
-                phone=lead_data['phone'],
-                created_at=lead_data['created_at']
-            )
-            return lead
+    Returns:
+        list: Objetos SearchHit con el mensaje, su conversación y su lead
+    """
+    match = query if raw_query else _fts_query(query)
+    if not match:
+        return []
+    
+    with connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT m.id, m.conversation_id, c.lead_id, m.sender, m.content,
+                   snippet(messages_fts, 0, '[', ']', '…', 12) AS snippet,
+                   m.timestamp, bm25(messages_fts) AS rank
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            LEFT JOIN conversations c ON c.id = m.conversation_id
+            WHERE messages_fts MATCH ?
+              AND (? IS NULL OR c.lead_id = ?)
+              AND (? IS NULL OR m.timestamp >= ?)
+            ORDER BY rank
+            LIMIT ?
+            """,
+            (match, lead_id, lead_id, since, since, limit)
+        ).fetchall()
+        
+        archived_rows = conn.execute(
+            """
+            SELECT i.message_id, i.conversation_id, c.lead_id, i.timestamp,
+                   bm25(archived_messages_fts) AS rank
+            FROM archived_messages_fts
+            JOIN archived_messages_index i ON i.message_id = archived_messages_fts.rowid
+            LEFT JOIN conversations c ON c.id = i.conversation_id
+            WHERE archived_messages_fts MATCH ?
+              AND (? IS NULL OR c.lead_id = ?)
+              AND (? IS NULL OR i.timestamp >= ?)
+            ORDER BY rank
+            LIMIT ?
+            """,
+            (match, lead_id, lead_id, since, since, limit)
+        ).fetchall()
+        
+        # El texto de los mensajes archivados se lee del blob de su conversación
+        archived = {}
+        for row in archived_rows:
+            if row['conversation_id'] not in archived:
+                messages = load_archived_messages(conn, row['conversation_id']) or []
+                archived[row['conversation_id']] = {m.id: m for m in messages}
+    
+    hits = [
+        SearchHit(
+            message_id=row['id'],
+            conversation_id=row['conversation_id'],
+            lead_id=row['lead_id'],
+            sender=row['sender'],
+            content=row['content'],
+            snippet=row['snippet'],
+            timestamp=row['timestamp'],
+            rank=row['rank']
+        )
+        for row in rows
+    ]
+    for row in archived_rows:
+        message = archived[row['conversation_id']].get(row['message_id'])
+        if message is None:
+            continue
+        hits.append(SearchHit(
+            message_id=message.id,
+            conversation_id=message.conversation_id,
+            lead_id=row['lead_id'],
+            sender=message.sender,
+            content=message.content,
+            snippet=_archived_snippet(message.content, match),
+            timestamp=message.timestamp,
+            rank=row['rank']
+        ))
+    hits.sort(key=lambda hit: hit.rank)
+    return hits[:limit]
+
+
+def _parse_timestamp(value):
+    """Convertir un timestamp leído como texto en datetime"""
+    return datetime.fromisoformat(value) if value else None
+
+
+def get_full_leads(lead_ids, include_stats: bool = False):
+    """
+    Obtener varios leads con sus detalles y conversaciones sin consultas N+1
+    
+    Se ejecuta una consulta para leads y detalles y otra para las
+    conversaciones (por bloques de IDs), con independencia del número de leads.
+    
+    Args:
+        lead_ids (list): IDs de los leads
+        include_stats (bool): Incluir número de mensajes y última actividad por conversación
+        
+    Returns:
+        list: Objetos FullLead en el orden de `lead_ids` (se omiten los inexistentes)
+    """
+    lead_ids = list(dict.fromkeys(lead_ids))
+    leads = {}
+    conversations = {lead_id: [] for lead_id in lead_ids}
+    
+    with connection() as conn:
+        for i in range(0, len(lead_ids), MAX_QUERY_PARAMS):
+            batch = lead_ids[i:i + MAX_QUERY_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            
+            for row in conn.execute(
+                f"""
+                SELECT l.*, d.id AS details_id, d.budget, d.needs, d.product_interest, d.timeline
+                FROM leads l
+                LEFT JOIN lead_details d ON d.lead_id = l.id
+                WHERE l.id IN ({placeholders})
+                """,
+                batch
+            ):
+                details = None
+                if row['details_id'] is not None:
+                    details = LeadDetails(
+                        id=row['details_id'],
+                        lead_id=row['id'],
+                        budget=row['budget'],
+                        needs=row['needs'],
+                        product_interest=row['product_interest'],
+                        timeline=row['timeline']
+                    )
+                leads[row['id']] = (_lead_from_row(row), details)
+            
+            if include_stats:
+                query = f"""
+                    SELECT c.id, c.lead_id, c.started_at, c.ended_at,
+                           COUNT(m.id) + COALESCE(a.message_count, 0) AS message_count,
+                           CAST(COALESCE(MAX(m.timestamp), a.last_message_at) AS TEXT) AS last_message_at
+                    FROM conversations c
+                    LEFT JOIN messages m ON m.conversation_id = c.id
+                    LEFT JOIN archived_conversations a ON a.conversation_id = c.id
+                    WHERE c.lead_id IN ({placeholders})
+                    GROUP BY c.id
+                    ORDER BY c.id
+                """
+            else:
+                query = f"""
+                    SELECT id, lead_id, started_at, ended_at FROM conversations
+                    WHERE lead_id IN ({placeholders})
+                    ORDER BY id
+                """
+            
+            for row in conn.execute(query, batch):
+                if include_stats:
+                    activity = [t for t in (row['started_at'], row['ended_at'],
+                                            _parse_timestamp(row['last_message_at'])) if t]
+                    conversation = ConversationSummary(
+                        id=row['id'],
+                        lead_id=row['lead_id'],
+                        started_at=row['started_at'],
+                        ended_at=row['ended_at'],
+                        message_count=row['message_count'],
+                        last_activity_at=max(activity) if activity else None
+                    )
+                else:
+                    conversation = Conversation(
+                        id=row['id'],
+                        lead_id=row['lead_id'],
+                        started_at=row['started_at'],
+                        ended_at=row['ended_at']
+                    )
+                conversations[row['lead_id']].append(conversation)
+    
+    return [
+        FullLead(lead=leads[lead_id][0], details=leads[lead_id][1], conversations=conversations[lead_id])
+        for lead_id in lead_ids
+        if lead_id in leads
+    ]
+
+
+def get_full_lead(lead_id: int, include_stats: bool = False):
+    """Obtener un lead con sus detalles y conversaciones"""
+    full_leads = get_full_leads([lead_id], include_stats=include_stats)
+    return full_leads[0] if full_leads else None
+
+
+def get_job_checkpoint(job: str, source: str):
+    """Obtener la posición guardada de un trabajo masivo reanudable"""
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT position FROM job_checkpoints WHERE job = ? AND source = ?",
+            (job, source)
+        ).fetchone()
+    return row[0] if row else 0
+
+
+def set_job_checkpoint(job: str, source: str, position: int):
+    """Guardar la posición de un trabajo masivo (dentro de la transacción en curso si la hay)"""
+    with transaction() as conn:
+        conn.execute(
+            """
+            INSERT INTO job_checkpoints (job, source, position, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(job, source) DO UPDATE SET
+                position = excluded.position,
+                updated_at = excluded.updated_at
+            """,
+            (job, source, position, datetime.now())
+        )
+
+
+def clear_job_checkpoint(job: str, source: str):
+    """Eliminar el punto de control de un trabajo masivo completado"""
+    with transaction() as conn:
+        conn.execute("DELETE FROM job_checkpoints WHERE job = ? AND source = ?", (job, source))
+
+
+def get_lead_cache_stats():
+    """Obtener las métricas de aciertos y fallos de la caché de leads"""
+    return lead_cache.stats()
+
+
+def get_stats_overview():
+    """
+    Obtener las métricas globales de leads y conversaciones
+
+    Se leen de los contadores que mantienen los triggers de la migración 5, por
+    lo que el coste no depende del volumen de mensajes ni de leads.
+
+    Returns:
+        dict: Totales, medias por conversación y tasas de cumplimentación
+    """
+    with connection() as conn:
+        totals = {name: value for name, value in conn.execute("SELECT name, value FROM stats_totals")}
+
+    def ratio(numerator, denominator):
+        return totals.get(numerator, 0) / totals[denominator] if totals.get(denominator) else 0.0
+
+    return {
+        "leads": int(totals.get("leads", 0)),
+        "leads_with_details": int(totals.get("leads_with_details", 0)),
+        "conversations": int(totals.get("conversations", 0)),
+        "ended_conversations": int(totals.get("ended_conversations", 0)),
+        "messages": int(totals.get("messages", 0)),
+        "avg_messages_per_conversation": ratio("messages", "conversations"),
+        "avg_turns_per_conversation": ratio("lead_messages", "conversations"),
+        "avg_duration_seconds": ratio("duration_seconds", "ended_conversations"),
+        "completion_rates": {
+            field: ratio(f"{field}_filled", "leads_with_details")
+            for field in ("budget", "timeline", "needs", "product_interest")
+        },
+    }
+
+
+def get_product_interest_counts():
+    """Obtener el número de leads por producto de interés ('' = sin especificar)"""
+    with connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT product_interest, lead_count FROM product_interest_stats
+            WHERE lead_count > 0
+            ORDER BY lead_count DESC, product_interest
+            """
+        ).fetchall()
+    return {row[0]: row[1] for row in rows}
+
+
+def get_conversation_stats(conversation_id: int):
+    """Obtener el resumen precalculado de una conversación"""
+    with connection() as conn:
+        row = conn.execute(
+            """
+            SELECT conversation_id, lead_id, message_count, lead_message_count, agent_message_count,
+                   CAST(started_at AS TEXT), CAST(ended_at AS TEXT),
+                   CAST(first_message_at AS TEXT), CAST(last_message_at AS TEXT), duration_seconds
+            FROM conversation_stats WHERE conversation_id = ?
+            """,
+            (conversation_id,)
+        ).fetchone()
+    if row is None:
         return None
-    finally:
-        conn.close()
+    return construct_trusted(ConversationStats, {
+        'conversation_id': row[0],
+        'lead_id': row[1],
+        'message_count': row[2],
+        'lead_message_count': row[3],
+        'agent_message_count': row[4],
+        'started_at': _parse_timestamp(row[5]),
+        'ended_at': _parse_timestamp(row[6]),
+        'first_message_at': _parse_timestamp(row[7]),
+        'last_message_at': _parse_timestamp(row[8]),
+        'duration_seconds': row[9]
+    })
 
 
 def start_conversation(lead_id: int):
     """Iniciar una nueva conversación con un lead"""
-    conn = get_db_connection()
-    try:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute(
             """
@@ -137,16 +522,12 @@ def start_conversation(lead_id: int):
             (lead_id, datetime.now())
         )
         conversation_id = cursor.lastrowid
-        conn.commit()
         return conversation_id
-    finally:
-        conn.close()
 
 
 def end_conversation(conversation_id: int):
     """Finalizar una conversación"""
-    conn = get_db_connection()
-    try:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute(
             """
@@ -156,56 +537,80 @@ def end_conversation(conversation_id: int):
             """,
             (datetime.now(), conversation_id)
         )
-        conn.commit()
-    finally:
-        conn.close()
 
 
 def add_message(message: Message):
     """Añadir un mensaje a una conversación"""
-    conn = get_db_connection()
-    try:
+    with transaction() as conn:
         cursor = conn.cursor()
         cursor.execute(
             """
-            INSERT INTO messages (conversation_id, sender, content, timestamp)
-            VALUES (?, ?, ?, ?)
+            INSERT INTO messages (conversation_id, sender, content, timestamp, intent)
+            VALUES (?, ?, ?, ?, ?)
             """,
-            (message.conversation_id, message.sender, message.content, message.timestamp)
+            (message.conversation_id, message.sender, message.content, message.timestamp, message.intent)
         )
         message_id = cursor.lastrowid
-        conn.commit()
         return message_id
-    finally:
-        conn.close()
 
 
-def get_conversation_messages(conversation_id: int):
-    """Obtener todos los mensajes de una conversación"""
-    conn = get_db_connection()
-    try:
+def add_messages(messages):
+    """Añadir varios mensajes en una única transacción"""
+    if not messages:
+        return 0
+    with transaction() as conn:
+        conn.executemany(
+            """
+            INSERT INTO messages (conversation_id, sender, content, timestamp, intent)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [(m.conversation_id, m.sender, m.content, m.timestamp, m.intent) for m in messages]
+        )
+    return len(messages)
+
+
+def _message_from_row(row):
+    """Construir un Message sin validación a partir de una fila de la base de datos propia"""
+    return construct_trusted(Message, {
+        'id': row[0],
+        'conversation_id': row[1],
+        'sender': row[2],
+        'content': row[3],
+        'timestamp': datetime.fromisoformat(row[4]) if row[4] else None,
+        'intent': row[5]
+    })
+
+
+def get_conversation_messages(conversation_id: int, after_id: int = None, limit: int = None):
+    """Obtener los mensajes (activos o archivados) de una conversación, opcionalmente a partir de un ID y hasta un límite"""
+    with connection() as conn:
         cursor = conn.cursor()
+        # Tuplas simples en lugar de sqlite3.Row y el timestamp como texto para
+        # evitar el conversor de sqlite3, mucho más lento que fromisoformat
+        cursor.row_factory = None
         cursor.execute(
             """
-            SELECT * FROM messages
-            WHERE conversation_id = ?
-            ORDER BY timestamp
+            SELECT id, conversation_id, sender, content, CAST(timestamp AS TEXT), intent FROM messages
+            WHERE conversation_id = ? AND id > ?
+            ORDER BY id
+            LIMIT ?
             """,
-            (conversation_id,)
+            (conversation_id, after_id or 0, -1 if limit is None else limit)
         )
-        messages_data = cursor.fetchall()
-        
-        messages = []
-        for msg_data in messages_data:
-            message = Message(
-                id=msg_data['id'],
-                conversation_id=msg_data['conversation_id'],
-                sender=msg_data['sender'],
-                content=msg_data['content'],
-                timestamp=msg_data['timestamp']
-            )
-            messages.append(message)
+        messages = [_message_from_row(row) for row in cursor]
         
+        # Las conversaciones archivadas ya no tienen mensajes en la tabla messages
+        if not messages:
+            messages = load_archived_messages(conn, conversation_id, after_id, limit) or []
         return messages
-    finally:
-        conn.close()
\ No newline at end of file
+
+
+def iter_conversation_messages(conversation_id: int, after_id: int = None, page_size: int = MESSAGE_PAGE_SIZE):
+    """Recorrer los mensajes de una conversación en páginas usando paginación por clave"""
+    last_id = after_id or 0
+    while True:
+        page = get_conversation_messages(conversation_id, after_id=last_id, limit=page_size)
+        yield from page
+        if len(page) < page_size:
+            return
+        last_id = page[-1].id
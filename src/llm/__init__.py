@@ -1,14 +1,40 @@
-from src.llm.model import generate_response, extract_entities
+from src.llm.model import generate_response, stream_response, extract_entities, analyze_turn, summarize_history, TurnAnalysis
+from src.llm.history import ConversationHistory, count_tokens
+from src.llm.clients import get_chat_model, get_openai_client, reset_clients
+from src.llm.transport import configure_http_transport, get_transport_stats
+from src.llm.policy import LLMCallError, call_with_policy, turn_deadline, get_call_stats
+from src.llm.cassette import CassetteTransport, use_cassette
 from src.llm.prompt_templates import (
     SYSTEM_PROMPT,
     USER_PROMPT_TEMPLATE,
-    ENTITY_EXTRACTION_PROMPT
+    ENTITY_EXTRACTION_PROMPT,
+    TURN_ANALYSIS_PROMPT,
+    HISTORY_SUMMARY_PROMPT
 )
 
 __all__ = [
     'generate_response',
+    'stream_response',
     'extract_entities',
+    'analyze_turn',
+    'summarize_history',
+    'TurnAnalysis',
+    'ConversationHistory',
+    'count_tokens',
+    'get_chat_model',
+    'get_openai_client',
+    'reset_clients',
+    'configure_http_transport',
+    'get_transport_stats',
+    'LLMCallError',
+    'call_with_policy',
+    'turn_deadline',
+    'get_call_stats',
+    'CassetteTransport',
+    'use_cassette',
     'SYSTEM_PROMPT',
     'USER_PROMPT_TEMPLATE',
-    'ENTITY_EXTRACTION_PROMPT'
+    'ENTITY_EXTRACTION_PROMPT',
+    'TURN_ANALYSIS_PROMPT',
+    'HISTORY_SUMMARY_PROMPT'
 ]
\ No newline at end of file
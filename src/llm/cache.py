@@ -0,0 +1,350 @@
+"""
+Caché de respuestas del LLM
+
+Las llamadas se indexan por tipo de llamada, modelo, temperatura y prompt
+normalizado. El texto del usuario se normaliza aparte, porque las plantillas
+lo incluyen en medio del prompt (entre comillas, seguido del contexto) y la
+puntuación de sus extremos no llegaría a los extremos del mensaje. Hay un nivel en memoria (LRU con TTL) y un nivel opcional en
+SQLite que comparten todos los procesos (por ejemplo, los workers de
+Streamlit) que apunten al mismo fichero. Los aciertos en SQLite solo leen: el
+instante de uso se acumula en memoria y se escribe por lotes, como muy tarde
+antes de cada purga, así que el orden LRU entre procesos es aproximado.
+
+La caché se activa por tipo de llamada ("response", "extraction", "intent")
+con LLM_CACHE_CALLS, ya que las respuestas generadas con temperatura alta no
+siempre deben reutilizarse.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from src.config import (
+    LLM_CACHE_CALLS,
+    LLM_CACHE_SIZE,
+    LLM_CACHE_TTL,
+    LLM_CACHE_PATH,
+    LLM_CACHE_MAX_ROWS,
+)
+from src.database.cache import LRUCache, MISSING
+from src.database.connection import ConnectionManager
+from src.llm.policy import invoke_with_policy
+
+CALL_TYPES = ("response", "extraction", "intent")
+
+# Escrituras en el nivel SQLite entre purgas de entradas expiradas o sobrantes
+PURGE_INTERVAL = 100
+
+# Aciertos en el nivel SQLite cuyos instantes de uso se acumulan antes de escribirlos
+ACCESS_FLUSH_INTERVAL = 100
+
+# Marca que sustituye al texto del usuario en los mensajes al calcular la clave
+USER_TEXT_PLACEHOLDER = "\x00"
+
+_WHITESPACE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " .,;:!?¡¿\"'"
+_EDGE_CHARS = f"[{re.escape(_EDGE_PUNCTUATION)}]*"
+
+
+def normalize_prompt(text):
+    """
+    Normalizar un texto para que entradas casi idénticas compartan clave
+
+    Unifica la forma Unicode, mayúsculas y espacios, y elimina la puntuación
+    de los extremos ("Sí." y "sí" producen la misma clave).
+
+    Args:
+        text (str): Texto a normalizar
+
+    Returns:
+        str: Texto normalizado
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _WHITESPACE.sub(" ", text).strip(_EDGE_PUNCTUATION)
+
+
+class ResponseCache:
+    """
+    Caché de dos niveles para el contenido de las respuestas del LLM
+    """
+
+    def __init__(self, calls=LLM_CACHE_CALLS, max_size=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL,
+                 path=LLM_CACHE_PATH, max_rows=LLM_CACHE_MAX_ROWS):
+        """
+        Inicializar la caché
+
+        Args:
+            calls (iterable): Tipos de llamada con caché activada
+            max_size (int): Entradas del nivel en memoria
+            ttl (float): Segundos de validez de cada entrada (0 = sin caducidad)
+            path (str, optional): Fichero SQLite del nivel compartido
+            max_rows (int): Entradas máximas del nivel SQLite
+        """
+        unknown = set(calls) - set(CALL_TYPES)
+        if unknown:
+            raise ValueError(f"Tipos de llamada no válidos para la caché: {sorted(unknown)}")
+
+        self.calls = frozenset(calls)
+        self.ttl = ttl or None
+        self.max_rows = max_rows
+        self.memory = LRUCache(max_size, self.ttl)
+        self.store = None
+        self._lock = threading.Lock()
+        self._writes = 0
+        # Instante del último uso de las entradas leídas de SQLite, pendiente de escribir
+        self._accessed = {}
+        self.store_hits = 0
+        self.store_misses = 0
+        self.evictions = 0
+
+        if path:
+            self.store = ConnectionManager(path)
+            with self.store.transaction() as conn:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS llm_cache (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        expires_at REAL,
+                        last_used_at REAL NOT NULL
+                    )
+                    """
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used_at)")
+
+    def enabled(self, call_type):
+        """Indicar si la caché está activada para un tipo de llamada"""
+        return call_type in self.calls
+
+    @staticmethod
+    def make_key(call_type, model, messages, user_text=None):
+        """
+        Calcular la clave de una llamada
+
+        Args:
+            call_type (str): Tipo de llamada
+            model: Modelo de chat (se usan su nombre y su temperatura)
+            messages (list): Mensajes enviados al modelo
+            user_text (str, optional): Texto del usuario incluido en los
+                mensajes; se sustituye por una marca y se normaliza aparte,
+                de modo que "Sí." y "sí" comparten clave con la misma plantilla
+
+        Returns:
+            str: Clave SHA-256 en hexadecimal
+        """
+        user_key = normalize_prompt(user_text) if user_text else ""
+        contents = [normalize_prompt(message.content) for message in messages]
+        if user_key:
+            # Cada aparición del texto, con la puntuación que lo rodee, se sustituye por la marca
+            pattern = re.compile(rf"(?<!\w){_EDGE_CHARS}{re.escape(user_key)}{_EDGE_CHARS}(?!\w)")
+            contents = [pattern.sub(USER_TEXT_PLACEHOLDER, content) for content in contents]
+        payload = [
+            call_type,
+            str(getattr(model, "model_name", "")),
+            str(getattr(model, "temperature", "")),
+            [[message.type, content] for message, content in zip(messages, contents)],
+            user_key,
+        ]
+        return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Buscar una respuesta en memoria y, si no está, en SQLite
+
+        Args:
+            key (str): Clave de la llamada
+
+        Returns:
+            str: Respuesta almacenada o None
+        """
+        value = self.memory.get(key, MISSING)
+        if value is not MISSING:
+            return value
+        if self.store is None:
+            return None
+
+        now = time.time()
+        with self.store.connection() as conn:
+            row = conn.execute(
+                "SELECT value FROM llm_cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, now)
+            ).fetchone()
+
+        # El instante de uso se escribe por lotes en lugar de con un UPDATE por acierto
+        with self._lock:
+            if row is None:
+                self.store_misses += 1
+                return None
+            self.store_hits += 1
+            self._accessed[key] = now
+            flush = len(self._accessed) >= ACCESS_FLUSH_INTERVAL
+        if flush:
+            self.flush_access_times()
+        self.memory.set(key, row[0])
+        return row[0]
+
+    def set(self, key, value):
+        """
+        Guardar una respuesta en ambos niveles
+
+        Args:
+            key (str): Clave de la llamada
+            value (str): Contenido de la respuesta
+        """
+        self.memory.set(key, value)
+        if self.store is None:
+            return
+
+        now = time.time()
+        with self.store.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, last_used_at) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl if self.ttl else None, now)
+            )
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % PURGE_INTERVAL == 0
+        if purge:
+            self.purge()
+
+    def flush_access_times(self):
+        """
+        Escribir en SQLite los instantes de uso acumulados en un solo UPDATE por lotes
+
+        Returns:
+            int: Entradas actualizadas
+        """
+        with self._lock:
+            accessed, self._accessed = self._accessed, {}
+        if not accessed or self.store is None:
+            return 0
+        with self.store.transaction() as conn:
+            conn.executemany(
+                "UPDATE llm_cache SET last_used_at = MAX(last_used_at, ?) WHERE key = ?",
+                [(used_at, key) for key, used_at in accessed.items()]
+            )
+        return len(accessed)
+
+    def purge(self):
+        """
+        Eliminar del nivel SQLite las entradas expiradas y las menos usadas
+        por encima de `max_rows`
+
+        Returns:
+            int: Entradas eliminadas
+        """
+        if self.store is None:
+            return 0
+        # Los usos pendientes cuentan para decidir qué entradas se conservan
+        self.flush_access_times()
+        with self.store.transaction() as conn:
+            removed = conn.execute(
+                "DELETE FROM llm_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+            ).rowcount
+            removed += conn.execute(
+                """
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_rows,)
+            ).rowcount
+        with self._lock:
+            self.evictions += removed
+        return removed
+
+    def clear(self):
+        """Vaciar ambos niveles y reiniciar los contadores"""
+        self.memory.clear()
+        if self.store is not None:
+            with self.store.transaction() as conn:
+                conn.execute("DELETE FROM llm_cache")
+        with self._lock:
+            self._accessed = {}
+            self.store_hits = self.store_misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Obtener las métricas de la caché
+
+        Returns:
+            dict: Métricas del nivel en memoria, del nivel SQLite y tasa de aciertos global
+        """
+        memory = self.memory.stats()
+        with self._lock:
+            store = {"hits": self.store_hits, "misses": self.store_misses, "evictions": self.evictions}
+        # Los fallos en memoria que acierta SQLite no son fallos globales
+        lookups = memory["hits"] + memory["misses"]
+        hits = memory["hits"] + store["hits"]
+        return {
+            "calls": sorted(self.calls),
+            "memory": memory,
+            "store": store if self.store is not None else None,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """
+    Obtener la caché de respuestas del proceso, creándola al primer uso
+    """
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache()
+        return _response_cache
+
+
+def configure_response_cache(**options):
+    """
+    Sustituir la caché de respuestas del proceso
+
+    Args:
+        **options: Argumentos de ResponseCache (calls, max_size, ttl, path, max_rows)
+
+    Returns:
+        ResponseCache: Nueva caché
+    """
+    global _response_cache
+    with _response_cache_lock:
+        _response_cache = ResponseCache(**options)
+        return _response_cache
+
+
+def get_response_cache_stats():
+    """Obtener las métricas de aciertos y fallos de la caché de respuestas"""
+    return get_response_cache().stats()
+
+
+def cached_invoke(call_type, model, messages, user_text=None):
+    """
+    Invocar un modelo de chat pasando por la caché si está activada para la llamada
+    
+    Las llamadas que llegan al modelo aplican la política de su tipo (tiempo
+    máximo, reintentos y peticiones duplicadas).
+
+    Args:
+        call_type (str): Tipo de llamada ("response", "extraction" o "intent")
+        model: Modelo de chat
+        messages (list): Mensajes para el modelo
+        user_text (str, optional): Texto del usuario incluido en los mensajes
+            (ver ResponseCache.make_key)
+
+    Returns:
+        str: Contenido de la respuesta
+    """
+    cache = get_response_cache()
+    if not cache.enabled(call_type):
+        return invoke_with_policy(call_type, model, messages).content
+
+    key = cache.make_key(call_type, model, messages, user_text)
+    content = cache.get(key)
+    if content is None:
+        content = invoke_with_policy(call_type, model, messages).content
+        cache.set(key, content)
+    return content
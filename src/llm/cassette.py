@@ -0,0 +1,380 @@
+"""
+Grabación y reproducción de las peticiones a OpenAI
+
+CassetteTransport es un transporte httpx que se instala en el transporte
+compartido (src.llm.transport), de modo que cubre todas las llamadas del
+modelo de chat, la detección de intenciones y Whisper sin tocar su código:
+
+- "record": envía cada petición al transporte real y guarda la respuesta, con
+  su latencia total y hasta el primer byte, en un fichero JSON (cassette);
+- "replay": responde desde el cassette sin red, esperando la latencia
+  grabada (multiplicada por `latency_scale`) o una latencia fija;
+- "auto": reproduce lo grabado y graba lo que falte.
+
+Las peticiones se identifican por método, ruta y cuerpo normalizado (JSON con
+las claves ordenadas; en multipart, el separador aleatorio se sustituye), así
+que un cassette grabado contra api.openai.com se reproduce con cualquier URL
+base. Las peticiones repetidas se reproducen en el orden en que se grabaron.
+Las cabeceras de la petición (con la clave de la API) no se guardan.
+"""
+import asyncio
+import atexit
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+import httpx
+from src.config import LLM_CASSETTE_PATH, LLM_CASSETTE_MODE
+
+CASSETTE_VERSION = 1
+
+# Cabeceras de la respuesta que se conservan al grabar
+KEPT_HEADERS = ("content-type", "openai-model", "openai-processing-ms", "x-request-id")
+
+
+class CassetteMissError(LookupError):
+    """
+    La petición no está en el cassette y el modo no permite grabarla
+    """
+
+
+def request_key(method, path, body, content_type=""):
+    """
+    Calcular la clave de una petición
+
+    Args:
+        method (str): Método HTTP
+        path (str): Ruta de la URL
+        body (bytes): Cuerpo de la petición
+        content_type (str): Cabecera Content-Type
+
+    Returns:
+        str: Hash SHA-256 del método, la ruta y el cuerpo normalizado
+    """
+    if "application/json" in content_type:
+        body = json.dumps(json.loads(body or b"{}"), sort_keys=True, ensure_ascii=False).encode()
+    elif "boundary=" in content_type:
+        boundary = content_type.split("boundary=", 1)[1].strip('"').encode()
+        body = body.replace(boundary, b"boundary")
+    digest = hashlib.sha256(f"{method} {path}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class Cassette:
+    """
+    Interacciones grabadas, agrupadas por clave de petición
+    """
+
+    def __init__(self, path=None):
+        """
+        Inicializar el cassette, cargándolo si el fichero existe
+
+        Args:
+            path (str, optional): Fichero JSON del cassette
+        """
+        self.path = path
+        self.interactions = []
+        self._by_key = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self.interactions)
+
+    def load(self):
+        """Cargar las interacciones del fichero"""
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        with self._lock:
+            self.interactions = []
+            self._by_key = {}
+            self._positions = {}
+        for interaction in data.get("interactions", []):
+            self.add(interaction)
+
+    def save(self, path=None):
+        """
+        Guardar las interacciones en el fichero
+
+        Args:
+            path (str, optional): Fichero de destino (por defecto el del cassette)
+        """
+        path = path or self.path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._lock:
+            data = {"version": CASSETTE_VERSION, "interactions": list(self.interactions)}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+
+    def add(self, interaction):
+        """
+        Añadir una interacción grabada
+
+        Args:
+            interaction (dict): key, method, path, status, headers, body,
+                encoding, elapsed y ttfb
+        """
+        with self._lock:
+            self.interactions.append(interaction)
+            self._by_key.setdefault(interaction["key"], []).append(interaction)
+
+    def has(self, key):
+        """Indicar si hay alguna interacción con esta clave"""
+        with self._lock:
+            return key in self._by_key
+
+    def next(self, key):
+        """
+        Obtener la siguiente interacción grabada para una clave
+
+        Las peticiones idénticas se responden en el orden en que se grabaron y,
+        agotadas, se vuelve a empezar.
+
+        Args:
+            key (str): Clave de la petición
+
+        Returns:
+            dict: Interacción
+
+        Raises:
+            CassetteMissError: Si la clave no está en el cassette
+        """
+        with self._lock:
+            entries = self._by_key.get(key)
+            if not entries:
+                raise CassetteMissError(f"Petición no grabada en el cassette: {key[:12]}")
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+            return entries[position % len(entries)]
+
+    def rewind(self):
+        """Volver a reproducir las interacciones desde el principio"""
+        with self._lock:
+            self._positions = {}
+
+
+class _ReplayStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """
+    Cuerpo reproducido con la latencia grabada
+
+    Espera el tiempo hasta el primer byte y reparte el resto entre los eventos
+    SSE, para que el streaming conserve su ritmo.
+    """
+
+    def __init__(self, body, first_delay, rest_delay, events=False):
+        self._chunks = [part + b"\n\n" for part in body.split(b"\n\n") if part] if events else []
+        self._chunks = self._chunks or [body]
+        self._first_delay = first_delay
+        self._step = rest_delay / max(1, len(self._chunks) - 1)
+
+    def __iter__(self):
+        for i, chunk in enumerate(self._chunks):
+            time.sleep(self._first_delay if i == 0 else self._step)
+            yield chunk
+
+    async def __aiter__(self):
+        for i, chunk in enumerate(self._chunks):
+            await asyncio.sleep(self._first_delay if i == 0 else self._step)
+            yield chunk
+
+
+class CassetteTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Transporte httpx que graba o reproduce las peticiones en un cassette
+    """
+
+    def __init__(self, cassette, mode="replay", latency=None, latency_scale=1.0, jitter=0.0, seed=0,
+                 transport=None, async_transport=None):
+        """
+        Inicializar el transporte
+
+        Args:
+            cassette (Cassette | str): Cassette o ruta de su fichero
+            mode (str): "record", "replay" o "auto"
+            latency (float, optional): Latencia fija por petición al reproducir
+                (por defecto, la grabada)
+            latency_scale (float): Factor sobre la latencia reproducida (0 = sin esperas)
+            jitter (float): Variación relativa de la latencia (0.2 = ±20 %)
+            seed (int): Semilla de la variación
+            transport (httpx.BaseTransport, optional): Transporte real para grabar
+            async_transport (httpx.AsyncBaseTransport, optional): Transporte real
+                asíncrono para grabar
+        """
+        if mode not in ("record", "replay", "auto"):
+            raise ValueError(f"Modo de cassette desconocido: {mode}")
+        self.cassette = cassette if isinstance(cassette, Cassette) else Cassette(cassette)
+        self.mode = mode
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._transport = transport
+        self._async_transport = async_transport
+        self.hits = 0
+        self.recorded = 0
+
+    def _key(self, request, body):
+        return request_key(request.method, request.url.path, body, request.headers.get("content-type", ""))
+
+    def _should_record(self, key):
+        return self.mode == "record" or (self.mode == "auto" and not self.cassette.has(key))
+
+    def _replay(self, key, request):
+        """Construir la respuesta grabada con la latencia que corresponda"""
+        interaction = self.cassette.next(key)
+        self.hits += 1
+        elapsed, ttfb = interaction["elapsed"], interaction.get("ttfb", interaction["elapsed"])
+        if self.latency is not None:
+            scale = self.latency / elapsed if elapsed else 0.0
+        else:
+            scale = self.latency_scale
+        with self._rng_lock:
+            scale *= 1 + self._rng.uniform(-self.jitter, self.jitter)
+        if interaction["encoding"] == "base64":
+            body = base64.b64decode(interaction["body"])
+        else:
+            body = interaction["body"].encode("utf-8")
+        return httpx.Response(
+            interaction["status"],
+            headers=interaction["headers"],
+            stream=_ReplayStream(body, ttfb * scale, (elapsed - ttfb) * scale,
+                                 events="text/event-stream" in interaction["headers"].get("content-type", "")),
+            request=request
+        )
+
+    def _record(self, key, request, response, body, elapsed, ttfb):
+        """Guardar una respuesta real y devolver una copia ya leída"""
+        try:
+            text, encoding = body.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            text, encoding = base64.b64encode(body).decode("ascii"), "base64"
+        headers = {name: value for name, value in response.headers.items() if name.lower() in KEPT_HEADERS}
+        self.cassette.add({
+            "key": key,
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "headers": headers,
+            "body": text,
+            "encoding": encoding,
+            "elapsed": round(elapsed, 4),
+            "ttfb": round(ttfb, 4),
+        })
+        self.recorded += 1
+        return httpx.Response(response.status_code, headers=headers, content=body, request=request)
+
+    def handle_request(self, request):
+        key = self._key(request, request.read())
+        if not self._should_record(key):
+            return self._replay(key, request)
+        if self._transport is None:
+            self._transport = httpx.HTTPTransport()
+        start = time.perf_counter()
+        response = self._transport.handle_request(request)
+        chunks, ttfb = [], None
+        try:
+            # iter_bytes deshace la compresión; la respuesta se guarda sin Content-Encoding
+            for chunk in response.iter_bytes():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+                chunks.append(chunk)
+        finally:
+            response.close()
+        elapsed = time.perf_counter() - start
+        return self._record(key, request, response, b"".join(chunks), elapsed, ttfb or elapsed)
+
+    async def handle_async_request(self, request):
+        key = self._key(request, await request.aread())
+        if not self._should_record(key):
+            return self._replay(key, request)
+        if self._async_transport is None:
+            self._async_transport = httpx.AsyncHTTPTransport()
+        start = time.perf_counter()
+        response = await self._async_transport.handle_async_request(request)
+        chunks, ttfb = [], None
+        try:
+            async for chunk in response.aiter_bytes():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+                chunks.append(chunk)
+        finally:
+            await response.aclose()
+        elapsed = time.perf_counter() - start
+        return self._record(key, request, response, b"".join(chunks), elapsed, ttfb or elapsed)
+
+    def close(self):
+        # El transporte real se vuelve a crear si el cassette se sigue usando
+        transport, self._transport = self._transport, None
+        if transport is not None:
+            transport.close()
+
+    async def aclose(self):
+        transport, self._async_transport = self._async_transport, None
+        if transport is not None:
+            await transport.aclose()
+
+
+_config_transport = None
+_config_lock = threading.Lock()
+
+
+def get_config_transport():
+    """
+    Obtener el transporte del cassette configurado con LLM_CASSETTE_PATH
+
+    Al grabar, el cassette se guarda al terminar el proceso.
+
+    Returns:
+        CassetteTransport: Transporte compartido, o None si no hay cassette configurado
+    """
+    global _config_transport
+    if not LLM_CASSETTE_PATH:
+        return None
+    with _config_lock:
+        if _config_transport is None:
+            cassette = Cassette() if LLM_CASSETTE_MODE == "record" else Cassette(LLM_CASSETTE_PATH)
+            cassette.path = LLM_CASSETTE_PATH
+            _config_transport = CassetteTransport(cassette, LLM_CASSETTE_MODE)
+            if LLM_CASSETTE_MODE != "replay":
+                atexit.register(lambda: _config_transport.recorded and cassette.save())
+        return _config_transport
+
+
+@contextmanager
+def use_cassette(path, mode="replay", **options):
+    """
+    Grabar o reproducir todas las peticiones a OpenAI dentro del bloque
+
+    Instala un CassetteTransport en el transporte compartido y, al salir,
+    guarda lo grabado y vuelve al transporte por defecto.
+
+    Args:
+        path (str): Fichero JSON del cassette
+        mode (str): "record", "replay" o "auto"
+        **options: Argumentos de CassetteTransport (latency, latency_scale,
+            jitter, seed, transport)
+
+    Yields:
+        CassetteTransport: Transporte instalado
+    """
+    from src.llm.transport import configure_http_transport
+    # Al grabar se empieza un cassette nuevo aunque el fichero exista
+    cassette = Cassette() if mode == "record" else Cassette(path)
+    cassette.path = path
+    transport = CassetteTransport(cassette, mode, **options)
+    configure_http_transport(transport=transport, async_transport=transport)
+    try:
+        yield transport
+    finally:
+        if transport.recorded:
+            cassette.save()
+        configure_http_transport()
@@ -0,0 +1,119 @@
+"""
+Clientes de OpenAI y LangChain creados en el primer uso
+
+Importar el paquete no construye ningún cliente ni importa LangChain ni el SDK
+de OpenAI: los módulos exponen objetos LazyClient que crean el cliente real la
+primera vez que se accede a uno de sus atributos. Así las pruebas, las CLI y
+las recargas de Streamlit no pagan ese coste si no llaman al modelo.
+
+Todos los clientes comparten el transporte HTTP de src.llm.transport.
+"""
+import threading
+from src.config import OPENAI_API_KEY, OPENAI_BASE_URL, LLM_MODEL_NAME
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _get_client(key, factory):
+    """Obtener un cliente compartido, creándolo con `factory` la primera vez"""
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = factory()
+        return client
+
+
+def get_chat_model(temperature, model_name=LLM_MODEL_NAME, base_url=OPENAI_BASE_URL):
+    """
+    Obtener el modelo de chat compartido para una temperatura
+
+    Args:
+        temperature (float): Temperatura del modelo
+        model_name (str): Nombre del modelo
+        base_url (str, optional): URL de la API (vacío = api.openai.com)
+
+    Returns:
+        ChatOpenAI: Modelo de chat
+    """
+    def factory():
+        from langchain_openai import ChatOpenAI
+        from src.llm.transport import get_http_client, get_async_http_client
+        return ChatOpenAI(
+            openai_api_key=OPENAI_API_KEY,
+            openai_api_base=base_url or None,
+            model_name=model_name,
+            temperature=temperature,
+            http_client=get_http_client(),
+            http_async_client=get_async_http_client(),
+            max_retries=0  # Los reintentos los gestiona src.llm.policy
+        )
+    return _get_client(("chat", model_name, temperature, base_url), factory)
+
+
+def get_openai_client(base_url=OPENAI_BASE_URL):
+    """
+    Obtener el cliente compartido del SDK de OpenAI
+
+    Args:
+        base_url (str, optional): URL de la API (vacío = api.openai.com)
+
+    Returns:
+        OpenAI: Cliente de OpenAI
+    """
+    def factory():
+        from openai import OpenAI
+        from src.llm.transport import get_http_client
+        return OpenAI(api_key=OPENAI_API_KEY, base_url=base_url or None, http_client=get_http_client(), max_retries=0)
+    return _get_client(("openai", base_url), factory)
+
+
+def reset_clients():
+    """Descartar los clientes creados para que se construyan de nuevo en el próximo uso"""
+    with _clients_lock:
+        _clients.clear()
+
+
+def make_messages(system_prompt, user_prompt):
+    """
+    Crear los mensajes de sistema y de usuario para un modelo de chat
+
+    Args:
+        system_prompt (str): Instrucciones del sistema
+        user_prompt (str): Mensaje del usuario
+
+    Returns:
+        list: [SystemMessage, HumanMessage]
+    """
+    from langchain_core.messages import HumanMessage, SystemMessage
+    return [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)]
+
+
+class LazyClient:
+    """
+    Representante de un cliente que se crea en el primer acceso a sus atributos
+    """
+
+    def __init__(self, factory, *args):
+        """
+        Inicializar el representante
+
+        Args:
+            factory (callable): Función que devuelve el cliente
+            *args: Argumentos para la función
+        """
+        self._factory = factory
+        self._args = args
+
+    def get(self):
+        """Obtener el cliente real"""
+        return self._factory(*self._args)
+
+    def __getattr__(self, name):
+        # Los atributos privados (inspección, copia, mocks) no crean el cliente
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __repr__(self):
+        return f"LazyClient({self._factory.__name__}{self._args})"
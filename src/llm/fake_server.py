@@ -0,0 +1,364 @@
+"""
+Servidor local compatible con la API de OpenAI para pruebas y benchmarks
+
+Responde a /v1/chat/completions (JSON, streaming SSE y llamadas a funciones
+de la salida estructurada) y a /v1/audio/transcriptions con respuestas
+deterministas, e inyecta la latencia indicada: tiempo hasta el primer byte,
+espera entre fragmentos del streaming, bloqueos ocasionales y errores 503.
+
+El tipo de cada llamada (intención, extracción, respuesta, análisis, resumen
+o transcripción) se deduce de la petición, y su contenido sale de `replies` o
+de una función `responder(kind, payload)` propia.
+
+Uso:
+    python -m src.llm.fake_server --port 8089 --latency 0.3 --token-delay 0.02
+
+y después OPENAI_BASE_URL=http://127.0.0.1:8089/v1 para la aplicación.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+
+# Contenido por defecto de cada tipo de llamada
+DEFAULT_REPLIES = {
+    "intent": "INQUIRY",
+    "extraction": "{}",
+    "response": "Gracias por tu mensaje. ¿Podrías contarme un poco más sobre tu empresa y lo que necesitáis?",
+    "summary": "El lead ha contactado con ATOM para informarse sobre sus servicios.",
+    "analysis": {
+        "intent": "INQUIRY",
+        "lead_info": {},
+        "reply": "Gracias por tu mensaje. ¿Podrías contarme un poco más sobre tu empresa?",
+    },
+    "transcription": "Hola, quería información sobre vuestros servicios.",
+}
+
+# Frases de los prompts del sistema que identifican cada tipo de llamada
+KIND_MARKERS = (
+    ("intent", "detección de intenciones"),
+    ("extraction", "extraer información relevante de leads"),
+    ("summary", "resume conversaciones"),
+)
+
+
+def request_kind(path, payload):
+    """
+    Deducir el tipo de llamada de una petición
+
+    Args:
+        path (str): Ruta de la petición
+        payload (dict): Cuerpo de la petición
+
+    Returns:
+        str: intent, extraction, summary, analysis, response o transcription
+    """
+    if path.endswith("/audio/transcriptions"):
+        return "transcription"
+    if payload.get("tools"):
+        return "analysis"
+    system = " ".join(
+        m.get("content") or "" for m in payload.get("messages", []) if m.get("role") == "system"
+    )
+    for kind, marker in KIND_MARKERS:
+        if marker in system:
+            return kind
+    return "response"
+
+
+class FakeOpenAIServer:
+    """
+    Servidor local con la forma de la API de OpenAI en un hilo en segundo plano
+    """
+
+    def __init__(self, latency=0.0, token_delay=0.0, jitter=0.0, stall_rate=0.0, stall_latency=2.0,
+                 error_rate=0.0, replies=None, responder=None, seed=0, host="127.0.0.1", port=0):
+        """
+        Inicializar el servidor
+
+        Args:
+            latency (float): Segundos hasta la respuesta (o hasta el primer fragmento)
+            token_delay (float): Segundos entre fragmentos de una respuesta en streaming
+            jitter (float): Variación relativa de la latencia (0.2 = ±20 %)
+            stall_rate (float): Proporción de peticiones que se bloquean
+            stall_latency (float): Duración de un bloqueo (s)
+            error_rate (float): Proporción de peticiones que devuelven 503
+            replies (dict, optional): Contenido por tipo de llamada
+            responder (callable, optional): Función (kind, payload) -> contenido,
+                o None para usar `replies`
+            seed (int): Semilla de la latencia y los errores inyectados
+            host (str): Dirección en la que escuchar
+            port (int): Puerto (0 = uno libre)
+        """
+        self.latency = latency
+        self.token_delay = token_delay
+        self.jitter = jitter
+        self.stall_rate = stall_rate
+        self.stall_latency = stall_latency
+        self.error_rate = error_rate
+        self.replies = {**DEFAULT_REPLIES, **(replies or {})}
+        self.responder = responder
+        self.host = host
+        self.port = port
+        self._seed = seed
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = None
+        self.reset_stats()
+
+    @property
+    def base_url(self):
+        """URL base para los clientes de OpenAI"""
+        return f"http://{self.host}:{self.port}/v1"
+
+    def start(self):
+        """
+        Arrancar el servidor
+
+        Returns:
+            str: URL base
+        """
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        self.port = self._httpd.server_port
+        threading.Thread(target=self._httpd.serve_forever, name="fake-openai", daemon=True).start()
+        return self.base_url
+
+    def stop(self):
+        """Detener el servidor y cerrar su socket"""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_stats(self):
+        """Poner a cero los contadores y reiniciar la semilla"""
+        with self._lock:
+            self.requests = 0
+            self.connections = 0
+            self.errors = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.kinds = {}
+            self._rng.seed(self._seed)
+
+    def stats(self):
+        """
+        Obtener los contadores del servidor
+
+        Returns:
+            dict: Peticiones, conexiones, errores inyectados, tokens estimados
+                de entrada y de salida y peticiones por tipo
+        """
+        with self._lock:
+            return {"requests": self.requests, "connections": self.connections, "errors": self.errors,
+                    "prompt_tokens": self.prompt_tokens, "completion_tokens": self.completion_tokens,
+                    "kinds": dict(self.kinds)}
+
+    def transport(self):
+        """
+        Obtener un transporte httpx que envía cualquier petición a este servidor
+
+        Sirve para dirigir al servidor a clientes ya configurados con la URL de
+        la API real (configure_http_transport(transport=server.transport())).
+
+        Returns:
+            httpx.BaseTransport: Transporte
+        """
+        return _RedirectTransport(self)
+
+    def _count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+    def _count_tokens(self, usage):
+        with self._lock:
+            self.prompt_tokens += usage["prompt_tokens"]
+            self.completion_tokens += usage["completion_tokens"]
+
+    def _plan(self, kind):
+        """Decidir la latencia de una petición y si falla"""
+        with self._lock:
+            self.requests += 1
+            self.kinds[kind] = self.kinds.get(kind, 0) + 1
+            draw = self._rng.random()
+            scale = 1 + self._rng.uniform(-self.jitter, self.jitter)
+            if draw < self.error_rate:
+                self.errors += 1
+                return 0.0, True
+        if draw < self.error_rate + self.stall_rate:
+            return self.stall_latency, False
+        return self.latency * scale, False
+
+    def _content(self, kind, payload):
+        """Contenido de la respuesta para un tipo de llamada"""
+        if self.responder is not None:
+            content = self.responder(kind, payload)
+            if content is not None:
+                return content
+        return self.replies[kind]
+
+
+class _RedirectTransport(httpx.HTTPTransport):
+    """Transporte que cambia el destino de cada petición al servidor local"""
+
+    def __init__(self, server):
+        super().__init__()
+        self._server = server
+
+    def handle_request(self, request):
+        request.url = request.url.copy_with(scheme="http", host=self._server.host, port=self._server.port)
+        return super().handle_request(request)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Manejador de peticiones del servidor falso"""
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.fake._count_connection()
+
+    def do_POST(self):
+        fake = self.server.fake
+        body = self._read_body()
+        if self.path.endswith("/audio/transcriptions"):
+            payload = {"file_size": len(body)}
+        else:
+            payload = json.loads(body or b"{}")
+        kind = request_kind(self.path, payload)
+        delay, error = fake._plan(kind)
+        if error:
+            self._send_json(503, {"error": {"message": "Servicio no disponible", "type": "server_error"}})
+            return
+        time.sleep(delay)
+
+        content = fake._content(kind, payload)
+        if kind == "transcription":
+            self._send_json(200, {"text": content})
+        elif payload.get("stream"):
+            self._send_stream(payload, content, fake.token_delay)
+        else:
+            completion = self._completion(payload, kind, content)
+            fake._count_tokens(completion["usage"])
+            self._send_json(200, completion)
+
+    def _read_body(self):
+        """Leer el cuerpo de la petición, con Content-Length o por fragmentos"""
+        if "chunked" in self.headers.get("Transfer-Encoding", ""):
+            parts = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return b"".join(parts)
+                parts.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    @staticmethod
+    def _completion(payload, kind, content):
+        """Cuerpo de una respuesta de chat completa"""
+        if kind == "analysis":
+            tool = payload["tools"][0]["function"]["name"]
+            message = {"role": "assistant", "content": None, "tool_calls": [{
+                "id": "call_fake", "type": "function",
+                "function": {"name": tool, "arguments": json.dumps(content, ensure_ascii=False)},
+            }]}
+        else:
+            message = {"role": "assistant", "content": content}
+        # Tokens estimados con la aproximación habitual de 4 caracteres por token
+        prompt_tokens = sum(len(m.get("content") or "") for m in payload.get("messages", [])) // 4 + 1
+        completion_tokens = len(json.dumps(content, ensure_ascii=False) if kind == "analysis" else content) // 4 + 1
+        return {
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": 0,
+            "model": payload.get("model", "fake"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": message}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    def _send_json(self, status, payload):
+        self._send(status, "application/json", json.dumps(payload).encode())
+
+    def _send_stream(self, payload, content, token_delay):
+        """Enviar la respuesta palabra a palabra como eventos SSE"""
+        def event(delta, finish_reason=None):
+            chunk = {
+                "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": 0,
+                "model": payload.get("model", "fake"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(chunk)}\n\n".encode()
+
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            words = re.findall(r"\S+\s*", content)
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(token_delay)
+                self._write_chunk(event({"role": "assistant", "content": word} if i == 0 else {"content": word}))
+            self._write_chunk(event({}, "stop"))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    def _send(self, status, content_type, body):
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente ya cerró la conexión al agotar el tiempo del intento
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    """Arrancar el servidor falso desde la línea de comandos"""
+    parser = argparse.ArgumentParser(description="Servidor local compatible con la API de OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos hasta la respuesta")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Segundos entre fragmentos en streaming")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Variación relativa de la latencia")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="Proporción de peticiones bloqueadas")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Proporción de respuestas 503")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(latency=args.latency, token_delay=args.token_delay, jitter=args.jitter,
+                              stall_rate=args.stall_rate, error_rate=args.error_rate,
+                              host=args.host, port=args.port)
+    print(f"Servidor compatible con OpenAI en {server.start()} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
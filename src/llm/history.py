@@ -0,0 +1,233 @@
+"""
+Historial de conversación con presupuesto de tokens
+
+Mantiene el historial ya formateado mensaje a mensaje, con el número de tokens
+de cada línea, para no reconstruirlo en cada turno. El historial que se envía
+al LLM nunca supera el presupuesto: los mensajes antiguos se sustituyen por un
+resumen acumulado que el LLM genera en segundo plano, fuera del camino
+crítico del turno. Mientras el resumen no está listo, los mensajes más
+antiguos que no caben simplemente se omiten.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.config import (
+    LLM_MODEL_NAME,
+    LLM_HISTORY_MAX_TOKENS,
+    LLM_HISTORY_KEEP_MESSAGES,
+    LLM_HISTORY_SUMMARY
+)
+
+# Prefijo del resumen de los mensajes antiguos dentro del historial
+SUMMARY_PREFIX = "Resumen de la conversación anterior: "
+
+# Hilos compartidos por todos los historiales para generar los resúmenes
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """
+    Cargar el tokenizador de tiktoken para el modelo configurado
+
+    tiktoken descarga las tablas de codificación la primera vez; sin conexión
+    se devuelve False y los tokens se estiman a partir de los caracteres.
+    """
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                try:
+                    _encoding = tiktoken.encoding_for_model(LLM_MODEL_NAME)
+                except KeyError:
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                print(f"Error al cargar el tokenizador, se estimarán los tokens: {e}")
+                _encoding = False
+        return _encoding
+
+
+def count_tokens(text):
+    """
+    Contar los tokens de un texto
+
+    Args:
+        text (str): Texto a medir
+
+    Returns:
+        int: Número de tokens (estimado en 4 caracteres por token sin tiktoken)
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def format_message(sender, content):
+    """Formatear un mensaje como línea del historial"""
+    return f"{'Agente' if sender == 'agent' else 'Lead'}: {content}"
+
+
+class ConversationHistory:
+    """
+    Historial de conversación formateado de forma incremental y limitado en tokens
+    """
+
+    def __init__(self, max_tokens=LLM_HISTORY_MAX_TOKENS, keep_messages=LLM_HISTORY_KEEP_MESSAGES,
+                 summarize=LLM_HISTORY_SUMMARY, summarizer=None):
+        """
+        Inicializar el historial
+
+        Args:
+            max_tokens (int): Tokens máximos del historial formateado (0 = sin límite)
+            keep_messages (int): Mensajes recientes que nunca se resumen
+            summarize (bool): Resumir los mensajes antiguos con el LLM
+            summarizer (callable, optional): Función (resumen, transcripción, palabras) -> resumen
+                (por defecto, summarize_history del modelo)
+        """
+        self.max_tokens = max_tokens
+        self.keep_messages = keep_messages
+        self.summarize = summarize
+        self._summarizer = summarizer
+        self._lock = threading.Lock()
+        self._lines = []
+        self._summary = ""
+        self._summary_tokens = 0
+        self._pending = None
+        self._generation = 0
+        self.summaries = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._lines)
+
+    @property
+    def summary(self):
+        """Resumen actual de los mensajes antiguos"""
+        with self._lock:
+            return self._summary
+
+    def append(self, sender, content):
+        """
+        Agregar un mensaje al historial
+
+        Args:
+            sender (str): Remitente del mensaje ('agent' o 'lead')
+            content (str): Contenido del mensaje
+        """
+        line = format_message(sender, content)
+        tokens = count_tokens(line) + 1  # Salto de línea
+        with self._lock:
+            self._lines.append((line, tokens))
+            self._schedule_summary()
+
+    def extend(self, messages):
+        """
+        Agregar varios mensajes con el formato del historial del agente
+
+        Args:
+            messages (list): Diccionarios con 'sender' y 'content'
+        """
+        for message in messages:
+            self.append(message["sender"], message["content"])
+
+    def clear(self):
+        """Vaciar el historial y descartar los resúmenes en curso"""
+        with self._lock:
+            self._lines = []
+            self._summary = ""
+            self._summary_tokens = 0
+            self._pending = None
+            self._generation += 1
+
+    def wait(self, timeout=None):
+        """
+        Esperar a que terminen los resúmenes en curso, si los hay
+
+        Args:
+            timeout (float, optional): Segundos máximos de espera por resumen
+        """
+        while True:
+            with self._lock:
+                pending = self._pending
+            if pending is None:
+                return
+            pending.exception(timeout)
+            with self._lock:
+                # Un resumen fallido o descartado no vuelve a lanzarse hasta el siguiente mensaje
+                if self._pending is pending:
+                    return
+
+    def format(self):
+        """
+        Obtener el historial formateado para el prompt
+
+        Returns:
+            str: Resumen de los mensajes antiguos seguido de los mensajes más
+                recientes que caben en el presupuesto
+        """
+        with self._lock:
+            if not self.max_tokens:
+                selected = [line for line, _ in self._lines]
+            else:
+                available = self.max_tokens - self._summary_tokens
+                selected = []
+                for line, tokens in reversed(self._lines):
+                    # El último mensaje se incluye siempre
+                    if selected and tokens > available:
+                        break
+                    selected.append(line)
+                    available -= tokens
+                selected.reverse()
+            if self._summary:
+                selected.insert(0, SUMMARY_PREFIX + self._summary)
+        return "\n".join(selected)
+
+    @property
+    def tokens(self):
+        """Tokens del historial formateado que se enviaría al LLM"""
+        return count_tokens(self.format())
+
+    def _schedule_summary(self):
+        """Lanzar un resumen en segundo plano si el historial supera el presupuesto"""
+        if not self.summarize or not self.max_tokens or self._pending is not None:
+            return
+        total = self._summary_tokens + sum(tokens for _, tokens in self._lines)
+        count = len(self._lines) - self.keep_messages
+        if total <= self.max_tokens or count <= 0:
+            return
+
+        transcript = "\n".join(line for line, _ in self._lines[:count])
+        self._pending = _summary_executor.submit(
+            self._summarize, self._generation, self._summary, transcript, count
+        )
+
+    def _summarize(self, generation, summary, transcript, count):
+        """Generar el resumen y sustituir con él los mensajes resumidos"""
+        summarizer = self._summarizer
+        if summarizer is None:
+            from src.llm.model import summarize_history
+            summarizer = summarize_history
+
+        # El resumen ocupa como mucho un tercio del presupuesto (unas 0,75 palabras por token)
+        max_words = max(30, self.max_tokens // 4)
+        try:
+            new_summary = summarizer(summary, transcript, max_words).strip()
+        except Exception as e:
+            print(f"Error al resumir el historial: {e}")
+            new_summary = None
+
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._pending = None
+            if new_summary:
+                del self._lines[:count]
+                self._summary = new_summary
+                self._summary_tokens = count_tokens(SUMMARY_PREFIX + new_summary) + 1
+                self.summaries += 1
+                self._schedule_summary()
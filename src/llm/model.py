@@ -1,16 +1,59 @@
 import json
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, SystemMessage
-from src.config import OPENAI_API_KEY, LLM_MODEL_NAME, LLM_TEMPERATURE
-from src.llm.prompt_templates import SYSTEM_PROMPT, USER_PROMPT_TEMPLATE, ENTITY_EXTRACTION_PROMPT
-
-# Inicializar el modelo de lenguaje
-llm = ChatOpenAI(
-    openai_api_key=OPENAI_API_KEY,
-    model_name=LLM_MODEL_NAME,
-    temperature=LLM_TEMPERATURE
+import time
+from typing import Optional
+from pydantic import BaseModel, Field
+from src.config import LLM_TEMPERATURE
+from src.llm.cache import cached_invoke, get_response_cache
+from src.llm.clients import LazyClient, get_chat_model, make_messages
+from src.llm.policy import LLMCallError, call_timeout, invoke_with_policy, record_llm_usage, _api_errors
+from src.llm.history import ConversationHistory, count_tokens, format_message
+from src.monitoring import span, monitoring_enabled
+from src.llm.prompt_templates import (
+    SYSTEM_PROMPT,
+    USER_PROMPT_TEMPLATE,
+    ENTITY_EXTRACTION_PROMPT,
+    TURN_ANALYSIS_PROMPT,
+    HISTORY_SUMMARY_PROMPT,
+    BATCH_EXTRACTION_PROMPT
 )
 
+# Modelo de lenguaje (se crea en la primera llamada)
+llm = LazyClient(get_chat_model, LLM_TEMPERATURE)
+
+
+class LeadFields(BaseModel):
+    """Datos del lead mencionados en la entrada actual del usuario"""
+    name: Optional[str] = Field(None, description="Nombre de la persona")
+    company: Optional[str] = Field(None, description="Empresa")
+    email: Optional[str] = Field(None, description="Email de contacto")
+    phone: Optional[str] = Field(None, description="Teléfono de contacto")
+    needs: Optional[str] = Field(None, description="Necesidades o problemas")
+    budget: Optional[str] = Field(None, description="Presupuesto")
+    product_interest: Optional[str] = Field(None, description="Productos o servicios de interés")
+    timeline: Optional[str] = Field(None, description="Plazos")
+
+
+class TurnAnalysis(BaseModel):
+    """Intención, datos del lead y respuesta del agente para un turno"""
+    intent: str = Field(description="Identificador de la intención principal del usuario")
+    lead_info: LeadFields = Field(default_factory=LeadFields, description="Datos nuevos o actualizados del lead")
+    reply: str = Field(description="Respuesta del agente al usuario")
+
+
+def _format_user_prompt(user_input, conversation_history, lead_info):
+    """Formatear el prompt del usuario con el historial y la información del lead"""
+    if isinstance(conversation_history, ConversationHistory):
+        formatted_history = conversation_history.format()
+    else:
+        formatted_history = "\n".join([format_message(msg['sender'], msg['content']) for msg in conversation_history or []])
+    lead_info_str = json.dumps(lead_info, ensure_ascii=False) if lead_info else "{}"
+    
+    return USER_PROMPT_TEMPLATE.format(
+        conversation_history=formatted_history,
+        lead_info=lead_info_str,
+        user_input=user_input
+    )
+
 
 def generate_response(user_input, conversation_history=None, lead_info=None):
     """
@@ -18,7 +61,7 @@ def generate_response(user_input, conversation_history=None, lead_info=None):
     
     Args:
         user_input (str): Entrada del usuario
-        conversation_history (list): Historial de la conversación
+        conversation_history (list | ConversationHistory): Historial de la conversación
         lead_info (dict): Información conocida del lead
         
     Returns:
@@ -31,26 +74,124 @@ def generate_response(user_input, conversation_history=None, lead_info=None):
         lead_info = {}
     
     # Formatear el prompt con la información del lead y el historial de conversación
-    formatted_history = "\n".join([f"{'Agente' if msg['sender'] == 'agent' else 'Lead'}: {msg['content']}" for msg in conversation_history])
-    lead_info_str = json.dumps(lead_info, ensure_ascii=False) if lead_info else "{}"
-    
-    # Formatear el prompt del usuario
-    user_prompt = USER_PROMPT_TEMPLATE.format(
-        conversation_history=formatted_history,
-        lead_info=lead_info_str,
-        user_input=user_input
-    )
+    user_prompt = _format_user_prompt(user_input, conversation_history, lead_info)
     
     # Crear los mensajes para el LLM
-    messages = [
-        SystemMessage(content=SYSTEM_PROMPT),
-        HumanMessage(content=user_prompt)
-    ]
+    messages = make_messages(
+        SYSTEM_PROMPT,
+        user_prompt
+    )
     
     # Generar la respuesta
-    response = llm.invoke(messages)
+    return cached_invoke("response", llm, messages, user_input)
+
+
+def stream_response(user_input, conversation_history=None, lead_info=None):
+    """
+    Generar una respuesta usando el LLM, devolviéndola a medida que se genera
+    
+    Args:
+        user_input (str): Entrada del usuario
+        conversation_history (list | ConversationHistory): Historial de la conversación
+        lead_info (dict): Información conocida del lead
+        
+    Yields:
+        str: Fragmentos de la respuesta
+        
+    Raises:
+        LLMCallError: Si la API o el transporte fallan o se agota el plazo del turno
+    """
+    if conversation_history is None:
+        conversation_history = []
+    
+    messages = make_messages(
+        SYSTEM_PROMPT,
+        _format_user_prompt(user_input, conversation_history, lead_info)
+    )
+    
+    # Una respuesta en caché se devuelve de una vez
+    cache = get_response_cache()
+    key = cache.make_key("response", llm, messages, user_input) if cache.enabled("response") else None
+    if key:
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+    
+    # Una respuesta a medias no se puede reintentar ni duplicar: solo se limita su duración.
+    # Los fallos al abrir o leer el stream se notifican como LLMCallError, igual
+    # que en las llamadas con política, para que el agente use su respaldo
+    parts = []
+    last_chunk = None
+    with span("llm.response", stream=True) as stream_span:
+        start = time.perf_counter()
+        try:
+            for chunk in llm.stream(messages, timeout=call_timeout("response")):
+                # El plazo del turno limita toda la lectura, no solo la espera de cada fragmento
+                call_timeout("response")
+                last_chunk = chunk
+                if chunk.content:
+                    if not parts:
+                        stream_span.set(first_token=time.perf_counter() - start)
+                    parts.append(chunk.content)
+                    yield chunk.content
+        except _api_errors() as e:
+            raise LLMCallError("response", e) from e
+    
+    # Solo el último fragmento puede traer los tokens informados por la API
+    if monitoring_enabled():
+        record_llm_usage("response", messages, last_chunk, content="".join(parts))
     
-    return response.content
+    if key:
+        cache.set(key, "".join(parts))
+
+
+def analyze_turn(user_input, conversation_history=None, lead_info=None, intents=None):
+    """
+    Obtener intención, datos del lead y respuesta en una sola llamada al LLM
+    
+    Usa salida estructurada (function calling) validada contra TurnAnalysis.
+    
+    Args:
+        user_input (str): Entrada del usuario
+        conversation_history (list | ConversationHistory): Historial de la conversación
+        lead_info (dict): Información conocida del lead
+        intents (dict): Intenciones posibles (identificador -> descripción)
+        
+    Returns:
+        TurnAnalysis: Análisis del turno, o None si la llamada o la validación fallan
+    """
+    if conversation_history is None:
+        conversation_history = []
+    
+    if intents is None:
+        intents = {}
+    
+    messages = make_messages(
+        SYSTEM_PROMPT + TURN_ANALYSIS_PROMPT.format(
+            intents=json.dumps(intents, ensure_ascii=False, indent=2)
+        ),
+        _format_user_prompt(user_input, conversation_history, lead_info)
+    )
+    
+    try:
+        structured_llm = llm.with_structured_output(TurnAnalysis, method="function_calling", include_raw=True)
+        result = invoke_with_policy("analysis", structured_llm, messages)
+    except Exception as e:
+        print(f"Error en el análisis del turno: {e}")
+        return None
+    
+    analysis = result["parsed"]
+    if result["parsing_error"] is not None or analysis is None or not analysis.reply.strip():
+        print(f"Error al validar el análisis del turno: {result['parsing_error']}")
+        return None
+    
+    # Normalizar la intención a los identificadores conocidos
+    analysis.intent = analysis.intent.strip().upper()
+    if intents and analysis.intent not in intents:
+        analysis.intent = "IRRELEVANT"
+    
+    return analysis
 
 
 def extract_entities(user_input, existing_info=None):
@@ -86,24 +227,24 @@ def extract_entities(user_input, existing_info=None):
         """
     
     # Crear los mensajes para el LLM
-    messages = [
-        SystemMessage(content="Eres un asistente especializado en extraer información relevante de leads."),
-        HumanMessage(content=entity_prompt)
-    ]
+    messages = make_messages(
+        "Eres un asistente especializado en extraer información relevante de leads.",
+        entity_prompt
+    )
     
     # Generar la respuesta
-    response = llm.invoke(messages)
+    content = cached_invoke("extraction", llm, messages, user_input)
     
     try:
         # Intentar parsear la respuesta como JSON
-        extracted_info = json.loads(response.content)
+        extracted_info = json.loads(content)
         return extracted_info
     except json.JSONDecodeError:
         # Si falla, intentar extraer solo la parte JSON de la respuesta
         try:
             # Buscar contenido entre corchetes que parezca JSON
             import re
-            json_match = re.search(r'\{.*\}', response.content, re.DOTALL)
+            json_match = re.search(r'\{.*\}', content, re.DOTALL)
             if json_match:
                 extracted_info = json.loads(json_match.group(0))
                 return extracted_info
@@ -111,4 +252,91 @@ def extract_entities(user_input, existing_info=None):
             pass
         
         print("Error al parsear la respuesta JSON.")
-        return {}
\ No newline at end of file
+        return {}
+
+
+def summarize_history(summary, transcript, max_words=200):
+    """
+    Actualizar el resumen acumulado de la conversación con nuevos mensajes
+    
+    Args:
+        summary (str): Resumen anterior (vacío si no lo hay)
+        transcript (str): Mensajes a incorporar, ya formateados
+        max_words (int): Longitud máxima del resumen en palabras
+        
+    Returns:
+        str: Resumen actualizado
+    """
+    prompt = HISTORY_SUMMARY_PROMPT.format(
+        summary=summary or "(ninguno)",
+        transcript=transcript,
+        max_words=max_words
+    )
+    messages = make_messages(
+        "Eres un asistente que resume conversaciones de ventas de forma fiel y concisa.",
+        prompt
+    )
+    return invoke_with_policy("summary", llm, messages).content
+
+
+def format_conversations(conversations):
+    """
+    Formatear los mensajes del lead de varias conversaciones para el prompt por lotes
+    
+    Args:
+        conversations (dict): ID de conversación -> lista de textos del lead
+        
+    Returns:
+        str: Conversaciones formateadas
+    """
+    return "\n\n".join(
+        f"## Conversación {conversation_id}\n" + "\n".join(f"- {text}" for text in texts)
+        for conversation_id, texts in conversations.items()
+    )
+
+
+def extract_entities_batch(conversations):
+    """
+    Extraer los datos de los leads de varias conversaciones en una sola llamada al LLM
+    
+    Args:
+        conversations (dict): ID de conversación -> lista de textos del lead
+        
+    Returns:
+        tuple: (dict ID de conversación -> entidades extraídas, dict con los
+            tokens de entrada y de salida de la llamada)
+        
+    Raises:
+        LLMCallError: Si la llamada falla tras aplicar su política
+    """
+    messages = make_messages(
+        "Eres un asistente especializado en extraer información relevante de leads.",
+        BATCH_EXTRACTION_PROMPT.format(conversations=format_conversations(conversations))
+    )
+    response = invoke_with_policy("extraction", llm, messages)
+    
+    # Tokens informados por la API o, si no los hay, estimados
+    usage = getattr(response, "usage_metadata", None) or {}
+    tokens = {
+        "prompt_tokens": usage.get("input_tokens") or sum(count_tokens(m.content) for m in messages),
+        "completion_tokens": usage.get("output_tokens") or count_tokens(response.content),
+    }
+    
+    try:
+        extracted = json.loads(response.content)
+    except json.JSONDecodeError:
+        import re
+        json_match = re.search(r'\{.*\}', response.content, re.DOTALL)
+        try:
+            extracted = json.loads(json_match.group(0)) if json_match else {}
+        except json.JSONDecodeError:
+            extracted = {}
+    if not isinstance(extracted, dict):
+        extracted = {}
+    
+    results = {}
+    for conversation_id in conversations:
+        info = extracted.get(str(conversation_id))
+        if isinstance(info, dict):
+            results[conversation_id] = info
+    return results, tokens
@@ -0,0 +1,407 @@
+"""
+Políticas de llamada al LLM: tiempos máximos, reintentos y peticiones duplicadas
+
+Cada tipo de llamada ("response", "extraction", "intent", "analysis",
+"summary", "transcription") tiene una política con:
+
+- un tiempo máximo por intento, recortado al tiempo que le queda al turno
+  (turn_deadline fija ese plazo en una variable de contexto, que se propaga a
+  los hilos de las etapas del agente);
+- reintentos con espera exponencial acotada (tenacity) solo ante errores
+  recuperables: tiempos agotados, errores de conexión, 429 y 5xx;
+- opcionalmente, una petición duplicada si la primera tarda más que el
+  percentil LLM_HEDGE_QUANTILE de las latencias recientes; se usa la primera
+  respuesta que llegue.
+
+Los errores de la API que persisten tras los reintentos se elevan como
+LLMCallError; cualquier otra excepción (errores de programación) se propaga
+sin cambios.
+"""
+import contextvars
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+from src.config import (
+    LLM_MODEL_NAME,
+    LLM_INTENT_TIMEOUT,
+    LLM_EXTRACTION_TIMEOUT,
+    LLM_RESPONSE_TIMEOUT,
+    LLM_RETRY_ATTEMPTS,
+    LLM_RETRY_BACKOFF,
+    LLM_RETRY_MAX_BACKOFF,
+    LLM_HEDGE_CALLS,
+    LLM_HEDGE_QUANTILE,
+    LLM_HEDGE_MIN_DELAY
+)
+from src.llm.history import count_tokens
+from src.monitoring import span, record_usage, monitoring_enabled
+
+# Latencias recientes por tipo de llamada usadas para calcular el percentil
+LATENCY_WINDOW = 200
+
+# Muestras necesarias antes de empezar a duplicar peticiones
+HEDGE_MIN_SAMPLES = 20
+
+# Códigos HTTP que merece la pena reintentar
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+class LLMCallError(Exception):
+    """
+    Error de la API del LLM que persiste tras aplicar la política de la llamada
+    """
+
+    def __init__(self, call_type, error):
+        super().__init__(f"Llamada '{call_type}' fallida: {error}")
+        self.call_type = call_type
+        self.error = error
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    El turno no tiene tiempo para otro intento
+    """
+
+
+@dataclass(frozen=True)
+class CallPolicy:
+    """
+    Política de un tipo de llamada
+    """
+    timeout: float
+    max_attempts: int = LLM_RETRY_ATTEMPTS
+    backoff: float = LLM_RETRY_BACKOFF
+    max_backoff: float = LLM_RETRY_MAX_BACKOFF
+    hedge: bool = False
+    hedge_quantile: float = LLM_HEDGE_QUANTILE
+    hedge_min_delay: float = LLM_HEDGE_MIN_DELAY
+
+
+POLICIES = {
+    call_type: CallPolicy(timeout=timeout, hedge=call_type in LLM_HEDGE_CALLS)
+    for call_type, timeout in {
+        "response": LLM_RESPONSE_TIMEOUT,
+        "extraction": LLM_EXTRACTION_TIMEOUT,
+        "intent": LLM_INTENT_TIMEOUT,
+        "analysis": LLM_RESPONSE_TIMEOUT,
+        "summary": LLM_RESPONSE_TIMEOUT,
+        "transcription": LLM_RESPONSE_TIMEOUT,
+    }.items()
+}
+
+_deadline = contextvars.ContextVar("llm_turn_deadline", default=None)
+
+# Hilos para las peticiones duplicadas
+_hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+
+
+@contextmanager
+def turn_deadline(seconds):
+    """
+    Limitar el tiempo total de las llamadas al LLM dentro del bloque
+
+    Los plazos anidados nunca amplían el plazo exterior.
+
+    Args:
+        seconds (float): Segundos disponibles (0 o None = sin límite)
+    """
+    if not seconds:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time():
+    """
+    Obtener el tiempo que le queda al turno actual
+
+    Returns:
+        float: Segundos restantes, o None si no hay plazo
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def configure_call_policy(call_type, **changes):
+    """
+    Cambiar la política de un tipo de llamada
+
+    Args:
+        call_type (str): Tipo de llamada
+        **changes: Campos de CallPolicy a cambiar
+
+    Returns:
+        CallPolicy: Nueva política
+    """
+    POLICIES[call_type] = replace(POLICIES[call_type], **changes)
+    return POLICIES[call_type]
+
+
+def _api_errors():
+    """Excepciones que representan fallos de la API o del transporte"""
+    import httpx
+    import openai
+    return (openai.APIError, httpx.HTTPError, TimeoutError, ConnectionError)
+
+
+def is_retryable(error):
+    """
+    Indicar si un error merece otro intento
+
+    Args:
+        error (Exception): Error del intento
+
+    Returns:
+        bool: True para tiempos agotados, errores de conexión, 429 y 5xx
+    """
+    import httpx
+    import openai
+    if isinstance(error, DeadlineExceeded):
+        return False
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+    return isinstance(error, (openai.APIConnectionError, httpx.TransportError, TimeoutError, ConnectionError))
+
+
+class _CallStats:
+    """
+    Latencias y contadores de un tipo de llamada
+    """
+
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failures = 0
+
+    def quantile(self, q):
+        """Percentil q de las latencias recientes, o None si hay pocas muestras"""
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _call_stats(call_type):
+    with _stats_lock:
+        return _stats.setdefault(call_type, _CallStats())
+
+
+def _record(call_type, field, value=1):
+    stats = _call_stats(call_type)
+    with _stats_lock:
+        setattr(stats, field, getattr(stats, field) + value)
+
+
+def call_timeout(call_type):
+    """
+    Obtener el tiempo máximo del próximo intento de una llamada
+
+    Args:
+        call_type (str): Tipo de llamada
+
+    Returns:
+        float: Segundos según la política, recortados al plazo del turno
+
+    Raises:
+        DeadlineExceeded: Si el turno ya no tiene tiempo
+    """
+    policy = POLICIES[call_type]
+    remaining = remaining_time()
+    if remaining is None:
+        return policy.timeout
+    if remaining <= 0:
+        raise DeadlineExceeded("Se ha agotado el tiempo del turno")
+    return min(policy.timeout, remaining)
+
+
+def _timed_attempt(call_type, func, timeout):
+    """Ejecutar un intento y registrar su latencia si termina bien"""
+    start = time.monotonic()
+    result = func(timeout)
+    stats = _call_stats(call_type)
+    with _stats_lock:
+        stats.latencies.append(time.monotonic() - start)
+    return result
+
+
+def _hedged_attempt(call_type, policy, func, timeout):
+    """
+    Ejecutar un intento con una petición duplicada si la primera se retrasa
+    """
+    stats = _call_stats(call_type)
+    with _stats_lock:
+        delay = stats.quantile(policy.hedge_quantile)
+    if delay is None or delay >= timeout:
+        return _timed_attempt(call_type, func, timeout)
+    delay = max(delay, policy.hedge_min_delay)
+
+    start = time.monotonic()
+    primary = _hedge_executor.submit(contextvars.copy_context().run, _timed_attempt, call_type, func, timeout)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    _record(call_type, "hedges")
+    hedge = _hedge_executor.submit(
+        contextvars.copy_context().run, _timed_attempt, call_type, func, timeout - delay
+    )
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=max(0, timeout - (time.monotonic() - start)),
+                             return_when=FIRST_COMPLETED)
+        if not done:
+            raise TimeoutError(f"Llamada '{call_type}' sin respuesta en {timeout:.1f} s")
+        for future in done:
+            if future.exception() is None:
+                # La petición perdedora no se puede cancelar; su resultado se descarta
+                if future is hedge:
+                    _record(call_type, "hedge_wins")
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def call_with_policy(call_type, func):
+    """
+    Ejecutar una llamada aplicando la política de su tipo
+
+    Args:
+        call_type (str): Tipo de llamada
+        func (callable): Función que recibe el tiempo máximo del intento (s)
+            y realiza la petición
+
+    Returns:
+        Resultado de la función
+
+    Raises:
+        LLMCallError: Si la API falla en todos los intentos o se agota el plazo
+    """
+    policy = POLICIES[call_type]
+    _record(call_type, "calls")
+
+    def attempt():
+        _record(call_type, "attempts")
+        timeout = call_timeout(call_type)
+        if policy.hedge:
+            return _hedged_attempt(call_type, policy, func, timeout)
+        return _timed_attempt(call_type, func, timeout)
+
+    def stop_at_deadline(retry_state):
+        # No esperar para reintentar si el turno ya no tiene tiempo
+        remaining = remaining_time()
+        return remaining is not None and remaining <= (retry_state.upcoming_sleep or 0)
+
+    retrying = Retrying(
+        stop=stop_after_attempt(policy.max_attempts) | stop_at_deadline,
+        wait=wait_exponential_jitter(initial=policy.backoff, max=policy.max_backoff),
+        retry=retry_if_exception(is_retryable),
+        before_sleep=lambda retry_state: _record(call_type, "retries"),
+        reraise=True
+    )
+    with span(f"llm.{call_type}") as call_span:
+        try:
+            return retrying(attempt)
+        except _api_errors() as e:
+            _record(call_type, "failures")
+            raise LLMCallError(call_type, e) from e
+        finally:
+            call_span.set(attempts=retrying.statistics.get("attempt_number", 1))
+
+
+def invoke_with_policy(call_type, model, messages):
+    """
+    Invocar un modelo de chat aplicando la política de la llamada
+
+    Args:
+        call_type (str): Tipo de llamada
+        model: Modelo de chat (o runnable) con método invoke
+        messages (list): Mensajes para el modelo
+
+    Returns:
+        Respuesta del modelo
+    """
+    response = call_with_policy(call_type, lambda timeout: model.invoke(messages, timeout=timeout))
+    if monitoring_enabled():
+        record_llm_usage(call_type, messages, response)
+    return response
+
+
+def record_llm_usage(call_type, messages, response=None, content=None):
+    """
+    Registrar en la instrumentación los tokens y el coste de una llamada
+
+    Se usan los tokens informados por la API y, si no los hay (respuestas en
+    streaming o servidores que no los devuelven), se cuentan con tiktoken.
+
+    Args:
+        call_type (str): Tipo de llamada
+        messages (list): Mensajes enviados al modelo
+        response: Respuesta del modelo (mensaje, o dict con "raw" si se pidió
+            la salida estructurada con include_raw)
+        content (str, optional): Texto generado, si no hay respuesta completa
+    """
+    if isinstance(response, dict):
+        response = response.get("raw")
+    usage = getattr(response, "usage_metadata", None) or {}
+    metadata = getattr(response, "response_metadata", None) or {}
+    if content is None:
+        content = getattr(response, "content", "") or ""
+        if not content and getattr(response, "tool_calls", None):
+            content = json.dumps([call["args"] for call in response.tool_calls], ensure_ascii=False)
+    record_usage(
+        call_type,
+        metadata.get("model_name") or LLM_MODEL_NAME,
+        prompt_tokens=usage.get("input_tokens") or sum(count_tokens(m.content) for m in messages),
+        completion_tokens=usage.get("output_tokens") or count_tokens(content)
+    )
+
+
+def get_call_stats():
+    """
+    Obtener las métricas de las llamadas por tipo
+
+    Returns:
+        dict: Tipo de llamada -> llamadas, intentos, reintentos, peticiones
+            duplicadas, veces que ganó la duplicada, fallos y latencias p50/p95
+    """
+    result = {}
+    with _stats_lock:
+        for call_type, stats in _stats.items():
+            ordered = sorted(stats.latencies)
+            result[call_type] = {
+                "calls": stats.calls,
+                "attempts": stats.attempts,
+                "retries": stats.retries,
+                "hedges": stats.hedges,
+                "hedge_wins": stats.hedge_wins,
+                "failures": stats.failures,
+                "p50": ordered[len(ordered) // 2] if ordered else None,
+                "p95": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] if ordered else None,
+            }
+    return result
+
+
+def reset_call_stats():
+    """Descartar las latencias y contadores registrados"""
+    with _stats_lock:
+        _stats.clear()
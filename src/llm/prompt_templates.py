@@ -62,6 +62,52 @@ Ejemplo de formato de respuesta:
 }}
 """
 
+# Instrucciones adicionales para analizar un turno completo en una sola llamada
+TURN_ANALYSIS_PROMPT = """
+Además de responder al usuario, analiza su entrada actual y devuelve en una única respuesta estructurada:
+- intent: la intención principal del usuario, uno de estos identificadores:
+{intents}
+- lead_info: solo los datos del lead nuevos o actualizados que aparezcan en la entrada actual (nombre, empresa, email, teléfono, necesidades, presupuesto, productos/servicios de interés, plazos). Omite los que no se mencionen.
+- reply: tu respuesta al usuario, siguiendo las directrices anteriores.
+"""
+
+# Prompt para resumir la parte antigua del historial de conversación
+HISTORY_SUMMARY_PROMPT = """
+Actualiza el resumen de una conversación entre un agente de ventas de ATOM y un lead.
+
+Resumen anterior:
+{summary}
+
+Nuevos mensajes:
+{transcript}
+
+Escribe un único resumen en un máximo de {max_words} palabras. Conserva los datos del lead, sus necesidades, objeciones, preguntas pendientes y compromisos acordados. Responde solo con el resumen.
+"""
+
+# Prompt para extraer los datos de varios leads a partir de sus conversaciones guardadas
+BATCH_EXTRACTION_PROMPT = """
+Analiza las siguientes conversaciones de distintos leads con un agente de ventas de ATOM y extrae, para cada una, la información del lead que aparezca en sus mensajes sobre:
+- Nombre
+- Empresa
+- Email
+- Teléfono
+- Necesidades o problemas
+- Presupuesto
+- Productos/servicios de interés
+- Plazos
+
+Conversaciones (solo los mensajes del lead, en orden):
+{conversations}
+
+Responde únicamente con un objeto JSON cuyas claves sean los identificadores de las conversaciones y cuyos valores sean objetos con los campos encontrados. Si un dato cambia a lo largo de la conversación, usa el último. Omite los campos que no aparezcan y las conversaciones sin datos.
+
+Ejemplo de formato de respuesta:
+{{
+  "12": {{"nombre": "Juan Pérez", "empresa": "TechSolutions", "necesidades": "Automatización de procesos de venta"}},
+  "15": {{"presupuesto": "20.000 euros"}}
+}}
+"""
+
 # Plantilla para generar respuestas en momentos específicos del flujo de conversación
 GREETING_TEMPLATE = """
 Estás comenzando una nueva conversación con un lead potencial. Preséntate brevemente, explica el propósito de la llamada y haz una pregunta abierta para iniciar la conversación.
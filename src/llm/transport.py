@@ -0,0 +1,256 @@
+"""
+Transporte HTTP compartido para todo el tráfico con OpenAI
+
+El modelo de chat, el modelo de intenciones y Whisper usan los mismos clientes
+httpx (uno síncrono y otro asíncrono), con límites de conexiones, keep-alive y
+HTTP/2 cuando el paquete h2 está instalado. Así las conexiones TLS abiertas por
+una llamada se reutilizan en las siguientes, sean del tipo que sean.
+
+Con LLM_CASSETTE_PATH las peticiones se graban o se reproducen desde un
+cassette (src.llm.cassette) en lugar de ir a la red.
+
+Las métricas de reutilización se obtienen con el mecanismo de trazas de
+httpcore: cada conexión TCP nueva y cada negociación TLS quedan contadas.
+"""
+import asyncio
+import atexit
+import importlib.util
+import threading
+import httpx
+from src.config import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP2_ENABLED
+)
+from src.llm.clients import reset_clients
+
+# Eventos de httpcore que indican una conexión nueva o una negociación TLS
+CONNECT_EVENT = "connection.connect_tcp.complete"
+TLS_EVENT = "connection.start_tls.complete"
+
+
+class TransportStats:
+    """
+    Contadores de peticiones y conexiones del transporte compartido
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Poner a cero los contadores"""
+        with self._lock:
+            self.requests = 0
+            self.connections = 0
+            self.tls_handshakes = 0
+            self.errors = 0
+
+    def record(self, field):
+        """Incrementar un contador"""
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def trace(self, event_name, info):
+        """Función de traza para las peticiones síncronas"""
+        if event_name == CONNECT_EVENT:
+            self.record("connections")
+        elif event_name == TLS_EVENT:
+            self.record("tls_handshakes")
+
+    async def async_trace(self, event_name, info):
+        """Función de traza para las peticiones asíncronas"""
+        self.trace(event_name, info)
+
+    def snapshot(self):
+        """
+        Obtener las métricas actuales
+
+        Returns:
+            dict: Peticiones, conexiones nuevas, negociaciones TLS, errores y
+                proporción de peticiones que reutilizaron una conexión
+        """
+        with self._lock:
+            requests = self.requests
+            stats = {
+                "requests": requests,
+                "connections": self.connections,
+                "tls_handshakes": self.tls_handshakes,
+                "errors": self.errors,
+            }
+        stats["reuse_rate"] = max(0.0, 1 - stats["connections"] / requests) if requests else 0.0
+        return stats
+
+
+_stats = TransportStats()
+_http_client = None
+_async_http_client = None
+_options = {}
+_transport_lock = threading.Lock()
+# Cierres del cliente asíncrono en curso (para que no se recojan antes de terminar)
+_closing_tasks = set()
+
+
+def http2_available():
+    """Indicar si el paquete h2 necesario para HTTP/2 está instalado"""
+    return importlib.util.find_spec("h2") is not None
+
+
+def _client_options(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive=HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY, timeout=HTTP_TIMEOUT,
+                    connect_timeout=HTTP_CONNECT_TIMEOUT, http2=HTTP2_ENABLED):
+    """Argumentos comunes de los clientes httpx"""
+    return {
+        "limits": httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        ),
+        "timeout": httpx.Timeout(timeout, connect=connect_timeout),
+        "http2": http2 and http2_available(),
+    }
+
+
+def _on_request(request):
+    _stats.record("requests")
+    request.extensions["trace"] = _stats.trace
+
+
+async def _on_async_request(request):
+    _stats.record("requests")
+    request.extensions["trace"] = _stats.async_trace
+
+
+def _on_response(response):
+    if response.status_code >= 500:
+        _stats.record("errors")
+
+
+async def _on_async_response(response):
+    _on_response(response)
+
+
+def _config_transport():
+    """Transporte del cassette de LLM_CASSETTE_PATH, si está configurado"""
+    from src.llm.cassette import get_config_transport
+    return get_config_transport()
+
+
+def get_http_client():
+    """
+    Obtener el cliente httpx síncrono compartido
+
+    Returns:
+        httpx.Client: Cliente compartido
+    """
+    global _http_client
+    with _transport_lock:
+        if _http_client is None:
+            options = dict(_options)
+            transport = options.pop("transport", None) or _config_transport()
+            options.pop("async_transport", None)
+            _http_client = httpx.Client(
+                transport=transport,
+                event_hooks={"request": [_on_request], "response": [_on_response]},
+                **_client_options(**options)
+            )
+        return _http_client
+
+
+def get_async_http_client():
+    """
+    Obtener el cliente httpx asíncrono compartido
+
+    Returns:
+        httpx.AsyncClient: Cliente compartido
+    """
+    global _async_http_client
+    with _transport_lock:
+        if _async_http_client is None:
+            options = dict(_options)
+            transport = options.pop("async_transport", None) or _config_transport()
+            options.pop("transport", None)
+            _async_http_client = httpx.AsyncClient(
+                transport=transport,
+                event_hooks={"request": [_on_async_request], "response": [_on_async_response]},
+                **_client_options(**options)
+            )
+        return _async_http_client
+
+
+def _close_async_client(client):
+    """
+    Cerrar un cliente asíncrono desde código síncrono
+
+    Dentro de un bucle de eventos en marcha el cierre se programa como una
+    tarea de ese bucle; si no hay ninguno, se ejecuta en un bucle temporal.
+
+    Args:
+        client (httpx.AsyncClient): Cliente a cerrar
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    try:
+        if loop is None:
+            asyncio.run(client.aclose())
+        else:
+            task = loop.create_task(client.aclose())
+            _closing_tasks.add(task)
+            task.add_done_callback(_closing_tasks.discard)
+    except Exception as e:
+        print(f"Error al cerrar el cliente HTTP asíncrono: {e}")
+
+
+def configure_http_transport(**options):
+    """
+    Sustituir los clientes compartidos por otros con nuevas opciones
+
+    Los clientes anteriores se cierran y se descartan también los modelos que
+    los usaban; todos se crean de nuevo en el próximo uso.
+
+    Args:
+        **options: max_connections, max_keepalive, keepalive_expiry, timeout,
+            connect_timeout, http2 y, opcionalmente, transport / async_transport
+            (transportes httpx propios, por ejemplo para grabar o reproducir)
+    """
+    global _http_client, _async_http_client, _options
+    with _transport_lock:
+        client, _http_client = _http_client, None
+        async_client, _async_http_client = _async_http_client, None
+        _options = options
+    if client is not None:
+        client.close()
+    if async_client is not None:
+        _close_async_client(async_client)
+    reset_clients()
+    _stats.reset()
+
+
+def get_transport_stats():
+    """Obtener las métricas de reutilización de conexiones"""
+    return _stats.snapshot()
+
+
+def reset_transport_stats():
+    """Poner a cero las métricas de reutilización de conexiones"""
+    _stats.reset()
+
+
+@atexit.register
+def close_http_clients():
+    """
+    Cerrar las conexiones de los clientes compartidos al terminar el proceso
+    """
+    global _http_client, _async_http_client
+    with _transport_lock:
+        client, _http_client = _http_client, None
+        async_client, _async_http_client = _async_http_client, None
+    if client is not None:
+        client.close()
+    if async_client is not None:
+        _close_async_client(async_client)
@@ -0,0 +1,28 @@
+from src.monitoring.tracing import (
+    span,
+    turn,
+    current_turn,
+    record_usage,
+    estimate_cost,
+    monitoring_enabled,
+    configure_monitoring,
+    get_exporters,
+    recent_turns
+)
+from src.monitoring.exporters import Exporter, MemoryExporter, JsonlExporter, PrometheusExporter
+
+__all__ = [
+    'span',
+    'turn',
+    'current_turn',
+    'record_usage',
+    'estimate_cost',
+    'monitoring_enabled',
+    'configure_monitoring',
+    'get_exporters',
+    'recent_turns',
+    'Exporter',
+    'MemoryExporter',
+    'JsonlExporter',
+    'PrometheusExporter',
+]
@@ -0,0 +1,246 @@
+"""
+Exportadores de la instrumentación: memoria, fichero JSONL y Prometheus
+
+Cada exportador recibe las etapas terminadas (`on_span`), las llamadas con
+sus tokens y coste (`on_usage`) y el resumen de cada turno (`on_turn`).
+"""
+import bisect
+import json
+import os
+import threading
+from collections import deque
+
+# Límites de los intervalos de los histogramas de duración (s)
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Exporter:
+    """
+    Exportador base: ignora todos los eventos
+    """
+
+    def on_span(self, name, duration, error):
+        """Recibir una etapa terminada"""
+
+    def on_usage(self, call):
+        """Recibir los tokens y el coste de una llamada"""
+
+    def on_turn(self, record):
+        """Recibir el resumen de un turno terminado"""
+
+    def close(self):
+        """Liberar los recursos del exportador"""
+
+
+class MemoryExporter(Exporter):
+    """
+    Últimos turnos en un búfer circular, para mostrarlos en la interfaz
+    """
+
+    def __init__(self, size=200):
+        self.turns = deque(maxlen=size)
+
+    def on_turn(self, record):
+        self.turns.append(record)
+
+    def recent(self, limit=None):
+        """
+        Obtener los últimos turnos
+
+        Args:
+            limit (int, optional): Número máximo de turnos
+
+        Returns:
+            list: Resúmenes de los turnos, del más antiguo al más reciente
+        """
+        turns = list(self.turns)
+        return turns[-limit:] if limit else turns
+
+    def clear(self):
+        """Descartar los turnos guardados"""
+        self.turns.clear()
+
+
+class JsonlExporter(Exporter):
+    """
+    Un turno por línea en un fichero JSON Lines
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Una escritura por línea: cada turno queda en disco al terminar
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def on_turn(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class _Histogram:
+    """Histograma con los intervalos de DURATION_BUCKETS (el último sin límite)"""
+
+    __slots__ = ("counts", "count", "total")
+
+    def __init__(self):
+        self.counts = [0] * (len(DURATION_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(DURATION_BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def cumulative(self):
+        """Observaciones menores o iguales que cada límite, como exige Prometheus"""
+        total = 0
+        for count in self.counts[:-1]:
+            total += count
+            yield total
+
+
+def _labels(**labels):
+    """Formatear etiquetas de Prometheus"""
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+class PrometheusExporter(Exporter):
+    """
+    Métricas agregadas en el formato de texto de Prometheus
+
+    `render` genera el texto y `serve` lo publica en /metrics desde un hilo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._server = None
+        self.reset()
+
+    def reset(self):
+        """Poner a cero todas las métricas"""
+        with self._lock:
+            self.turns = 0
+            self.turn_errors = 0
+            self.turn_duration = _Histogram()
+            self.spans = {}
+            self.span_errors = {}
+            self.tokens = {}
+            self.costs = {}
+
+    def on_span(self, name, duration, error):
+        with self._lock:
+            histogram = self.spans.get(name)
+            if histogram is None:
+                histogram = self.spans[name] = _Histogram()
+            histogram.observe(duration)
+            if error:
+                self.span_errors[name] = self.span_errors.get(name, 0) + 1
+
+    def on_usage(self, call):
+        key = (call["call_type"], call["model"] or "")
+        with self._lock:
+            prompt, completion = self.tokens.get(key, (0, 0))
+            self.tokens[key] = (prompt + call["prompt_tokens"], completion + call["completion_tokens"])
+            self.costs[key] = self.costs.get(key, 0.0) + call["cost"]
+
+    def on_turn(self, record):
+        with self._lock:
+            self.turns += 1
+            if record.get("error"):
+                self.turn_errors += 1
+            self.turn_duration.observe(record["duration"])
+
+    def render(self):
+        """
+        Generar las métricas en el formato de texto de Prometheus
+
+        Returns:
+            str: Texto de las métricas
+        """
+        lines = []
+
+        def histogram(name, value, **labels):
+            for bound, count in zip(DURATION_BUCKETS, value.cumulative()):
+                lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {count}")
+            lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {value.count}")
+            lines.append(f"{name}_sum{_labels(**labels)} {value.total}")
+            lines.append(f"{name}_count{_labels(**labels)} {value.count}")
+
+        with self._lock:
+            lines += ["# HELP agent_turns_total Turnos procesados", "# TYPE agent_turns_total counter",
+                      f"agent_turns_total {self.turns}"]
+            lines += ["# HELP agent_turn_errors_total Turnos terminados con error",
+                      "# TYPE agent_turn_errors_total counter", f"agent_turn_errors_total {self.turn_errors}"]
+            lines += ["# HELP agent_turn_duration_seconds Duración de los turnos",
+                      "# TYPE agent_turn_duration_seconds histogram"]
+            histogram("agent_turn_duration_seconds", self.turn_duration)
+            lines += ["# HELP agent_span_duration_seconds Duración de cada etapa",
+                      "# TYPE agent_span_duration_seconds histogram"]
+            for name, value in sorted(self.spans.items()):
+                histogram("agent_span_duration_seconds", value, span=name)
+            lines += ["# HELP agent_span_errors_total Etapas terminadas con error",
+                      "# TYPE agent_span_errors_total counter"]
+            for name, count in sorted(self.span_errors.items()):
+                lines.append(f"agent_span_errors_total{_labels(span=name)} {count}")
+            lines += ["# HELP llm_tokens_total Tokens de las llamadas al LLM", "# TYPE llm_tokens_total counter"]
+            for (call_type, model), (prompt, completion) in sorted(self.tokens.items()):
+                lines.append(f"llm_tokens_total{_labels(call_type=call_type, model=model, direction='prompt')} {prompt}")
+                lines.append(f"llm_tokens_total{_labels(call_type=call_type, model=model, direction='completion')} {completion}")
+            lines += ["# HELP llm_cost_usd_total Coste estimado de las llamadas (USD)",
+                      "# TYPE llm_cost_usd_total counter"]
+            for (call_type, model), cost in sorted(self.costs.items()):
+                lines.append(f"llm_cost_usd_total{_labels(call_type=call_type, model=model)} {cost:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, host="127.0.0.1", port=9464):
+        """
+        Publicar las métricas en http://host:port/metrics desde un hilo
+
+        Args:
+            host (str): Dirección en la que escuchar
+            port (int): Puerto (0 = uno libre)
+
+        Returns:
+            str: URL de las métricas
+        """
+        # Solo se importa si se publica el endpoint
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}/metrics"
+
+    def close(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,430 @@
+"""
+Instrumentación de los turnos: etapas, tokens y coste estimado
+
+Cada turno del agente abre un registro (`turn`) en una variable de contexto y
+cada etapa se mide con `span`: la subida y transcripción del audio, las
+llamadas al LLM, las escrituras en la base de datos y la síntesis y
+reproducción de la voz. Las llamadas al LLM añaden sus tokens con
+`record_usage`, que estima además su coste con la tabla de precios.
+
+Al cerrarse, el turno se entrega a los exportadores configurados (memoria,
+JSONL o Prometheus). Las etapas medidas fuera de un turno solo llegan a las
+métricas agregadas.
+
+Con la instrumentación desactivada, `span` y `turn` devuelven un mismo objeto
+vacío y `record_usage` vuelve sin hacer nada, de modo que el coste es el de
+una comprobación y una llamada.
+"""
+import contextvars
+import itertools
+import json
+import threading
+import time
+from datetime import datetime
+from src.config import (
+    MONITORING_ENABLED,
+    MONITORING_EXPORTERS,
+    MONITORING_BUFFER_SIZE,
+    MONITORING_JSONL_PATH,
+    MONITORING_PROMETHEUS_PORT,
+    MONITORING_PRICES
+)
+
+# USD por millón de tokens de entrada y de salida (se elige el prefijo más largo del modelo)
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4.1-nano": (0.1, 0.4),
+    "gpt-4.1-mini": (0.4, 1.6),
+    "gpt-4.1": (2.0, 8.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4": (30.0, 60.0),
+}
+
+# USD por minuto de audio transcrito
+AUDIO_PRICES = {
+    "whisper-1": 0.006,
+    "gpt-4o-mini-transcribe": 0.003,
+    "gpt-4o-transcribe": 0.006,
+}
+
+# Registro del turno en curso (se propaga a los hilos de las etapas con el contexto)
+_current_turn = contextvars.ContextVar("current_turn", default=None)
+
+_enabled = MONITORING_ENABLED
+_exporters = None
+_exporters_lock = threading.Lock()
+_turn_ids = itertools.count(1)
+
+
+def _load_prices():
+    """Añadir a la tabla los precios configurados en MONITORING_PRICES"""
+    if not MONITORING_PRICES:
+        return
+    try:
+        for model, (input_price, output_price) in json.loads(MONITORING_PRICES).items():
+            MODEL_PRICES[model] = (float(input_price), float(output_price))
+    except (ValueError, TypeError) as e:
+        print(f"Error al leer MONITORING_PRICES: {e}")
+
+
+_load_prices()
+
+
+def _find_price(table, model):
+    """Precio del modelo, o del prefijo más largo que coincida (p. ej. versiones con fecha)"""
+    if not model:
+        return None
+    if model in table:
+        return table[model]
+    prefixes = [name for name in table if model.startswith(name)]
+    return table[max(prefixes, key=len)] if prefixes else None
+
+
+def estimate_cost(model, prompt_tokens=0, completion_tokens=0, audio_seconds=0.0):
+    """
+    Estimar el coste de una llamada
+
+    Args:
+        model (str): Nombre del modelo
+        prompt_tokens (int): Tokens de entrada
+        completion_tokens (int): Tokens de salida
+        audio_seconds (float): Segundos de audio transcrito
+
+    Returns:
+        float: Coste estimado en USD (0 si el modelo no tiene precio)
+    """
+    cost = 0.0
+    price = _find_price(MODEL_PRICES, model)
+    if price:
+        cost += (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+    audio_price = _find_price(AUDIO_PRICES, model)
+    if audio_price and audio_seconds:
+        cost += audio_seconds / 60 * audio_price
+    return cost
+
+
+class _NoopSpan:
+    """Etapa vacía usada cuando la instrumentación está desactivada"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """
+    Duración de una etapa, registrada en el turno en curso al terminar
+    """
+
+    __slots__ = ("name", "attrs", "start", "duration", "error", "_turn")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.start = None
+        self.duration = None
+        self.error = None
+        self._turn = None
+
+    def set(self, **attrs):
+        """Añadir atributos a la etapa mientras se ejecuta"""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self._turn = _current_turn.get()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        if self._turn is not None:
+            self._turn.add_span(self)
+        for exporter in get_exporters():
+            exporter.on_span(self.name, self.duration, self.error)
+        return False
+
+
+class TurnRecord:
+    """
+    Etapas, llamadas al LLM y coste de un turno del agente
+    """
+
+    def __init__(self, attrs):
+        self.turn_id = next(_turn_ids)
+        self.timestamp = datetime.now().isoformat(timespec="milliseconds")
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.duration = None
+        self.error = None
+        self.spans = []
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def add_span(self, span):
+        """Registrar una etapa terminada"""
+        entry = {"name": span.name, "start": span.start - self.start, "duration": span.duration}
+        if span.attrs:
+            entry.update(span.attrs)
+        if span.error:
+            entry["error"] = span.error
+        with self._lock:
+            self.spans.append(entry)
+
+    def add_call(self, call):
+        """Registrar los tokens y el coste de una llamada"""
+        with self._lock:
+            self.calls.append(call)
+
+    def to_dict(self):
+        """
+        Resumen serializable del turno
+
+        Returns:
+            dict: Identificador, instante, duración, duración total por
+                etapa, etapas, llamadas, tokens y coste estimado
+        """
+        with self._lock:
+            spans = list(self.spans)
+            calls = list(self.calls)
+        stages = {}
+        for entry in spans:
+            stages[entry["name"]] = stages.get(entry["name"], 0.0) + entry["duration"]
+        record = {
+            "turn_id": self.turn_id,
+            "timestamp": self.timestamp,
+            **self.attrs,
+            "duration": self.duration,
+            "stages": stages,
+            "spans": spans,
+            "calls": calls,
+            "prompt_tokens": sum(call["prompt_tokens"] for call in calls),
+            "completion_tokens": sum(call["completion_tokens"] for call in calls),
+            "cost": sum(call["cost"] for call in calls),
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+class _Turn:
+    """Contexto que abre un turno, o se une al que ya está en curso"""
+
+    __slots__ = ("attrs", "record", "_token")
+
+    def __init__(self, attrs):
+        self.attrs = attrs
+        self.record = None
+        self._token = None
+
+    def set(self, **attrs):
+        """Añadir atributos al turno"""
+        self.record.attrs.update(attrs)
+
+    def __enter__(self):
+        current = _current_turn.get()
+        if current is not None:
+            # Turno anidado (p. ej. la voz alrededor del texto): se comparte el registro
+            current.attrs.update(self.attrs)
+            self.record = current
+            return self
+        self.record = TurnRecord(self.attrs)
+        self._token = _current_turn.set(self.record)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._token is None:
+            return False
+        _current_turn.reset(self._token)
+        record = self.record
+        record.duration = time.perf_counter() - record.start
+        if exc_type is not None:
+            record.error = exc_type.__name__
+        summary = record.to_dict()
+        for exporter in get_exporters():
+            try:
+                exporter.on_turn(summary)
+            except Exception as e:
+                print(f"Error al exportar el turno: {e}")
+        return False
+
+
+def span(name, **attrs):
+    """
+    Medir una etapa
+
+    Args:
+        name (str): Nombre de la etapa (p. ej. "llm.response" o "tts.playback")
+        **attrs: Atributos que se guardan junto a la etapa
+
+    Returns:
+        Contexto que mide la etapa mientras está abierto
+    """
+    if not _enabled:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def turn(**attrs):
+    """
+    Abrir el registro de un turno
+
+    Las etapas y llamadas dentro del contexto (también en los hilos que
+    hereden el contexto) se suman al turno, que se exporta al cerrarse. Si ya
+    hay un turno en curso, se añaden los atributos a ese mismo turno.
+
+    Args:
+        **attrs: Atributos del turno (p. ej. conversation_id)
+
+    Returns:
+        Contexto del turno
+    """
+    if not _enabled:
+        return _NOOP
+    return _Turn(attrs)
+
+
+def current_turn():
+    """
+    Obtener el registro del turno en curso
+
+    Returns:
+        TurnRecord: Registro del turno, o None si no hay ninguno abierto
+    """
+    return _current_turn.get()
+
+
+def record_usage(call_type, model, prompt_tokens=0, completion_tokens=0, audio_seconds=0.0):
+    """
+    Registrar los tokens de una llamada y su coste estimado
+
+    Args:
+        call_type (str): Tipo de llamada ("response", "transcription"...)
+        model (str): Nombre del modelo
+        prompt_tokens (int): Tokens de entrada
+        completion_tokens (int): Tokens de salida
+        audio_seconds (float): Segundos de audio transcrito
+    """
+    if not _enabled:
+        return
+    call = {
+        "call_type": call_type,
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cost": estimate_cost(model, prompt_tokens, completion_tokens, audio_seconds),
+    }
+    if audio_seconds:
+        call["audio_seconds"] = audio_seconds
+    record = _current_turn.get()
+    if record is not None:
+        record.add_call(call)
+    for exporter in get_exporters():
+        exporter.on_usage(call)
+
+
+def monitoring_enabled():
+    """Indicar si la instrumentación está activada"""
+    return _enabled
+
+
+def _create_exporter(kind):
+    """Crear un exportador a partir de su nombre en MONITORING_EXPORTERS"""
+    from src.monitoring.exporters import MemoryExporter, JsonlExporter, PrometheusExporter
+
+    if kind == "memory":
+        return MemoryExporter(MONITORING_BUFFER_SIZE)
+    if kind == "jsonl":
+        return JsonlExporter(MONITORING_JSONL_PATH)
+    if kind == "prometheus":
+        exporter = PrometheusExporter()
+        if MONITORING_PROMETHEUS_PORT:
+            exporter.serve(port=MONITORING_PROMETHEUS_PORT)
+        return exporter
+    raise ValueError(f"Exportador desconocido: {kind}")
+
+
+def get_exporters():
+    """
+    Obtener los exportadores activos, creando los configurados en el primer uso
+
+    Returns:
+        list: Exportadores
+    """
+    global _exporters
+    if _exporters is None:
+        with _exporters_lock:
+            if _exporters is None:
+                exporters = []
+                for kind in MONITORING_EXPORTERS:
+                    try:
+                        exporters.append(_create_exporter(kind))
+                    except Exception as e:
+                        print(f"Error al crear el exportador {kind}: {e}")
+                _exporters = exporters
+    return _exporters
+
+
+def get_exporter(exporter_class):
+    """
+    Obtener el primer exportador activo de una clase
+
+    Args:
+        exporter_class (type): Clase del exportador
+
+    Returns:
+        El exportador, o None si no hay ninguno de esa clase
+    """
+    for exporter in get_exporters():
+        if isinstance(exporter, exporter_class):
+            return exporter
+    return None
+
+
+def configure_monitoring(enabled=None, exporters=None):
+    """
+    Activar o desactivar la instrumentación y sustituir los exportadores
+
+    Args:
+        enabled (bool, optional): Activar la instrumentación
+        exporters (list, optional): Exportadores a usar en lugar de los
+            configurados; los anteriores se cierran
+    """
+    global _enabled, _exporters
+    if exporters is not None:
+        with _exporters_lock:
+            previous, _exporters = _exporters, list(exporters)
+        for exporter in previous or []:
+            if exporter not in _exporters:
+                exporter.close()
+    if enabled is not None:
+        _enabled = enabled
+
+
+def recent_turns(limit=None):
+    """
+    Obtener los últimos turnos guardados en memoria (para la interfaz)
+
+    Args:
+        limit (int, optional): Número máximo de turnos
+
+    Returns:
+        list: Resúmenes de los turnos, del más antiguo al más reciente
+    """
+    from src.monitoring.exporters import MemoryExporter
+
+    exporter = get_exporter(MemoryExporter)
+    return exporter.recent(limit) if exporter else []
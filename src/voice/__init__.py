@@ -1,7 +1,10 @@
 from src.voice.asr import transcribe_audio
-from src.voice.tts import text_to_speech
+from src.voice.tts import text_to_speech, text_to_speech_stream, split_sentences, SpeechStream
 
 __all__ = [
     'transcribe_audio',
     'text_to_speech',
+    'text_to_speech_stream',
+    'split_sentences',
+    'SpeechStream',
 ]
\ No newline at end of file
@@ -1,12 +1,15 @@
 import os
 import time
 import tempfile
+import wave
 import speech_recognition as sr
-from openai import OpenAI
-from src.config import OPENAI_API_KEY, ASR_MODEL, AUDIO_TEMP_FOLDER
+from src.config import ASR_MODEL, ensure_audio_temp_folder
+from src.llm.clients import LazyClient, get_openai_client
+from src.llm.policy import call_with_policy
+from src.monitoring import span, record_usage, monitoring_enabled
 
-# Inicializar el cliente de OpenAI
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Cliente de OpenAI (se crea en la primera transcripción)
+client = LazyClient(get_openai_client)
 
 
 def record_audio(timeout=5):
@@ -28,7 +31,7 @@ def record_audio(timeout=5):
             audio = recognizer.listen(source, timeout=timeout)
             
         # Guardar el audio en un archivo temporal
-        temp_file = os.path.join(AUDIO_TEMP_FOLDER, f"recording_{int(time.time())}.wav")
+        temp_file = os.path.join(ensure_audio_temp_folder(), f"recording_{int(time.time())}.wav")
         with open(temp_file, "wb") as f:
             f.write(audio.get_wav_data())
             
@@ -38,6 +41,23 @@ def record_audio(timeout=5):
         return None
 
 
+def audio_duration(audio_file_path):
+    """
+    Obtener la duración de un archivo WAV
+    
+    Args:
+        audio_file_path (str): Ruta al archivo de audio
+        
+    Returns:
+        float: Duración en segundos, o 0 si no es un WAV legible
+    """
+    try:
+        with wave.open(audio_file_path, "rb") as audio:
+            return audio.getnframes() / audio.getframerate()
+    except (wave.Error, EOFError, OSError):
+        return 0.0
+
+
 def transcribe_with_whisper(audio_file_path):
     """
     Transcribir audio usando OpenAI Whisper
@@ -48,12 +68,20 @@ def transcribe_with_whisper(audio_file_path):
     Returns:
         str: Texto transcrito o cadena vacía si hay error
     """
-    try:
+    def transcribe(timeout):
+        # Cada intento vuelve a abrir el archivo desde el principio
         with open(audio_file_path, "rb") as audio_file:
-            transcription = client.audio.transcriptions.create(
+            return client.audio.transcriptions.create(
                 model=ASR_MODEL,
-                file=audio_file
+                file=audio_file,
+                timeout=timeout
             )
+    
+    try:
+        with span("asr.transcribe", bytes=os.path.getsize(audio_file_path)):
+            transcription = call_with_policy("transcription", transcribe)
+        if monitoring_enabled():
+            record_usage("transcription", ASR_MODEL, audio_seconds=audio_duration(audio_file_path))
         return transcription.text
     except Exception as e:
         print(f"Error al transcribir con Whisper: {e}")
@@ -67,7 +95,8 @@ def transcribe_audio():
     Returns:
         str: Texto transcrito del audio o cadena vacía si hay error
     """
-    audio_file = record_audio()
+    with span("asr.record"):
+        audio_file = record_audio()
     if audio_file:
         text = transcribe_with_whisper(audio_file)
         # Limpiar el archivo temporal
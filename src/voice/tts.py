@@ -1,10 +1,19 @@
 import os
+import re
 import time
+import uuid
+import queue
 import tempfile
+import threading
+import contextvars
 from gtts import gTTS
 from pydub import AudioSegment
 from pydub.playback import play
-from src.config import TTS_LANGUAGE, AUDIO_TEMP_FOLDER
+from src.config import TTS_LANGUAGE, TTS_MIN_SENTENCE_CHARS, ensure_audio_temp_folder
+from src.monitoring import span
+
+# Fin de frase: puntuación final seguida de espacio, o salto de línea
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…:;])\s+|\n+')
 
 
 def text_to_speech(text, language=TTS_LANGUAGE, play_audio=True):
@@ -24,16 +33,19 @@ def text_to_speech(text, language=TTS_LANGUAGE, play_audio=True):
     
     try:
         # Crear un archivo temporal para el audio
-        audio_file = os.path.join(AUDIO_TEMP_FOLDER, f"speech_{int(time.time())}.mp3")
+        # Sufijo aleatorio para no sobrescribir fragmentos generados en el mismo segundo
+        audio_file = os.path.join(ensure_audio_temp_folder(), f"speech_{int(time.time())}_{uuid.uuid4().hex[:8]}.mp3")
         
         # Generar la voz
-        tts = gTTS(text=text, lang=language, slow=False)
-        tts.save(audio_file)
+        with span("tts.synthesize", chars=len(text)):
+            tts = gTTS(text=text, lang=language, slow=False)
+            tts.save(audio_file)
         
         # Reproducir el audio si se solicita
         if play_audio:
-            audio = AudioSegment.from_mp3(audio_file)
-            play(audio)
+            with span("tts.playback"):
+                audio = AudioSegment.from_mp3(audio_file)
+                play(audio)
         
         return audio_file
     except Exception as e:
@@ -41,27 +53,199 @@ def text_to_speech(text, language=TTS_LANGUAGE, play_audio=True):
         return None
 
 
-def text_to_speech_stream(text_chunks, language=TTS_LANGUAGE):
+def split_sentences(text_stream, min_length=TTS_MIN_SENTENCE_CHARS):
+    """
+    Agrupar fragmentos de texto en frases a medida que llegan
+    
+    Cada frase se emite en cuanto aparece su final, sin esperar al resto del
+    texto. Las frases más cortas que `min_length` se unen a la siguiente para
+    no sintetizar fragmentos demasiado pequeños.
+    
+    Args:
+        text_stream (iterable): Fragmentos de texto (por ejemplo, tokens del LLM)
+        min_length (int): Longitud mínima de cada frase emitida
+        
+    Yields:
+        str: Frase completa
+    """
+    buffer = ""
+    for fragment in text_stream:
+        buffer += fragment
+        parts = SENTENCE_BOUNDARY.split(buffer)
+        
+        # La última parte puede estar incompleta y se conserva en el buffer
+        pending = ""
+        for part in parts[:-1]:
+            pending = f"{pending} {part}".strip()
+            if len(pending) >= min_length:
+                yield pending
+                pending = ""
+        buffer = f"{pending} {parts[-1]}" if pending else parts[-1]
+    
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def text_to_speech_stream(text_chunks, language=TTS_LANGUAGE, play_audio=True, on_audio=None):
     """
     Transmitir chunks de texto a voz para respuestas largas
     
+    Los chunks se sintetizan en un hilo aparte con un fragmento de adelanto,
+    de modo que el siguiente audio está listo al terminar de reproducir el
+    actual. `text_chunks` puede ser un generador que produzca el texto a
+    medida que se genera.
+    
     Args:
-        text_chunks (list): Lista de fragmentos de texto
+        text_chunks (iterable): Fragmentos de texto
         language (str): Idioma para la síntesis de voz
+        play_audio (bool): Indica si se debe reproducir el audio generado
+        on_audio (callable, optional): Se llama con la ruta de cada audio listo
         
     Returns:
         list: Lista de rutas a los archivos de audio generados
     """
     audio_files = []
+    ready = queue.Queue(maxsize=1)
     
-    for chunk in text_chunks:
-        audio_file = text_to_speech(chunk, language, play_audio=True)
-        if audio_file:
-            audio_files.append(audio_file)
+    def synthesize():
+        try:
+            for chunk in text_chunks:
+                audio_file = text_to_speech(chunk, language, play_audio=False)
+                if audio_file:
+                    ready.put(audio_file)
+        except Exception as e:
+            print(f"Error en la síntesis de voz: {e}")
+        finally:
+            ready.put(None)
+    
+    # El hilo hereda el contexto para que sus etapas cuenten en el turno en curso
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(synthesize,), name="tts-synthesis", daemon=True).start()
+    
+    for audio_file in iter(ready.get, None):
+        audio_files.append(audio_file)
+        if on_audio:
+            on_audio(audio_file)
+        if play_audio:
+            try:
+                with span("tts.playback"):
+                    play(AudioSegment.from_mp3(audio_file))
+            except Exception as e:
+                print(f"Error al reproducir el audio: {e}")
     
     return audio_files
 
 
+class SpeechStream:
+    """
+    Voz de un texto que todavía se está generando
+    
+    Las frases completas se envían a text_to_speech_stream desde un hilo
+    propio, de modo que el primer audio suena mientras el resto del texto
+    sigue llegando. Tras `stop` (o `close`) se deja de leer el texto en curso:
+    lo que siga llegando, por ejemplo de una respuesta fuera de plazo, no se dice.
+    """
+    
+    def __init__(self, language=TTS_LANGUAGE, play_audio=True, on_audio=None):
+        """
+        Iniciar el hilo de síntesis y reproducción
+        
+        Args:
+            language (str): Idioma para la síntesis de voz
+            play_audio (bool): Indica si se debe reproducir el audio generado
+            on_audio (callable, optional): Se llama con la ruta de cada audio listo
+        """
+        self.audio_files = []
+        self.sentences = []
+        self.spoken = False
+        self.stopped = False
+        self._sentences = queue.Queue()
+        self._lock = threading.Lock()
+        context = contextvars.copy_context()
+        self._thread = threading.Thread(
+            target=context.run,
+            args=(self._run, language, play_audio, on_audio),
+            name="speech-stream",
+            daemon=True
+        )
+        self._thread.start()
+    
+    def _run(self, language, play_audio, on_audio):
+        self.audio_files = text_to_speech_stream(iter(self._sentences.get, None), language, play_audio, on_audio)
+    
+    @property
+    def text(self):
+        """Texto de las frases encoladas, es decir, el que llega a decirse"""
+        return " ".join(self.sentences)
+    
+    def _put(self, sentence, force=False):
+        """Encolar una frase si la voz no se ha detenido (o si `force`)"""
+        with self._lock:
+            if self.stopped and not force:
+                return False
+            self._sentences.put(sentence)
+            self.sentences.append(sentence)
+            self.spoken = True
+            return True
+    
+    def feed(self, text_stream):
+        """
+        Encolar las frases de un texto a medida que se genera
+        
+        Si la voz se detiene antes de terminar, se deja de leer el texto y se
+        cierra el generador (y con él la llamada al LLM que lo produce).
+        
+        Args:
+            text_stream (iterable): Fragmentos de texto
+            
+        Returns:
+            str: Texto recibido
+        """
+        fragments = []
+        text_stream = iter(text_stream)
+        
+        def collect():
+            for fragment in text_stream:
+                if self.stopped:
+                    break
+                fragments.append(fragment)
+                yield fragment
+        
+        try:
+            for sentence in split_sentences(collect()):
+                if not self._put(sentence):
+                    break
+        finally:
+            close = getattr(text_stream, "close", None)
+            if close:
+                close()
+        return "".join(fragments)
+    
+    def say(self, text):
+        """Encolar un texto ya completo, aunque la voz se haya detenido"""
+        for sentence in split_sentences([text]):
+            self._put(sentence, force=True)
+        return text
+    
+    def stop(self):
+        """Dejar de leer los textos en curso: lo que llegue después ya no se dice"""
+        with self._lock:
+            self.stopped = True
+    
+    def close(self):
+        """
+        Esperar a que se sinteticen y reproduzcan todas las frases encoladas
+        
+        Returns:
+            list: Lista de rutas a los archivos de audio generados
+        """
+        with self._lock:
+            self.stopped = True
+            self._sentences.put(None)
+        self._thread.join()
+        return self.audio_files
+
+
 def cleanup_audio_files(audio_files):
     """
     Limpiar archivos de audio temporales
@@ -1,5 +1,9 @@
 import sys
 import os
+import json
+import time
+import httpx
+import openai
 import pytest
 from unittest.mock import patch, MagicMock
 
@@ -7,15 +11,62 @@ from unittest.mock import patch, MagicMock
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.conversation.intent import detect_intent
-from src.conversation.entities import extract_lead_info, create_lead_from_info, update_lead_from_info
-from src.conversation.agent import VoiceAgent
-from src.database.models import Lead, LeadDetails
+from src.conversation.intent_classifier import (
+    IntentClassifier,
+    classify_intent,
+    match_rules,
+    seed_dataset,
+    load_labeled_messages,
+    train_intent_classifier,
+    SEED_EXAMPLES
+)
+from src.conversation.entities import (
+    extract_lead_info,
+    create_lead_from_info,
+    update_lead_from_info,
+    pre_extract,
+    get_extraction_stats
+)
+from src.conversation.agent import VoiceAgent, RESPONSE_FALLBACK_MESSAGE
+from src.conversation.backfill import BACKFILL_JOB, backfill_lead_details, backfill_source
+from src.database.models import Lead, LeadDetails, Message
+from src.database.repository import (
+    initialize_database,
+    create_lead,
+    start_conversation,
+    add_messages,
+    get_conversation_messages,
+    get_full_lead,
+    get_job_checkpoint,
+    connection
+)
+from src.llm.model import TurnAnalysis
+from src.monitoring import (
+    configure_monitoring,
+    record_usage,
+    span,
+    turn,
+    MemoryExporter,
+    JsonlExporter,
+    PrometheusExporter
+)
+from src.llm.policy import LLMCallError
+from src.llm.clients import reset_clients
+from src.voice.tts import split_sentences
+
+
+@pytest.fixture(autouse=True)
+def fresh_clients():
+    """Fixture para que cada prueba cree sus propios clientes (y use los mocks de LangChain)"""
+    reset_clients()
+    yield
+    reset_clients()
 
 
 @pytest.fixture
 def mock_llm():
     """Fixture para simular respuestas del LLM"""
-    with patch('src.llm.model.generate_response') as mock_generate:
+    with patch('src.conversation.agent.generate_response') as mock_generate:
         mock_generate.return_value = "Esta es una respuesta simulada del agente."
         yield mock_generate
 
@@ -33,7 +84,7 @@ def mock_intent_detection():
 @pytest.fixture
 def mock_entity_extraction():
     """Fixture para simular extracción de entidades"""
-    with patch('src.llm.model.extract_entities') as mock_extract:
+    with patch('src.conversation.entities.extract_entities') as mock_extract:
         mock_extract.return_value = {
             "nombre": "Juan Pérez",
             "empresa": "TechCorp",
@@ -49,12 +100,15 @@ def mock_database():
          patch('src.conversation.agent.update_lead_details') as mock_update_details, \
          patch('src.conversation.agent.start_conversation') as mock_start_conv, \
          patch('src.conversation.agent.add_message') as mock_add_msg, \
-         patch('src.conversation.agent.get_lead_by_id') as mock_get_lead:
+         patch('src.conversation.agent.add_messages') as mock_add_msgs, \
+         patch('src.conversation.agent.get_lead_by_id') as mock_get_lead, \
+         patch('src.conversation.agent.get_lead_by_email', return_value=None):
         
         mock_create_lead.return_value = 1
         mock_update_details.return_value = None
         mock_start_conv.return_value = 1
         mock_add_msg.return_value = 1
+        mock_add_msgs.return_value = 2
         
         lead = Lead(
             id=1,
@@ -70,6 +124,7 @@ def mock_database():
             "update_details": mock_update_details,
             "start_conversation": mock_start_conv,
             "add_message": mock_add_msg,
+            "add_messages": mock_add_msgs,
             "get_lead": mock_get_lead
         }
 
@@ -198,7 +253,7 @@ def test_voice_agent_start_session(mock_database):
     mock_database["start_conversation"].assert_called_once()
 
 
-def test_voice_agent_process_text_input(mock_llm, mock_entity_extraction, mock_database):
+def test_voice_agent_process_text_input(mock_llm, mock_intent_detection, mock_entity_extraction, mock_database):
     """Probar el procesamiento de entrada de texto del agente"""
     # Crear una instancia del agente
     agent = VoiceAgent()
@@ -214,9 +269,10 @@ def test_voice_agent_process_text_input(mock_llm, mock_entity_extraction, mock_d
     mock_llm.assert_called_once()
     
     # Verificar que se haya actualizado el historial de conversación
-    assert len(agent.conversation_history) == 2  # Saludo + respuesta
+    assert len(agent.conversation_history) == 3  # Saludo + mensaje + respuesta
     assert agent.conversation_history[1]["sender"] == "lead"
     assert agent.conversation_history[1]["content"] == user_input
+    assert agent.conversation_history[2]["content"] == response
 
 
 def test_voice_agent_end_session():
@@ -237,4 +293,454 @@ def test_voice_agent_end_session():
     # Verificar que se haya reiniciado el estado
     assert result is True
     assert agent.lead_info == {}
-    assert agent.conversation_history == []
\ No newline at end of file
+    assert agent.conversation_history == []
+
+
+def test_voice_agent_batches_messages_per_turn(mock_database):
+    """Probar que cada turno escribe sus mensajes en un único lote"""
+    with patch('src.conversation.agent.detect_intent_with_source', return_value=("INQUIRY", "llm")), \
+         patch('src.conversation.agent.extract_lead_info', side_effect=lambda text, info: info), \
+         patch('src.conversation.agent.generate_response', return_value="Respuesta simulada"):
+        agent = VoiceAgent()
+        agent.start_session(lead_id=1)
+        mock_database["add_messages"].reset_mock()
+        
+        agent.process_text_input("Quiero información sobre vuestros servicios")
+    
+    # Verificar que el mensaje del lead y la respuesta se escriban juntos
+    mock_database["add_messages"].assert_called_once()
+    batch = mock_database["add_messages"].call_args[0][0]
+    assert [message.sender for message in batch] == ["lead", "agent"]
+    mock_database["add_message"].assert_not_called()
+    assert agent._pending_messages == []
+
+
+def test_voice_agent_flushed_message_keeps_intent(mock_database):
+    """Probar que el mensaje del lead se escribe con su intención aunque se vuelque a mitad de turno"""
+    written = []
+    mock_database["add_messages"].side_effect = lambda messages: written.extend(
+        (message.sender, message.intent) for message in messages
+    )
+    with patch('src.conversation.agent.MESSAGE_FLUSH_SIZE', 1), \
+         patch('src.conversation.agent.detect_intent_with_source', return_value=("INQUIRY", "llm")), \
+         patch('src.conversation.agent.extract_lead_info', side_effect=lambda text, info: info), \
+         patch('src.conversation.agent.generate_response', return_value="Respuesta simulada"):
+        agent = VoiceAgent(single_pass=False, concurrent=False)
+        agent.start_session(lead_id=1)
+        written.clear()
+        
+        agent.process_text_input("Quiero información sobre vuestros servicios")
+    
+    assert written == [("lead", "INQUIRY"), ("agent", None)]
+
+def test_voice_agent_single_pass_mode(mock_database):
+    """Probar el modo de una sola llamada y su recuperación ante fallos"""
+    analysis = TurnAnalysis(
+        intent="PRICING",
+        lead_info={"name": "Ana López", "budget": "5000"},
+        reply="¿Para cuándo lo necesitaríais?"
+    )
+    with patch('src.conversation.agent.analyze_turn', return_value=analysis) as mock_analyze, \
+         patch('src.conversation.agent.detect_intent_with_source') as mock_intent, \
+         patch('src.conversation.agent.generate_response') as mock_generate:
+        agent = VoiceAgent(single_pass=True)
+        agent.start_session(lead_id=1)
+        response = agent.process_text_input("Soy Ana López y tenemos unos 5000 euros")
+    
+    # Una sola llamada al LLM produce intención, datos y respuesta
+    mock_analyze.assert_called_once()
+    mock_intent.assert_not_called()
+    mock_generate.assert_not_called()
+    assert response == "¿Para cuándo lo necesitaríais?"
+    assert agent.last_intent == "PRICING"
+    assert agent.lead_info["name"] == "Ana López"
+    assert agent.lead_info["budget"] == "5000"
+    
+    # Si el análisis no es válido se recurre a las tres llamadas
+    with patch('src.conversation.agent.analyze_turn', return_value=None), \
+         patch('src.conversation.agent.detect_intent_with_source', return_value=("INQUIRY", "llm")), \
+         patch('src.conversation.agent.extract_lead_info', side_effect=lambda text, info: info), \
+         patch('src.conversation.agent.generate_response', return_value="Respuesta de respaldo"):
+        response = agent.process_text_input("¿Qué servicios ofrecéis?")
+    
+    assert response == "Respuesta de respaldo"
+    assert agent.last_intent == "INQUIRY"
+
+
+def test_voice_agent_sequential_turn_survives_llm_errors(mock_database):
+    """Probar que el modo en serie usa valores por defecto si el LLM falla tras reintentar"""
+    def failing(call_type):
+        def fail(*args):
+            raise LLMCallError(call_type, TimeoutError("sin respuesta"))
+        return fail
+    
+    agent = VoiceAgent(concurrent=False, single_pass=False)
+    agent.start_session(lead_id=1)
+    agent.last_intent = "PRICING"
+    agent.lead_info = {"name": "Ana"}
+    with patch('src.conversation.agent.detect_intent_with_source', side_effect=failing("intent")), \
+         patch('src.conversation.agent.extract_lead_info', side_effect=failing("extraction")), \
+         patch('src.conversation.agent.generate_response', side_effect=failing("response")):
+        response = agent.process_text_input("¿Y el precio?")
+    
+    # Se conservan la intención y los datos anteriores y se responde con el mensaje de respaldo
+    assert response == RESPONSE_FALLBACK_MESSAGE
+    assert agent.last_intent == "PRICING"
+    assert agent.lead_info == {"name": "Ana"}
+    assert agent.conversation_history[-1]["content"] == RESPONSE_FALLBACK_MESSAGE
+    assert {"intent", "extraction", "response", "total"} <= set(agent.last_turn_timings)
+
+
+def test_voice_agent_concurrent_turn_pipeline(mock_database):
+    """Probar que intención y extracción se ejecutan en paralelo con tiempos por etapa"""
+    def slow_intent(text):
+        time.sleep(0.3)
+        return "REQUIREMENTS", "llm"
+    
+    def slow_extraction(text, info):
+        time.sleep(0.3)
+        return {**info, "needs": "CRM"}
+    
+    with patch('src.conversation.agent.detect_intent_with_source', side_effect=slow_intent), \
+         patch('src.conversation.agent.extract_lead_info', side_effect=slow_extraction), \
+         patch('src.conversation.agent.generate_response', return_value="Respuesta simulada"):
+        agent = VoiceAgent(concurrent=True)
+        agent.start_session(lead_id=1)
+        response = agent.process_text_input("Necesitamos un CRM")
+    
+    assert response == "Respuesta simulada"
+    assert agent.last_intent == "REQUIREMENTS"
+    assert agent.lead_info["needs"] == "CRM"
+    
+    # El camino crítico es una sola etapa lenta, no la suma de ambas
+    timings = agent.last_turn_timings
+    assert {"intent", "extraction", "database", "response", "total"} <= set(timings)
+    assert timings["total"] < timings["intent"] + timings["extraction"]
+    
+    # Una etapa que supera su tiempo máximo se descarta sin bloquear el turno
+    with patch('src.conversation.agent.LLM_INTENT_TIMEOUT', 0.05), \
+         patch('src.conversation.agent.detect_intent_with_source', side_effect=slow_intent), \
+         patch('src.conversation.agent.extract_lead_info', side_effect=lambda text, info: info), \
+         patch('src.conversation.agent.generate_response', return_value="Respuesta simulada"):
+        agent.process_text_input("¿Y el precio?")
+    
+    assert agent.last_intent == "IRRELEVANT"
+    assert agent.last_turn_timings["total"] < 0.3
+
+
+def test_voice_agent_streams_response_to_speech(mock_database):
+    """Probar que la respuesta se sintetiza por frases mientras se genera"""
+    tokens = ["Gracias por tu interés. ", "¿Cuántas personas ", "usarían el CRM?"]
+    with patch('src.conversation.agent.detect_intent_with_source', return_value=("INQUIRY", "llm")), \
+         patch('src.conversation.agent.extract_lead_info', side_effect=lambda text, info: info), \
+         patch('src.conversation.agent.stream_response', return_value=iter(tokens)), \
+         patch('src.voice.tts.text_to_speech', side_effect=lambda text, language, play_audio: f"{len(text)}.mp3"), \
+         patch('src.voice.tts.AudioSegment.from_mp3'), \
+         patch('src.voice.tts.play'):
+        agent = VoiceAgent()
+        agent.start_session(lead_id=1)
+        response = agent.process_text_input("Queremos un CRM", stream_voice=True)
+    
+    assert response == "Gracias por tu interés. ¿Cuántas personas usarían el CRM?"
+    assert agent.audio_files == ["23.mp3", "33.mp3"]
+    assert 0 < agent.last_turn_timings["first_audio"]
+    assert agent.conversation_history[-1]["content"] == response
+
+
+
+def test_voice_agent_stops_streaming_response_after_timeout(mock_database):
+    """Probar que una respuesta en streaming fuera de plazo deja de leerse y se guarda lo que se dijo"""
+    consumed = []
+    
+    def slow_stream(*args):
+        for token in ["Gracias por tu interés en ATOM. ", "Te cuento ", "más detalles enseguida."]:
+            consumed.append(token)
+            yield token
+            if len(consumed) == 1:
+                time.sleep(0.3)
+    
+    with patch('src.conversation.agent.LLM_RESPONSE_TIMEOUT', 0.1), \
+         patch('src.conversation.agent.detect_intent_with_source', return_value=("INQUIRY", "llm")), \
+         patch('src.conversation.agent.extract_lead_info', side_effect=lambda text, info: info), \
+         patch('src.conversation.agent.stream_response', side_effect=slow_stream), \
+         patch('src.voice.tts.text_to_speech', side_effect=lambda text, language, play_audio: f"{len(text)}.mp3"), \
+         patch('src.voice.tts.AudioSegment.from_mp3'), \
+         patch('src.voice.tts.play'):
+        agent = VoiceAgent(concurrent=True, single_pass=False)
+        agent.start_session(lead_id=1)
+        response = agent.process_text_input("Queremos un CRM", stream_voice=True)
+        time.sleep(0.4)
+    
+    # Se guarda la frase que llegó a sonar, no el mensaje de respaldo
+    assert response == "Gracias por tu interés en ATOM."
+    assert agent.conversation_history[-1]["content"] == response
+    assert agent.audio_files == [f"{len(response)}.mp3"]
+    
+    # El hilo de la respuesta deja de leer el stream en cuanto se detiene la voz
+    assert consumed == ["Gracias por tu interés en ATOM. ", "Te cuento "]
+
+
+@pytest.mark.parametrize("concurrent", [False, True])
+def test_voice_agent_streamed_response_survives_api_errors(mock_database, concurrent):
+    """Probar que un fallo de la API en la respuesta en streaming usa el mensaje de respaldo en ambos modos"""
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    with patch('src.conversation.agent.detect_intent_with_source', return_value=("INQUIRY", "llm")), \
+         patch('src.conversation.agent.extract_lead_info', side_effect=lambda text, info: info), \
+         patch('src.llm.model.llm') as mock_model, \
+         patch('src.voice.tts.text_to_speech', side_effect=lambda text, language, play_audio: f"{len(text)}.mp3"), \
+         patch('src.voice.tts.AudioSegment.from_mp3'), \
+         patch('src.voice.tts.play'):
+        mock_model.stream.side_effect = openai.APIConnectionError(request=request)
+        agent = VoiceAgent(concurrent=concurrent, single_pass=False)
+        agent.start_session(lead_id=1)
+        response = agent.process_text_input("Queremos un CRM", stream_voice=True)
+    
+    # Como no llegó a sonar nada, se dice el mensaje de respaldo
+    assert response == RESPONSE_FALLBACK_MESSAGE
+    assert agent.conversation_history[-1]["content"] == RESPONSE_FALLBACK_MESSAGE
+    assert agent.audio_files == [f"{len(sentence)}.mp3" for sentence in split_sentences([RESPONSE_FALLBACK_MESSAGE])]
+
+
+def test_voice_agent_voice_input_streams_response(mock_database):
+    """Probar que la entrada de voz puede responder con voz en streaming"""
+    with patch('src.conversation.agent.transcribe_audio', return_value="Queremos un CRM"), \
+         patch.object(VoiceAgent, 'process_text_input', return_value="Respuesta") as mock_process:
+        agent = VoiceAgent()
+        agent.start_session(lead_id=1)
+        assert agent.process_voice_input(stream_voice=True) == ("Queremos un CRM", "Respuesta")
+    
+    mock_process.assert_called_once_with("Queremos un CRM", True)
+
+
+def test_rule_based_pre_extraction_policy():
+    """Probar la extracción por reglas y cuándo se evita la llamada al LLM"""
+    info, needs_llm = pre_extract("Llamadme al +34 600 123 456, presupuesto 3000€ y lo antes posible")
+    assert info == {"phone": "+34 600 123 456", "budget": "3000€", "timeline": "lo antes posible"}
+    assert needs_llm is False
+    assert pre_extract("Me llamo Ana y trabajo en Acme")[1] is True
+    
+    with patch('src.conversation.entities.extract_entities', return_value={"nombre": "Ana", "email": "ana@acme.es"}) as mock_extract:
+        before = get_extraction_stats()
+        
+        # En modo automático las respuestas con solo datos reconocibles no llaman al LLM
+        lead_info = extract_lead_info("Mi email es ana@acme.es", {"name": "Ana"}, policy="auto")
+        assert lead_info == {"name": "Ana", "email": "ana@acme.es"}
+        extract_lead_info("ok, gracias", {}, policy="auto")
+        mock_extract.assert_not_called()
+        
+        # Con texto libre se llama al LLM y sus valores se combinan con los de las reglas
+        lead_info = extract_lead_info("Soy Ana, tenemos 5.000 euros", {}, policy="auto")
+        assert lead_info == {"name": "Ana", "email": "ana@acme.es", "budget": "5.000 euros"}
+        assert mock_extract.call_count == 1
+        
+        # Las políticas 'rules' y 'llm' fuerzan uno u otro comportamiento
+        assert extract_lead_info("Soy Ana", {}, policy="rules") == {}
+        extract_lead_info("ok", {}, policy="llm")
+        assert mock_extract.call_count == 2
+        
+        stats = get_extraction_stats()
+        assert stats["turns"] - before["turns"] == 5
+        assert stats["llm_skipped"] - before["llm_skipped"] == 3
+
+def test_local_intent_classifier(tmp_path):
+    """Probar las reglas y el modelo TF-IDF del clasificador local"""
+    # Las reglas solo deciden cuando coincide una única intención
+    assert match_rules("Hola") == "GREETING"
+    assert match_rules("¿Cuánto cuesta?") == "PRICING"
+    assert match_rules("¿Cuánto cuesta comparado con HubSpot?") is None
+    assert classify_intent("Ahora usamos Salesforce") == ("COMPETITOR", 0.95)
+    
+    classifier = IntentClassifier().fit(*seed_dataset())
+    intent, confidence = classifier.predict("me gustaría ver una demo del producto")
+    assert intent == "INTEREST"
+    assert 0 < confidence <= 1
+    assert sum(classifier.predict_proba("no me convence").values()) == pytest.approx(1)
+    
+    # El modelo guardado predice exactamente lo mismo
+    path = str(tmp_path / "intent_model.npz")
+    classifier.save(path)
+    loaded = IntentClassifier.load(path)
+    assert loaded.predict_proba("no me convence") == pytest.approx(classifier.predict_proba("no me convence"))
+
+def test_detect_intent_hybrid_mode(mock_intent_detection):
+    """Probar que el modo híbrido solo consulta al LLM con poca confianza"""
+    with patch('src.conversation.intent.classify_intent', return_value=("PRICING", 0.9)):
+        assert detect_intent("¿Cuánto cuesta?", mode="hybrid") == "PRICING"
+        mock_intent_detection.invoke.assert_not_called()
+    
+    with patch('src.conversation.intent.classify_intent', return_value=("PRICING", 0.2)):
+        assert detect_intent("Bueno, ya veremos", mode="hybrid") == "INQUIRY"
+        assert detect_intent("Bueno, ya veremos", mode="local") == "PRICING"
+        assert mock_intent_detection.invoke.call_count == 1
+        
+        # Si la API del LLM falla se usa la estimación local
+        request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+        mock_intent_detection.invoke.side_effect = openai.APIError("API Error", request, body=None)
+        assert detect_intent("Otra cosa distinta", mode="hybrid") == "PRICING"
+        
+        # Los errores que no son de la API no se ocultan
+        mock_intent_detection.invoke.side_effect = TypeError("error de programación")
+        with pytest.raises(TypeError):
+            detect_intent("Otra cosa distinta", mode="hybrid")
+
+def test_intent_is_recorded_and_used_for_training(tmp_path):
+    """Probar que la intención del turno se guarda y sirve para reentrenar el clasificador"""
+    initialize_database()
+    with patch('src.conversation.agent.detect_intent_with_source', return_value=("OBJECTION", "llm")), \
+         patch('src.conversation.agent.extract_lead_info', side_effect=lambda text, info: info), \
+         patch('src.conversation.agent.generate_response', return_value="Respuesta simulada"):
+        agent = VoiceAgent(concurrent=False)
+        agent.start_session(lead_id=create_lead(Lead(name="Intent User", email="intent@example.com")))
+        agent.process_text_input("Las licencias anuales nos resultan carísimas")
+    
+    messages = get_conversation_messages(agent.conversation_id)
+    assert [(m.sender, m.intent) for m in messages][-2:] == [("lead", "OBJECTION"), ("agent", None)]
+    
+    conversation_id = start_conversation(agent.current_lead.id)
+    add_messages([
+        Message(conversation_id=conversation_id, sender="lead", content="las licencias anuales son carísimas", intent="OBJECTION"),
+        Message(conversation_id=conversation_id, sender="agent", content="Lo entiendo", intent=None),
+    ])
+    
+    # El mensaje del agente y el insertado a mano se suman a los ejemplos semilla
+    with patch('src.conversation.intent_classifier._classifier', None):
+        counts = train_intent_classifier(path=str(tmp_path / "intent_model.npz"))
+        assert counts["OBJECTION"] >= len(SEED_EXAMPLES["OBJECTION"]) + 2
+        assert classify_intent("licencias anuales carísimas")[0] == "OBJECTION"
+
+
+def test_fallback_intents_are_not_recorded_for_training():
+    """Probar que las intenciones de respaldo y las del clasificador local no se guardan como etiquetas"""
+    initialize_database()
+    with connection() as conn:
+        labeled = len(load_labeled_messages(conn)[0])
+    
+    def slow_intent(text):
+        time.sleep(0.3)
+        return "PRICING", "llm"
+    
+    with patch('src.conversation.agent.extract_lead_info', side_effect=lambda text, info: info), \
+         patch('src.conversation.agent.generate_response', return_value="Respuesta simulada"):
+        agent = VoiceAgent(concurrent=True, single_pass=False)
+        agent.start_session(lead_id=create_lead(Lead(name="Fallback User", email="fallback@example.com")))
+        
+        # Intención fuera de plazo: el turno sigue con "IRRELEVANT"
+        with patch('src.conversation.agent.LLM_INTENT_TIMEOUT', 0.05), \
+             patch('src.conversation.agent.detect_intent_with_source', side_effect=slow_intent):
+            agent.process_text_input("¿Cuánto costaría para veinte usuarios?")
+        assert agent.last_intent == "IRRELEVANT"
+        
+        # Predicción del propio clasificador local
+        with patch('src.conversation.intent.INTENT_CLASSIFIER_MODE', "local"):
+            agent.process_text_input("¿Cuál es la tarifa mensual?")
+        assert (agent.last_intent, agent.last_intent_source) == ("PRICING", "local")
+        
+        # Fallo de la llamada en el modo en serie: se conserva la intención anterior
+        agent.concurrent = False
+        with patch('src.conversation.agent.detect_intent_with_source',
+                   side_effect=LLMCallError("intent", TimeoutError("sin respuesta"))):
+            agent.process_text_input("¿Hay descuentos por volumen?")
+        assert agent.last_intent == "PRICING"
+    
+    messages = get_conversation_messages(agent.conversation_id)
+    assert [m.intent for m in messages if m.sender == "lead"] == [None, None, None]
+    with connection() as conn:
+        assert len(load_labeled_messages(conn)[0]) == labeled
+
+def test_backfill_batches_writes_in_bulk_and_resumes():
+    """Probar la reextracción por lotes, su punto de control y la reanudación tras un lote fallido"""
+    initialize_database()
+    first_lead = create_lead(Lead(name="Backfill A", email="backfill-a@example.com"))
+    second_lead = create_lead(Lead(name="Backfill B", email="backfill-b@example.com"))
+    conversations = {}
+    for lead_id, texts in (
+        (first_lead, ["Necesitamos un CRM para el equipo comercial", "El presupuesto es de 5.000 euros"]),
+        (second_lead, ["Queremos automatizar la facturación"]),
+        (first_lead, ["Lo necesitaríamos en dos meses"]),
+    ):
+        conversation_id = start_conversation(lead_id)
+        add_messages([Message(conversation_id=conversation_id, sender="lead", content=text) for text in texts])
+        add_messages([Message(conversation_id=conversation_id, sender="agent", content="Entendido")])
+        conversations[conversation_id] = texts
+    last_conversation = max(conversations)
+    
+    calls = []
+    def fake_batch(batch):
+        calls.append(set(batch))
+        if last_conversation in batch and len([c for c in calls if last_conversation in c]) == 1:
+            raise LLMCallError("extraction", TimeoutError("sin respuesta"))
+        results = {cid: {"necesidades": texts[0]} for cid, texts in batch.items() if cid in conversations}
+        return results, {"prompt_tokens": 100, "completion_tokens": 20}
+    
+    with patch('src.conversation.backfill.extract_entities_batch', side_effect=fake_batch):
+        stats = backfill_lead_details(batch_size=1, concurrency=2, resume=False, progress=False)
+        assert not stats["completed"] and stats["failed_batches"] == 1
+        checkpoint = get_job_checkpoint(BACKFILL_JOB, backfill_source())
+        assert max(set(conversations) - {last_conversation}) <= checkpoint < last_conversation
+        
+        # Las conversaciones agrupadas solo envían los mensajes del lead
+        assert all(len(batch) == 1 for batch in calls)
+        details = get_full_lead(first_lead).details
+        assert details.needs == "Necesitamos un CRM para el equipo comercial"
+        assert details.budget == "5.000 euros"
+        assert get_full_lead(second_lead).details.needs == "Queremos automatizar la facturación"
+        
+        # La siguiente ejecución empieza en el lote fallido y no borra lo ya extraído
+        resumed = backfill_lead_details(batch_size=1, concurrency=2, progress=False)
+    assert resumed["completed"] and resumed["resumed_from"] == checkpoint
+    assert resumed["conversations"] == 1 and resumed["prompt_tokens"] == 100
+    details = get_full_lead(first_lead).details
+    assert details.timeline == "en dos meses"
+    assert details.budget == "5.000 euros"
+    assert get_job_checkpoint(BACKFILL_JOB, backfill_source()) == 0
+
+
+def test_turn_instrumentation_exports_stages_tokens_and_cost(mock_database, tmp_path):
+    """Probar que cada turno registra sus etapas, tokens y coste en los exportadores"""
+    def respond(user_input, history, lead_info):
+        record_usage("response", "gpt-4o-mini-2024-07-18", prompt_tokens=1000, completion_tokens=200)
+        return "Respuesta simulada"
+    
+    memory = MemoryExporter(size=2)
+    prometheus = PrometheusExporter()
+    path = tmp_path / "turns.jsonl"
+    configure_monitoring(enabled=True, exporters=[memory, JsonlExporter(str(path)), prometheus])
+    try:
+        with patch('src.conversation.agent.detect_intent_with_source', return_value=("REQUIREMENTS", "llm")), \
+             patch('src.conversation.agent.extract_lead_info', side_effect=lambda text, info: info), \
+             patch('src.conversation.agent.generate_response', side_effect=respond):
+            agent = VoiceAgent()
+            agent.start_session(lead_id=1)
+            for text in ["Necesitamos un CRM", "¿Cuánto cuesta?", "Gracias"]:
+                # La voz generada fuera del agente se suma al mismo turno
+                with turn(input="text"):
+                    agent.process_text_input(text)
+                    with span("tts.synthesize"):
+                        pass
+        url = prometheus.serve(port=0)
+        metrics = httpx.get(url).text
+    finally:
+        configure_monitoring(enabled=False, exporters=[])
+    
+    # El búfer en memoria solo conserva los últimos turnos
+    turns = memory.recent()
+    assert [record["turn_id"] for record in turns] == [turns[0]["turn_id"], turns[0]["turn_id"] + 1]
+    record = turns[-1]
+    assert record["input"] == "text" and record["intent"] == "REQUIREMENTS"
+    assert {"stage.intent", "stage.extraction", "stage.database", "stage.response", "db.flush", "tts.synthesize"} <= set(record["stages"])
+    assert record["prompt_tokens"] == 1000 and record["completion_tokens"] == 200
+    assert record["cost"] == pytest.approx((1000 * 0.15 + 200 * 0.6) / 1_000_000)
+    assert record["duration"] >= record["stages"]["stage.response"]
+    
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 3 and json.loads(lines[-1])["turn_id"] == record["turn_id"]
+    assert "agent_turns_total 3" in metrics
+    assert 'agent_span_duration_seconds_count{span="stage.response"} 3' in metrics
+    assert 'llm_tokens_total{call_type="response",model="gpt-4o-mini-2024-07-18",direction="prompt"} 3000' in metrics
+    
+    # Desactivada, la instrumentación no registra nada
+    with patch('src.conversation.agent.detect_intent_with_source', return_value=("INQUIRY", "llm")), \
+         patch('src.conversation.agent.extract_lead_info', side_effect=lambda text, info: info), \
+         patch('src.conversation.agent.generate_response', side_effect=respond):
+        agent.process_text_input("Otra pregunta")
+    assert memory.recent() == turns
@@ -1,22 +1,44 @@
 import sys
 import os
+import json
 import pytest
+import asyncio
+import sqlite3
+import threading
 from datetime import datetime
 
 # Asegurar que la raíz del proyecto esté en el path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from src.database import async_repository
+from src.database.archive import archive_conversations
+from src.database.cache import lead_cache
+from src.database.bulk import import_leads, export_leads, import_source, IMPORT_JOB
+from src.database.connection import ConnectionManager, configure_database, get_connection_manager, snapshot_database
+from src.database.migrations import MIGRATIONS, apply_migrations, get_schema_version
 from src.database.models import Lead, LeadDetails, Conversation, Message
 from src.database.repository import (
     initialize_database,
     create_lead,
     update_lead_details,
+    update_lead_details_many,
     get_lead_by_id,
     get_lead_by_email,
     start_conversation,
     end_conversation,
     add_message,
-    get_conversation_messages
+    add_messages,
+    get_conversation_messages,
+    get_lead_cache_stats,
+    get_full_lead,
+    get_full_leads,
+    iter_conversation_messages,
+    search_messages,
+    get_stats_overview,
+    get_product_interest_counts,
+    get_conversation_stats,
+    set_job_checkpoint,
+    get_db_connection
 )
 
 # Configurar para usar una base de datos en memoria para las pruebas
@@ -171,4 +193,422 @@ def test_conversation_flow(setup_database):
     end_conversation(conversation_id)
     
     # En una aplicación real, verificaríamos que ended_at se ha establecido
-    assert True
\ No newline at end of file
+    assert True
+
+def test_add_messages_batch(setup_database):
+    """Probar la inserción de varios mensajes en una transacción"""
+    lead_id = create_lead(Lead(name="Test User", email="batch@example.com"))
+    conversation_id = start_conversation(lead_id)
+    
+    messages = [
+        Message(conversation_id=conversation_id, sender="agent", content="Hola"),
+        Message(conversation_id=conversation_id, sender="lead", content="Buenas"),
+        Message(conversation_id=conversation_id, sender="agent", content="¿En qué puedo ayudarte?"),
+    ]
+    
+    assert add_messages(messages) == 3
+    assert add_messages([]) == 0
+    
+    stored = get_conversation_messages(conversation_id)
+    assert [message.content for message in stored] == ["Hola", "Buenas", "¿En qué puedo ayudarte?"]
+
+
+def test_iter_conversation_messages_pagination(setup_database):
+    """Probar el recorrido paginado por clave de los mensajes"""
+    lead_id = create_lead(Lead(name="Test User", email="pages@example.com"))
+    conversation_id = start_conversation(lead_id)
+    add_messages([
+        Message(conversation_id=conversation_id, sender="lead", content=f"Mensaje {i}")
+        for i in range(7)
+    ])
+    
+    # Recorrer en páginas de 3 devuelve todos los mensajes en orden
+    contents = [message.content for message in iter_conversation_messages(conversation_id, page_size=3)]
+    assert contents == [f"Mensaje {i}" for i in range(7)]
+    
+    # Continuar a partir de un ID concreto con un límite
+    first_page = get_conversation_messages(conversation_id, limit=2)
+    next_page = get_conversation_messages(conversation_id, after_id=first_page[-1].id, limit=2)
+    assert [message.content for message in next_page] == ["Mensaje 2", "Mensaje 3"]
+    assert isinstance(next_page[0].timestamp, datetime)
+
+
+def test_lead_cache_hits_and_isolation(setup_database):
+    """Probar la caché de leads: aciertos, copias independientes e invalidación"""
+    lead_id = create_lead(Lead(name="Cached User", email="cached@example.com"))
+    
+    first = get_lead_by_id(lead_id)
+    hits_before = get_lead_cache_stats()["by_id"]["hits"]
+    second = get_lead_by_email("cached@example.com")
+    
+    # La segunda lectura se sirve desde la caché
+    assert get_lead_cache_stats()["by_id"]["hits"] == hits_before + 1
+    assert second.id == lead_id
+    
+    # Modificar el objeto devuelto no altera la versión en caché
+    first.name = "Modificado por otro agente"
+    assert get_lead_by_id(lead_id).name == "Cached User"
+    
+    # Actualizar los detalles invalida la entrada del lead
+    update_lead_details(LeadDetails(lead_id=lead_id, budget="5000"))
+    misses_before = get_lead_cache_stats()["by_id"]["misses"]
+    get_lead_by_id(lead_id)
+    assert get_lead_cache_stats()["by_id"]["misses"] == misses_before + 1
+
+
+def test_get_full_leads(setup_database):
+    """Probar la carga de leads completos con detalles, conversaciones y estadísticas"""
+    lead_id = create_lead(Lead(name="Full User", email="full@example.com"))
+    other_id = create_lead(Lead(name="Other User", email="other@example.com"))
+    update_lead_details(LeadDetails(lead_id=lead_id, budget="10000", product_interest="CRM"))
+    
+    first_conversation = start_conversation(lead_id)
+    add_messages([
+        Message(conversation_id=first_conversation, sender="agent", content="Hola"),
+        Message(conversation_id=first_conversation, sender="lead", content="Hola, busco un CRM"),
+    ])
+    start_conversation(lead_id)
+    
+    full_leads = get_full_leads([other_id, lead_id, 999999], include_stats=True)
+    
+    # Se respeta el orden pedido y se omiten los IDs inexistentes
+    assert [full.lead.id for full in full_leads] == [other_id, lead_id]
+    other, full = full_leads
+    assert other.details is None
+    assert other.conversations == []
+    
+    assert full.details.budget == "10000"
+    assert [c.message_count for c in full.conversations] == [2, 0]
+    assert full.conversations[0].last_activity_at is not None
+    
+    # Las estadísticas se conservan al serializar
+    dumped = json.loads(full.model_dump_json())
+    assert [c["message_count"] for c in dumped["conversations"]] == [2, 0]
+    assert dumped["conversations"][0]["last_activity_at"] is not None
+    assert "message_count" not in get_full_lead(lead_id).model_dump()["conversations"][0]
+    
+    assert get_full_lead(lead_id).lead.name == "Full User"
+
+
+def test_archived_conversation_is_read_transparently(setup_database):
+    """Probar que los mensajes archivados se leen igual que los activos"""
+    lead_id = create_lead(Lead(name="Archived User", email="archived@example.com"))
+    conversation_id = start_conversation(lead_id)
+    add_messages([
+        Message(conversation_id=conversation_id, sender="agent" if i % 2 == 0 else "lead", content=f"Mensaje {i}")
+        for i in range(5)
+    ])
+    end_conversation(conversation_id)
+    live = get_conversation_messages(conversation_id)
+    
+    # Simular una conversación finalizada hace tiempo y archivarla
+    conn = get_db_connection()
+    conn.execute("UPDATE conversations SET ended_at = '2000-01-01 00:00:00' WHERE id = ?", (conversation_id,))
+    conn.commit()
+    stats = archive_conversations(older_than_days=30)
+    
+    assert stats["messages"] >= 5
+    remaining = conn.execute("SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (conversation_id,)).fetchone()[0]
+    assert remaining == 0
+    
+    archived = get_conversation_messages(conversation_id)
+    assert [(m.id, m.sender, m.content, m.timestamp) for m in archived] == \
+        [(m.id, m.sender, m.content, m.timestamp) for m in live]
+    assert [m.content for m in get_conversation_messages(conversation_id, after_id=live[2].id, limit=1)] == ["Mensaje 3"]
+    assert get_full_lead(lead_id, include_stats=True).conversations[0].message_count == 5
+    
+    # Cada lectura devuelve mensajes nuevos aunque el archivo esté en caché
+    archived[0].content = "modificado"
+    assert get_conversation_messages(conversation_id)[0].content == "Mensaje 0"
+    
+    # Al cambiar de base de datos no se devuelven los mensajes archivados de la anterior
+    configure_database(":memory:")
+    initialize_database()
+    assert get_conversation_messages(conversation_id) == []
+
+
+def test_search_messages(setup_database):
+    """Probar la búsqueda de texto completo sobre los mensajes"""
+    lead_id = create_lead(Lead(name="Search User", email="search@example.com"))
+    other_id = create_lead(Lead(name="Other Search", email="other-search@example.com"))
+    conversation_id = start_conversation(lead_id)
+    other_conversation = start_conversation(other_id)
+    add_messages([
+        Message(conversation_id=conversation_id, sender="lead", content="Ahora usamos Pipedrive pero es caro"),
+        Message(conversation_id=conversation_id, sender="agent", content="¿Qué echas en falta de tu herramienta?"),
+        Message(conversation_id=other_conversation, sender="lead", content="Pipedrive no nos convence"),
+    ])
+    
+    hits = search_messages("pipedrive")
+    assert {hit.lead_id for hit in hits} >= {lead_id, other_id}
+    
+    # Filtro por lead, términos combinados y sin distinguir tildes ni mayúsculas
+    hits = search_messages("PIPEDRIVE caro", lead_id=lead_id)
+    assert [hit.conversation_id for hit in hits] == [conversation_id]
+    assert "[Pipedrive]" in hits[0].snippet
+    assert search_messages("que echas", lead_id=lead_id)[0].sender == "agent"
+    
+    # La sintaxis de FTS5 en el texto del usuario no provoca errores
+    assert search_messages('pipedrive" OR "') == []
+
+
+def test_search_includes_archived_conversations(setup_database):
+    """Probar que los mensajes de conversaciones archivadas siguen siendo buscables"""
+    lead_id = create_lead(Lead(name="Archived Search", email="archived-search@example.com"))
+    conversation_id = start_conversation(lead_id)
+    add_messages([
+        Message(conversation_id=conversation_id, sender="agent", content="¿Qué herramienta usáis ahora?"),
+        Message(conversation_id=conversation_id, sender="lead", content="Usamos Zohocrm desde hace años y nos parece caro"),
+    ])
+    end_conversation(conversation_id)
+    conn = get_db_connection()
+    conn.execute("UPDATE conversations SET ended_at = '2000-01-01 00:00:00' WHERE id = ?", (conversation_id,))
+    conn.commit()
+    archive_conversations(older_than_days=30)
+    
+    hits = search_messages("zohocrm CARO", lead_id=lead_id)
+    assert [(hit.conversation_id, hit.sender) for hit in hits] == [(conversation_id, "lead")]
+    assert hits[0].content == "Usamos Zohocrm desde hace años y nos parece caro"
+    assert "[Zohocrm]" in hits[0].snippet and "[caro]" in hits[0].snippet
+    assert search_messages("herramienta usais", lead_id=lead_id)[0].sender == "agent"
+    assert search_messages("zohocrm", since=datetime(2100, 1, 1)) == []
+    
+    # Los archivos anteriores al índice se indexan al inicializar la base de datos
+    conn.execute("DELETE FROM archived_messages_index")
+    conn.execute("INSERT INTO archived_messages_fts(archived_messages_fts) VALUES ('delete-all')")
+    conn.commit()
+    assert search_messages("zohocrm", lead_id=lead_id) == []
+    initialize_database()
+    assert [hit.message_id for hit in search_messages("zohocrm", lead_id=lead_id)] == [hits[0].message_id]
+
+
+def test_incremental_statistics(setup_database):
+    """Probar que las tablas de estadísticas se mantienen al escribir"""
+    before = get_stats_overview()
+    interest_before = get_product_interest_counts().get("Stats CRM", 0)
+    
+    lead_id = create_lead(Lead(name="Stats User", email="stats@example.com"))
+    update_lead_details(LeadDetails(lead_id=lead_id, budget="5000", product_interest="Stats CRM"))
+    update_lead_details(LeadDetails(lead_id=lead_id, budget="5000", timeline="1 mes", product_interest="Stats CRM"))
+    
+    conversation_id = start_conversation(lead_id)
+    add_message(Message(conversation_id=conversation_id, sender="agent", content="Hola"))
+    add_messages([
+        Message(conversation_id=conversation_id, sender="lead", content="Busco un CRM"),
+        Message(conversation_id=conversation_id, sender="agent", content="Perfecto"),
+    ])
+    end_conversation(conversation_id)
+    
+    after = get_stats_overview()
+    assert after["leads"] == before["leads"] + 1
+    assert after["leads_with_details"] == before["leads_with_details"] + 1
+    assert after["conversations"] == before["conversations"] + 1
+    assert after["ended_conversations"] == before["ended_conversations"] + 1
+    assert after["messages"] == before["messages"] + 3
+    assert get_product_interest_counts()["Stats CRM"] == interest_before + 1
+    
+    stats = get_conversation_stats(conversation_id)
+    assert (stats.lead_id, stats.message_count, stats.lead_message_count, stats.agent_message_count) == (lead_id, 3, 1, 2)
+    assert stats.ended_at is not None and stats.duration_seconds >= 0
+    
+    # Los contadores coinciden con un recálculo completo
+    conn = get_db_connection()
+    assert after["leads"] == conn.execute("SELECT COUNT(*) FROM leads").fetchone()[0]
+    timeline_filled = conn.execute("SELECT COUNT(*) FROM lead_details WHERE timeline <> ''").fetchone()[0]
+    assert after["completion_rates"]["timeline"] == pytest.approx(timeline_filled / after["leads_with_details"])
+    
+    # Archivar la conversación no altera las estadísticas
+    conn.execute("UPDATE conversations SET ended_at = '2000-01-01 00:00:00' WHERE id = ?", (conversation_id,))
+    conn.commit()
+    archive_conversations(older_than_days=30)
+    assert get_conversation_stats(conversation_id).message_count == 3
+    assert get_stats_overview()["messages"] == after["messages"]
+
+
+def test_update_lead_details_upsert(setup_database):
+    """Probar que los detalles de un lead se actualizan sin duplicarse"""
+    lead_id = create_lead(Lead(name="Test User", email="upsert@example.com"))
+    
+    update_lead_details(LeadDetails(lead_id=lead_id, budget="10000"))
+    update_lead_details(LeadDetails(lead_id=lead_id, budget="20000", timeline="3 months"))
+    
+    rows = get_db_connection().execute(
+        "SELECT budget, timeline FROM lead_details WHERE lead_id = ?", (lead_id,)
+    ).fetchall()
+    assert len(rows) == 1
+    assert rows[0]["budget"] == "20000"
+    assert rows[0]["timeline"] == "3 months"
+
+
+def test_update_lead_details_many(setup_database):
+    """Probar la actualización en bloque de detalles sin borrar los valores no extraídos"""
+    first_id = create_lead(Lead(name="Bulk A", email="bulk-a@example.com"))
+    second_id = create_lead(Lead(name="Bulk B", email="bulk-b@example.com"))
+    update_lead_details(LeadDetails(lead_id=first_id, budget="10000", needs="CRM"))
+    
+    assert update_lead_details_many([
+        LeadDetails(lead_id=first_id, needs="CRM y ERP"),
+        LeadDetails(lead_id=second_id, timeline="3 meses"),
+    ]) == 2
+    assert get_full_lead(first_id).details.budget == "10000"
+    assert get_full_lead(first_id).details.needs == "CRM y ERP"
+    assert get_full_lead(second_id).details.timeline == "3 meses"
+    
+    update_lead_details_many([LeadDetails(lead_id=first_id, needs="ERP")], keep_existing=False)
+    assert get_full_lead(first_id).details.budget is None
+
+
+def test_migrations_are_idempotent(setup_database):
+    """Probar que las migraciones se aplican una sola vez"""
+    conn = get_db_connection()
+    
+    # initialize_database ya aplicó todas las migraciones
+    assert get_schema_version(conn) == MIGRATIONS[-1][0]
+    assert apply_migrations(conn) == []
+    
+    # Los índices esperados existen
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_messages_conversation", "idx_leads_email", "idx_lead_details_lead"} <= indexes
+
+
+def test_async_repository_conversation_flow():
+    """Probar el flujo de conversación con la API asíncrona"""
+    async def flow():
+        await async_repository.initialize_database()
+        lead_id = await async_repository.create_lead(Lead(name="Async User", email="async@example.com"))
+        conversation_id = await async_repository.start_conversation(lead_id)
+        
+        # Varias escrituras concurrentes se serializan en el hilo de base de datos
+        await asyncio.gather(*[
+            async_repository.add_message(
+                Message(conversation_id=conversation_id, sender="lead", content=f"Mensaje {i}")
+            )
+            for i in range(5)
+        ])
+        lead = await async_repository.get_lead_by_email("async@example.com")
+        messages = await async_repository.get_conversation_messages(conversation_id)
+        return lead, messages
+    
+    lead, messages = asyncio.run(flow())
+    
+    assert lead.name == "Async User"
+    assert len(messages) == 5
+
+
+def test_bulk_import_deduplicates_and_resumes(setup_database, tmp_path):
+    """Probar la importación masiva con duplicados y reanudación"""
+    source = tmp_path / "leads.csv"
+    source.write_text(
+        "name,company,email,budget\n"
+        "Ana,Acme,ana@bulk.com,1000\n"
+        "Ana Duplicada,Acme,ANA@bulk.com,\n"
+        "Luis,Beta,luis@bulk.com,\n"
+        ",,,\n"
+        "Marta,Gamma,marta@bulk.com,3000\n",
+        encoding="utf-8"
+    )
+    
+    # Simular una importación interrumpida tras los dos primeros registros
+    import_leads(str(source), chunk_size=2, progress=False)
+    set_job_checkpoint(IMPORT_JOB, import_source(str(source)), 2)
+    
+    stats = import_leads(str(source), chunk_size=2, progress=False)
+    
+    # La reanudación empieza tras el punto de control y no duplica leads existentes
+    assert stats["resumed_from"] == 2
+    assert stats["inserted"] == 0
+    assert stats["invalid"] == 1
+    assert get_lead_by_email("ana@bulk.com").name == "Ana"
+    
+    exported = tmp_path / "leads.jsonl"
+    export_leads(str(exported), progress=False)
+    emails = [line for line in exported.read_text(encoding="utf-8").splitlines() if "@bulk.com" in line]
+    assert len(emails) == 3
+    
+    # Un punto de control de una versión anterior del fichero no se aplica
+    set_job_checkpoint(IMPORT_JOB, import_source(str(source)), 4)
+    source.write_text("name,email\nNuria,nuria@bulk.com\n", encoding="utf-8")
+    stats = import_leads(str(source), progress=False)
+    assert stats["resumed_from"] == 0 and stats["inserted"] == 1
+
+
+def test_bulk_import_deduplicates_emails_ignoring_case(setup_database, tmp_path):
+    """Probar que la importación no duplica leads cuyo email solo difiere en mayúsculas"""
+    create_lead(Lead(name="Ana", email="Ana@Mixed.com"))
+    source = tmp_path / "mixed.csv"
+    source.write_text(
+        "name,email\n"
+        "Ana Importada,ana@mixed.com\n"
+        "Pablo,Pablo@Mixed.com\n"
+        "Pablo Duplicado,PABLO@mixed.com\n",
+        encoding="utf-8"
+    )
+    
+    stats = import_leads(str(source), progress=False)
+    
+    assert stats["inserted"] == 1 and stats["duplicates"] == 2
+    conn = get_db_connection()
+    assert conn.execute("SELECT COUNT(*) FROM leads WHERE lower(email) = 'ana@mixed.com'").fetchone()[0] == 1
+    # El email importado conserva su escritura original
+    assert get_lead_by_email("Pablo@Mixed.com").name == "Pablo"
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT email FROM leads WHERE lower(email) IN ('x')").fetchall()
+    assert "idx_leads_email_lower" in " ".join(row[-1] for row in plan)
+
+
+def test_in_memory_database_is_shared_across_threads(setup_database, tmp_path):
+    """Probar que la base de datos en memoria persiste entre llamadas e hilos"""
+    assert get_connection_manager().in_memory
+    lead_id = create_lead(Lead(name="Memory User", email="memory@example.com"))
+    
+    # Otro hilo ve el esquema y los datos escritos desde este hilo
+    lead_cache.clear()
+    found = []
+    thread = threading.Thread(target=lambda: found.append(get_lead_by_id(lead_id)))
+    thread.start()
+    thread.join()
+    assert found[0].name == "Memory User"
+    
+    # El volcado a disco contiene los datos de la base en memoria
+    snapshot_path = tmp_path / "snapshot.db"
+    snapshot_database(str(snapshot_path))
+    snapshot = sqlite3.connect(str(snapshot_path))
+    assert snapshot.execute("SELECT name FROM leads WHERE id = ?", (lead_id,)).fetchone()[0] == "Memory User"
+    snapshot.close()
+
+
+def test_connection_manager_reuses_thread_connection(tmp_path):
+    """Probar que cada hilo reutiliza su propia conexión persistente"""
+    manager = ConnectionManager(str(tmp_path / "test.db"))
+
+    # La misma conexión se reutiliza dentro del hilo
+    assert manager.get_connection() is manager.get_connection()
+
+    # Otro hilo obtiene una conexión distinta
+    other = []
+    thread = threading.Thread(target=lambda: other.append(manager.get_connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not manager.get_connection()
+
+    # El modo WAL queda activado en bases de datos en disco
+    journal_mode = manager.get_connection().execute("PRAGMA journal_mode").fetchone()[0]
+    assert journal_mode == "wal"
+
+    manager.close_all()
+
+
+def test_connection_manager_transaction_rollback(tmp_path):
+    """Probar que una transacción fallida se revierte"""
+    manager = ConnectionManager(str(tmp_path / "test.db"))
+    with manager.transaction() as conn:
+        conn.execute("CREATE TABLE items (value TEXT)")
+
+    with pytest.raises(RuntimeError):
+        with manager.transaction() as conn:
+            conn.execute("INSERT INTO items (value) VALUES ('a')")
+            raise RuntimeError("fallo simulado")
+
+    count = manager.get_connection().execute("SELECT COUNT(*) FROM items").fetchone()[0]
+    assert count == 0
+
+    manager.close_all()
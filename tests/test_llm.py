@@ -1,13 +1,51 @@
 import sys
 import os
+import asyncio
+import json
+import subprocess
+import time
+import httpx
+import openai
 import pytest
 from unittest.mock import patch, MagicMock
 
 # Asegurar que la raíz del proyecto esté en el path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.llm.model import generate_response, extract_entities
+from src.conversation.intent import detect_intent
+from src.llm.model import generate_response, stream_response, extract_entities, analyze_turn, TurnAnalysis
 from src.llm.prompt_templates import SYSTEM_PROMPT, USER_PROMPT_TEMPLATE
+from src.llm.cache import ResponseCache, cached_invoke, configure_response_cache
+from src.llm.history import ConversationHistory, SUMMARY_PREFIX
+from src.llm.clients import LazyClient, get_chat_model, get_openai_client, reset_clients
+from src.llm.transport import (
+    configure_http_transport,
+    get_transport_stats,
+    get_http_client,
+    get_async_http_client,
+    close_http_clients
+)
+from src.llm.cassette import use_cassette
+from src.llm.fake_server import FakeOpenAIServer
+from src.llm.policy import (
+    CallPolicy,
+    LLMCallError,
+    call_with_policy,
+    turn_deadline,
+    get_call_stats,
+    reset_call_stats,
+    record_llm_usage
+)
+from src.monitoring import configure_monitoring, turn, MemoryExporter
+from langchain.schema import HumanMessage, AIMessage
+
+
+@pytest.fixture(autouse=True)
+def fresh_clients():
+    """Fixture para que cada prueba cree sus propios clientes (y use los mocks de LangChain)"""
+    reset_clients()
+    yield
+    reset_clients()
 
 
 @pytest.fixture
@@ -112,4 +150,406 @@ def test_extract_entities_malformed_response(mock_openai_response):
     entities = extract_entities(user_input, existing_info)
     
     # Verificar que se devuelva un diccionario vacío en caso de error
-    assert entities == {}
\ No newline at end of file
+    assert entities == {}
+
+
+def test_analyze_turn_structured_output():
+    """Probar el análisis combinado del turno y el manejo de errores de validación"""
+    with patch('src.llm.model.llm') as mock_llm:
+        structured = mock_llm.with_structured_output.return_value
+        structured.invoke.return_value = {
+            "raw": MagicMock(),
+            "parsed": TurnAnalysis(intent="pricing", lead_info={"budget": "10000"}, reply="¿Qué plazos manejáis?"),
+            "parsing_error": None
+        }
+        
+        analysis = analyze_turn("Tenemos 10000 euros", [], {}, {"PRICING": "Precios", "IRRELEVANT": "Otro"})
+        
+        # La intención se normaliza y los campos se validan en el modelo tipado
+        assert analysis.intent == "PRICING"
+        assert analysis.lead_info.budget == "10000"
+        assert analysis.reply == "¿Qué plazos manejáis?"
+        
+        # Una respuesta que no valida devuelve None para recurrir a las tres llamadas
+        structured.invoke.return_value = {"raw": MagicMock(), "parsed": None, "parsing_error": ValueError("JSON inválido")}
+        assert analyze_turn("Hola", [], {}, {}) is None
+
+
+@pytest.fixture
+def response_cache(tmp_path):
+    """Fixture para activar la caché de respuestas con un fichero SQLite temporal"""
+    path = str(tmp_path / "llm_cache.db")
+    cache = configure_response_cache(calls=["intent", "extraction"], path=path, max_rows=2)
+    yield cache, path
+    configure_response_cache()
+
+
+def test_response_cache_tiers(response_cache):
+    """Probar la caché de respuestas en memoria y en SQLite"""
+    cache, path = response_cache
+    model = MagicMock(model_name="gpt-test", temperature=0.3)
+    model.invoke.return_value = MagicMock(content="GREETING")
+    
+    # Entradas casi idénticas comparten la respuesta
+    assert cached_invoke("intent", model, [HumanMessage(content="Sí.")]) == "GREETING"
+    assert cached_invoke("intent", model, [HumanMessage(content="  sí ")]) == "GREETING"
+    assert model.invoke.call_count == 1
+    assert cache.stats()["hit_rate"] == 0.5
+    
+    # Otro proceso con el mismo fichero reutiliza la respuesta
+    other = ResponseCache(calls=["intent"], path=path)
+    key = other.make_key("intent", model, [HumanMessage(content="si")])
+    assert other.get(other.make_key("intent", model, [HumanMessage(content="sí")])) == "GREETING"
+    assert other.get(key) is None
+    assert other.stats()["store"]["hits"] == 1
+    
+    # Las llamadas sin caché activada siempre llegan al modelo
+    cached_invoke("response", model, [HumanMessage(content="Sí.")])
+    cached_invoke("response", model, [HumanMessage(content="Sí.")])
+    assert model.invoke.call_count == 3
+    
+    # El nivel SQLite conserva solo las entradas usadas más recientemente
+    for text in ("uno", "dos", "tres"):
+        cached_invoke("extraction", model, [HumanMessage(content=text)])
+    assert cache.purge() == 2
+    assert other.get(other.make_key("extraction", model, [HumanMessage(content="tres")])) == "GREETING"
+
+def test_response_cache_normalizes_user_text_in_prompts(response_cache):
+    """Probar que las entradas casi idénticas comparten clave dentro de los prompts reales"""
+    cache, path = response_cache
+    with patch('src.conversation.intent.intent_model') as intent_model:
+        intent_model.model_name = "gpt-test"
+        intent_model.temperature = 0.1
+        intent_model.invoke.return_value = MagicMock(content="GREETING")
+        
+        # El texto va entre comillas en la plantilla y también cambia de mayúsculas y puntuación
+        for text in ("Sí.", "  sí ", "SÍ!", "No.", "no", "Gracias.", "gracias"):
+            assert detect_intent(text, mode="llm") == "GREETING"
+        assert intent_model.invoke.call_count == 3
+        
+        # El modelo recibe el texto original del usuario
+        assert '"Sí."' in intent_model.invoke.call_args_list[0][0][0][-1].content
+    
+    with patch('src.llm.model.llm') as llm:
+        llm.model_name = "gpt-test"
+        llm.temperature = 0.3
+        llm.invoke.return_value = MagicMock(content='{"name": "Ana"}')
+        
+        assert extract_entities("Soy Ana.", {}) == {"name": "Ana"}
+        assert extract_entities("soy ana", {}) == {"name": "Ana"}
+        assert llm.invoke.call_count == 1
+        
+        # La información existente del lead forma parte de la clave
+        extract_entities("soy ana", {"company": "Acme"})
+        assert llm.invoke.call_count == 2
+
+def test_response_cache_batches_access_times(tmp_path):
+    """Probar que los aciertos en SQLite no escriben y que sus usos cuentan al purgar"""
+    path = str(tmp_path / "llm_cache.db")
+    writer = ResponseCache(calls=["intent"], path=path, max_rows=2)
+    for key in ("a", "b", "c"):
+        writer.set(key, key.upper())
+        time.sleep(0.01)
+    
+    # Los aciertos solo leen: el instante de uso queda pendiente en memoria
+    reader = ResponseCache(calls=["intent"], max_size=1, path=path, max_rows=2)
+    statements = []
+    reader.store.get_connection().set_trace_callback(statements.append)
+    assert reader.get("a") == "A"
+    assert reader.get("b") == "B"
+    assert reader.get("a") == "A"
+    assert not [sql for sql in statements if sql.lstrip().upper().startswith("UPDATE")]
+    
+    # Al purgar se escriben los usos pendientes y se conservan las entradas usadas
+    assert reader.purge() == 1
+    assert reader.get("c") is None
+    assert reader.get("a") == "A"
+
+def test_conversation_history_token_budget():
+    """Probar que el historial respeta el presupuesto y resume los mensajes antiguos"""
+    summarizer_calls = []
+    
+    def summarizer(summary, transcript, max_words):
+        summarizer_calls.append(transcript)
+        return f"resumen {len(summarizer_calls)}"
+    
+    with patch('src.llm.history.count_tokens', side_effect=lambda text: len(text.split())):
+        # Sin resumen, los mensajes que no caben se omiten pero el último siempre se incluye
+        history = ConversationHistory(max_tokens=20, keep_messages=2, summarize=False)
+        for i in range(10):
+            history.append("lead" if i % 2 else "agent", f"mensaje número {i}")
+        formatted = history.format()
+        assert len(formatted.split()) <= 20
+        assert formatted.endswith("Lead: mensaje número 9")
+        assert "mensaje número 0" not in formatted
+        
+        # Con resumen, los mensajes antiguos se sustituyen en segundo plano
+        history = ConversationHistory(max_tokens=20, keep_messages=2, summarizer=summarizer)
+        for i in range(10):
+            history.append("lead" if i % 2 else "agent", f"mensaje número {i}")
+            history.wait(5)
+        formatted = history.format()
+        assert formatted.startswith(SUMMARY_PREFIX + "resumen")
+        assert formatted.endswith("Lead: mensaje número 9")
+        assert history.summaries == len(summarizer_calls) >= 1
+        assert "Agente: mensaje número 0" in summarizer_calls[0]
+        
+        history.clear()
+        assert history.format() == "" and len(history) == 0
+
+def test_generate_response_uses_budgeted_history():
+    """Probar que generate_response usa el historial limitado en lugar de la conversación completa"""
+    history = ConversationHistory(max_tokens=50, summarize=False)
+    for i in range(100):
+        history.append("lead", f"Mensaje largo número {i} con bastante contenido")
+    
+    with patch('src.llm.model.llm') as mock_llm:
+        mock_llm.invoke.return_value = MagicMock(content="Respuesta")
+        assert generate_response("Hola", history, {}) == "Respuesta"
+        prompt = mock_llm.invoke.call_args[0][0][1].content
+    
+    assert "número 99" in prompt
+    assert "número 0 " not in prompt
+
+# Tiempo máximo para importar el paquete sin crear clientes (antes rondaba 1,8 s)
+IMPORT_TIME_BUDGET = 1.0
+
+def test_package_import_is_lazy(tmp_path):
+    """Probar que importar el paquete no carga LangChain ni OpenAI ni crea directorios"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    env["PYTHONPATH"] = root
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.conversation, src.voice"],
+        cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    
+    # Cada línea: "import time: propio | acumulado | módulo"
+    imports = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, module = line.split("|")
+            if cumulative.strip().isdigit():
+                imports[module.strip()] = int(cumulative)
+    
+    assert "src.conversation" in imports
+    assert not {"langchain_openai", "langchain_core", "openai"} & set(imports)
+    assert os.listdir(tmp_path) == []
+    total = (imports["src.conversation"] + imports.get("src.voice", 0)) / 1e6
+    assert total < IMPORT_TIME_BUDGET, f"Importar el paquete tarda {total:.2f} s"
+
+def test_lazy_client_is_created_once():
+    """Probar que los clientes se crean en el primer uso y se comparten"""
+    with patch('src.llm.clients._clients', {}), \
+         patch('langchain_openai.ChatOpenAI') as mock_chat:
+        client = LazyClient(get_chat_model, 0.1)
+        mock_chat.assert_not_called()
+        
+        client.invoke("hola")
+        client.invoke("adiós")
+        assert get_chat_model(0.1) is client.get()
+        mock_chat.assert_called_once()
+        assert mock_chat.call_args.kwargs["temperature"] == 0.1
+        assert client.get().invoke.call_count == 2
+
+@pytest.fixture
+def local_openai_server():
+    """Fixture que levanta el servidor local compatible con OpenAI"""
+    server = FakeOpenAIServer(replies={"response": "INQUIRY"})
+    server.start()
+    configure_http_transport()
+    with patch('src.llm.clients.OPENAI_API_KEY', "sk-local"):
+        yield server
+    server.stop()
+    configure_http_transport()
+
+def test_shared_transport_reuses_connections(local_openai_server):
+    """Probar que el chat y el cliente de OpenAI comparten las conexiones tras el calentamiento"""
+    chat = get_chat_model(0.3, base_url=local_openai_server.base_url)
+    intent = get_chat_model(0.0, base_url=local_openai_server.base_url)
+    openai_client = get_openai_client(base_url=local_openai_server.base_url)
+    
+    # Calentamiento: la primera llamada abre la conexión
+    assert chat.invoke("hola").content == "INQUIRY"
+    warm = get_transport_stats()
+    assert warm["connections"] == 1
+    
+    for _ in range(5):
+        chat.invoke("¿qué ofrecéis?")
+        intent.invoke("¿qué ofrecéis?")
+        openai_client.chat.completions.create(model="local", messages=[{"role": "user", "content": "hola"}])
+    
+    stats = get_transport_stats()
+    assert stats["requests"] == 16
+    assert stats["connections"] == 1
+    assert local_openai_server.stats()["connections"] == 1
+    assert stats["reuse_rate"] == pytest.approx(15 / 16)
+
+def test_transport_closes_async_client(local_openai_server):
+    """Probar que al sustituir o cerrar el transporte se cierran también los clientes asíncronos"""
+    chat = get_chat_model(0.3, base_url=local_openai_server.base_url)
+    asyncio.run(chat.ainvoke("hola"))
+    client, async_client = get_http_client(), get_async_http_client()
+    
+    # Sin bucle de eventos en marcha, el cierre se ejecuta en uno temporal
+    configure_http_transport()
+    assert client.is_closed and async_client.is_closed
+    
+    # Dentro de un bucle, el cierre se programa como una tarea de ese bucle
+    async def replace_inside_loop():
+        async_client = get_async_http_client()
+        await get_chat_model(0.3, base_url=local_openai_server.base_url).ainvoke("hola")
+        configure_http_transport()
+        await asyncio.sleep(0.05)
+        return async_client
+    assert asyncio.run(replace_inside_loop()).is_closed
+    
+    # Al terminar el proceso se cierran ambos clientes
+    client, async_client = get_http_client(), get_async_http_client()
+    close_http_clients()
+    assert client.is_closed and async_client.is_closed
+
+@pytest.fixture
+def test_policy():
+    """Fixture que registra una política de prueba sin esperas entre intentos"""
+    reset_call_stats()
+    policy = CallPolicy(timeout=1.0, max_attempts=3, backoff=0.001, max_backoff=0.001)
+    with patch.dict('src.llm.policy.POLICIES', {"test": policy}):
+        yield policy
+
+def test_call_policy_retries_only_retryable_errors(test_policy):
+    """Probar los reintentos ante errores recuperables y el fallo inmediato ante los demás"""
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    outcomes = [openai.APITimeoutError(request), openai.APIConnectionError(request=request), "ok"]
+    
+    def flaky(timeout):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    
+    assert call_with_policy("test", flaky) == "ok"
+    assert get_call_stats()["test"]["retries"] == 2
+    
+    # Un 400 no se reintenta
+    bad_request = openai.BadRequestError("petición no válida", response=httpx.Response(400, request=request), body=None)
+    attempts = []
+    def invalid(timeout):
+        attempts.append(timeout)
+        raise bad_request
+    with pytest.raises(LLMCallError) as error:
+        call_with_policy("test", invalid)
+    assert error.value.error is bad_request
+    assert len(attempts) == 1
+    
+    # Los errores de programación se propagan sin envolver
+    with pytest.raises(KeyError):
+        call_with_policy("test", lambda timeout: {}["falta"])
+
+def test_call_policy_respects_turn_deadline(test_policy):
+    """Probar que el plazo del turno recorta el tiempo de cada intento y corta los reintentos"""
+    timeouts = []
+    
+    def slow(timeout):
+        timeouts.append(timeout)
+        time.sleep(timeout)
+        raise TimeoutError("sin respuesta")
+    
+    start = time.monotonic()
+    with turn_deadline(0.2):
+        with pytest.raises(LLMCallError):
+            call_with_policy("test", slow)
+    assert time.monotonic() - start < 0.5
+    assert timeouts and all(timeout <= 0.2 for timeout in timeouts)
+
+def test_stream_response_stops_at_turn_deadline():
+    """Probar que el plazo del turno corta una respuesta en streaming que sigue llegando"""
+    def slow_chunks(messages, timeout):
+        for _ in range(10):
+            time.sleep(0.05)
+            yield MagicMock(content="palabra ")
+    
+    received = []
+    with patch('src.llm.model.llm') as mock_model, turn_deadline(0.12):
+        mock_model.stream.side_effect = slow_chunks
+        with pytest.raises(LLMCallError):
+            for fragment in stream_response("Hola"):
+                received.append(fragment)
+    assert 0 < len(received) < 10
+
+def test_call_policy_hedges_slow_requests(test_policy):
+    """Probar que una petición lenta se duplica tras el p95 y gana la más rápida"""
+    with patch.dict('src.llm.policy.POLICIES', {"test": CallPolicy(timeout=2.0, hedge=True, hedge_min_delay=0.01)}):
+        for _ in range(20):
+            call_with_policy("test", lambda timeout: time.sleep(0.005))
+        
+        calls = []
+        def first_call_stalls(timeout):
+            calls.append(timeout)
+            if len(calls) == 1:
+                time.sleep(1.0)
+                return "lenta"
+            return "rápida"
+        
+        start = time.monotonic()
+        assert call_with_policy("test", first_call_stalls) == "rápida"
+        assert time.monotonic() - start < 0.5
+    
+    stats = get_call_stats()["test"]
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+
+def test_cassette_replays_without_network(local_openai_server, tmp_path):
+    """Probar que lo grabado contra el servidor local se reproduce con el servidor apagado"""
+    path = str(tmp_path / "calls.cassette.json")
+    audio_path = tmp_path / "audio.wav"
+    audio_path.write_bytes(b"RIFF-audio-de-prueba")
+    
+    def calls():
+        chat = get_chat_model(0.3)
+        reply = chat.invoke("hola").content
+        streamed = "".join(chunk.content for chunk in chat.stream("¿qué ofrecéis?"))
+        with open(audio_path, "rb") as audio_file:
+            text = get_openai_client().audio.transcriptions.create(model="whisper-1", file=audio_file).text
+        return reply, streamed, text
+    
+    with use_cassette(path, "record", transport=local_openai_server.transport()) as recorder:
+        recorded = calls()
+    assert recorder.recorded == 3
+    assert local_openai_server.stats()["kinds"] == {"response": 2, "transcription": 1}
+    
+    local_openai_server.stop()
+    with use_cassette(path, "replay", latency=0.1) as player:
+        start = time.monotonic()
+        assert calls() == recorded
+        assert time.monotonic() - start >= 0.3
+        assert player.hits == 3
+        
+        # Una petición no grabada falla en lugar de salir a la red
+        with pytest.raises(openai.APIConnectionError):
+            get_openai_client().with_options(max_retries=0).chat.completions.create(
+                model="gpt-3.5-turbo", messages=[{"role": "user", "content": "sin grabar"}]
+            )
+
+
+def test_llm_usage_prefers_response_metadata():
+    """Probar que los tokens se toman de la respuesta y, si faltan, se cuentan localmente"""
+    memory = MemoryExporter()
+    configure_monitoring(enabled=True, exporters=[memory])
+    try:
+        messages = [HumanMessage(content="Hola, ¿qué servicios ofrecéis?")]
+        with turn():
+            record_llm_usage("response", messages, AIMessage(
+                content="Desarrollo a medida",
+                usage_metadata={"input_tokens": 120, "output_tokens": 30, "total_tokens": 150},
+                response_metadata={"model_name": "gpt-4o-2024-08-06"}
+            ))
+            record_llm_usage("analysis", messages, {"raw": AIMessage(content="Integraciones"), "parsed": None})
+    finally:
+        configure_monitoring(enabled=False, exporters=[])
+    
+    reported, estimated = memory.recent()[0]["calls"]
+    assert (reported["model"], reported["prompt_tokens"], reported["completion_tokens"]) == ("gpt-4o-2024-08-06", 120, 30)
+    assert reported["cost"] == pytest.approx((120 * 2.5 + 30 * 10) / 1_000_000)
+    assert estimated["call_type"] == "analysis"
+    assert estimated["prompt_tokens"] > 0 and estimated["completion_tokens"] > 0
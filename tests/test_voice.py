@@ -7,7 +7,7 @@ from unittest.mock import patch, MagicMock, mock_open
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.voice.asr import transcribe_audio, transcribe_with_whisper, record_audio
-from src.voice.tts import text_to_speech, text_to_speech_stream, cleanup_audio_files
+from src.voice.tts import text_to_speech, text_to_speech_stream, cleanup_audio_files, split_sentences, SpeechStream
 
 
 @pytest.fixture
@@ -72,4 +72,44 @@ def test_record_audio(mock_speech_recognition):
         # Llamar a la función
         audio_file = record_audio(timeout=3)
         
-        # Verificar que se h
\ No newline at end of file
+        # Verificar que se h
+
+def test_split_sentences_streaming():
+    """Probar la segmentación en frases de un texto que llega por fragmentos"""
+    tokens = ["Hola, soy Asistente", "ATOM. ¿En qué", " puedo ayudarte?", " Cuéntame", " más.\nGracias"]
+    emitted = []
+    
+    def stream():
+        for token in tokens:
+            yield token
+            # Cada frase se emite antes de recibir el resto del texto
+            emitted.append(token)
+    
+    sentences = []
+    for sentence in split_sentences(stream(), min_length=15):
+        sentences.append((sentence, len(emitted)))
+    
+    assert [s for s, _ in sentences] == [
+        "Hola, soy AsistenteATOM.",
+        "¿En qué puedo ayudarte?",
+        # Las frases demasiado cortas se unen a la siguiente
+        "Cuéntame más. Gracias",
+    ]
+    assert sentences[0][1] < len(tokens)
+
+
+def test_speech_stream_synthesizes_in_order():
+    """Probar que las frases se sintetizan y reproducen en orden mientras se generan"""
+    with patch('src.voice.tts.text_to_speech', side_effect=lambda text, language, play_audio: f"{text}.mp3") as mock_tts, \
+         patch('src.voice.tts.AudioSegment.from_mp3') as mock_audio, \
+         patch('src.voice.tts.play') as mock_play:
+        first_audio = []
+        speech = SpeechStream(on_audio=first_audio.append)
+        text = speech.feed(iter(["Primera frase del agente. ", "Segunda frase del agente."]))
+        audio_files = speech.close()
+    
+    assert text == "Primera frase del agente. Segunda frase del agente."
+    assert audio_files == ["Primera frase del agente..mp3", "Segunda frase del agente..mp3"]
+    assert first_audio == audio_files
+    assert mock_play.call_count == 2
+    assert all(call.kwargs["play_audio"] is False for call in mock_tts.call_args_list)